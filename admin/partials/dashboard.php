@@ -9,11 +9,10 @@ if (!defined('ABSPATH')) {
 }
 
 // Get statistics
-global $wpdb;
-$media_table = $wpdb->prefix . 'family_media';
-$total_media = $wpdb->get_var("SELECT COUNT(*) FROM $media_table");
-$total_photos = $wpdb->get_var("SELECT COUNT(*) FROM $media_table WHERE file_type = 'photo'");
-$total_videos = $wpdb->get_var("SELECT COUNT(*) FROM $media_table WHERE file_type = 'video'");
+$totals = Family_Media_Manager_Stats::get_totals();
+$total_media = $totals['media'];
+$total_photos = $totals['photos'];
+$total_videos = $totals['videos'];
 ?>
 
 <div class="wrap">
@@ -16,6 +16,7 @@ if (isset($_POST['family_media_manager_settings_submit'])) {
     update_option('family_media_manager_google_client_secret', sanitize_text_field($_POST['google_client_secret']));
     update_option('family_media_manager_thumbnail_size', intval($_POST['thumbnail_size']));
     update_option('family_media_manager_photos_per_page', intval($_POST['photos_per_page']));
+    update_option('family_media_manager_async_uploads', isset($_POST['async_uploads']) ? 1 : 0);
     
     echo '<div class="notice notice-success"><p>Settings saved successfully!</p></div>';
 }
@@ -25,6 +26,7 @@ $google_client_id = get_option('family_media_manager_google_client_id', '');
 $google_client_secret = get_option('family_media_manager_google_client_secret', '');
 $thumbnail_size = get_option('family_media_manager_thumbnail_size', 300);
 $photos_per_page = get_option('family_media_manager_photos_per_page', 20);
+$async_uploads = get_option('family_media_manager_async_uploads', 0);
 
 // Check if user has connected cloud storage
 $user_id = get_current_user_id();
@@ -128,6 +130,24 @@ settings_errors('family_media_manager_messages');
             </tr>
         </table>
 
+        <h2>Upload Settings</h2>
+        <table class="form-table">
+            <tr>
+                <th scope="row">Background Processing</th>
+                <td>
+                    <label for="async_uploads">
+                        <input type="checkbox" 
+                               id="async_uploads" 
+                               name="async_uploads" 
+                               value="1" 
+                               <?php checked($async_uploads, 1); ?> />
+                        Send uploads to Google Drive in the background
+                    </label>
+                    <p class="description">Uploads are answered straight away and appear in the gallery once they have been copied to Drive and thumbnailed. Needs WP-Cron to run regularly (see the README for quiet sites).</p>
+                </td>
+            </tr>
+        </table>
+
         <?php submit_button('Save Settings', 'primary', 'family_media_manager_settings_submit'); ?>
     </form>
 </div>
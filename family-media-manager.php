@@ -22,6 +22,9 @@ if (!defined('WPINC')) {
 // Plugin version
 define('FAMILY_MEDIA_MANAGER_VERSION', '0.1.0');
 
+// Database schema version (bump when the tables in class-activator.php change)
+define('FAMILY_MEDIA_MANAGER_DB_VERSION', '7');
+
 // Plugin directory path
 define('FAMILY_MEDIA_MANAGER_PATH', plugin_dir_path(__FILE__));
 
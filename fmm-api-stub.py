@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+###############################################################################
+# Family Media Manager - REST API Stand-in
+# A small local HTTP server that accepts uploads the way the plugin's
+# POST /wp-json/family-gallery/v1/upload endpoint does, for trying out
+# fmm-bulk-import.py without a WordPress site
+#
+#   python3 fmm-api-stub.py --port 8766 --fail-every 10
+#   python3 fmm-bulk-import.py ~/Pictures --wp-url http://127.0.0.1:8766 \
+#       --username test --app-password test
+#
+# Uploaded bytes are counted and thrown away. GET /stub/stats reports the
+# number of uploads, bytes and TCP connections (to check keep-alive).
+###############################################################################
+
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+API_PREFIX = "/wp-json/family-gallery/v1"
+READ_CHUNK_SIZE = 256 * 1024
+MAX_FILE_SIZE = 100 * 1024 * 1024
+
+
+class ApiStub:
+    """Counters shared by all request threads"""
+
+    def __init__(self, username=None, password=None, fail_every=0, latency=0.0):
+        self.username = username
+        self.password = password
+        self.fail_every = fail_every
+        self.latency = latency
+        self.uploads = []
+        self.requests = 0
+        self.bytes = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "uploads": len(self.uploads),
+                "requests": self.requests,
+                "bytes": self.bytes,
+                "connections": self.connections,
+            }
+
+
+class ApiStubHandler(BaseHTTPRequestHandler):
+    server_version = "FMMApiStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def setup(self):
+        super().setup()
+        with self.api.lock:
+            self.api.connections += 1
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_wp_error(self, status, code, message):
+        """Error body in the shape WordPress uses for WP_Error responses"""
+        self.send_json(status, {"code": code, "message": message, "data": {"status": status}})
+
+    def discard_body(self):
+        """Read (and count) the request body without keeping it in memory"""
+        remaining = int(self.headers.get("Content-Length") or 0)
+        first = b""
+        while remaining:
+            chunk = self.rfile.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if not first:
+                first = chunk
+            remaining -= len(chunk)
+        return first, int(self.headers.get("Content-Length") or 0) - remaining
+
+    def logged_in(self):
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Basic "):
+            return False
+        if self.api.username is None:
+            return True
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode("utf-8").partition(":")
+        except ValueError:
+            return False
+        # Application passwords may be pasted with or without their spaces
+        return username == self.api.username and \
+            password.replace(" ", "") == self.api.password.replace(" ", "")
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/stub/stats":
+            self.send_json(200, self.api.stats())
+        elif path == API_PREFIX + "/gallery":
+            if not self.logged_in():
+                self.send_wp_error(401, "rest_forbidden", "Sorry, you are not allowed to do that.")
+                return
+            with self.api.lock:
+                photos = [dict(upload, thumbnail_url="") for upload in self.api.uploads[-20:]]
+            self.send_json(200, {"photos": photos[::-1], "total": len(self.api.uploads), "pages": 1})
+        else:
+            self.send_wp_error(404, "rest_no_route", "No route was found matching the URL and request method.")
+
+    def do_POST(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        first, size = self.discard_body()
+
+        with self.api.lock:
+            self.api.requests += 1
+            request_number = self.api.requests
+
+        if path != API_PREFIX + "/upload":
+            self.send_wp_error(404, "rest_no_route", "No route was found matching the URL and request method.")
+            return
+        if not self.logged_in():
+            self.send_wp_error(401, "rest_forbidden", "Sorry, you are not allowed to do that.")
+            return
+        if b'name="photo"' not in first:
+            self.send_wp_error(400, "no_file", "No file uploaded")
+            return
+        if size > MAX_FILE_SIZE + 64 * 1024:
+            self.send_wp_error(500, "upload_failed", "File size exceeds maximum allowed size of 100MB")
+            return
+
+        if self.api.latency:
+            time.sleep(self.api.latency)
+
+        if self.api.fail_every and request_number % self.api.fail_every == 0:
+            self.send_wp_error(500, "upload_failed", "Simulated cloud storage failure")
+            return
+
+        with self.api.lock:
+            media_id = len(self.api.uploads) + 1
+            self.api.uploads.append({"id": media_id, "bytes": size})
+            self.api.bytes += size
+
+        self.send_json(200, {"success": True, "media_id": media_id, "thumbnail_url": ""})
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the Family Media Manager upload API."
+    )
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8766,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument("--username", help="only accept this username (default: any)")
+    parser.add_argument("--app-password", default="",
+                        help="password that goes with --username")
+    parser.add_argument("--fail-every", type=int, default=0, metavar="N",
+                        help="answer every Nth upload with a 500 error")
+    parser.add_argument("--latency", type=float, default=0.0, metavar="SECONDS",
+                        help="extra delay before answering each upload")
+    parser.add_argument("--quiet", action="store_true",
+                        help="don't log each request")
+    return parser
+
+
+def make_server(host, port, **options):
+    """Create (but don't start) the stand-in server"""
+    quiet = options.pop("quiet", False)
+    server = ThreadingHTTPServer((host, port), ApiStubHandler)
+    server.daemon_threads = True
+    server.api = ApiStub(**options)
+    server.quiet = quiet
+    return server
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    server = make_server(args.host, args.port, username=args.username, password=args.app_password,
+                         fail_every=args.fail_every, latency=args.latency, quiet=args.quiet)
+    host, port = server.server_address[:2]
+    print(f"REST API stand-in listening on http://{host}:{port}", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
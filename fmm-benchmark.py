@@ -0,0 +1,1103 @@
+#!/usr/bin/env python3
+###############################################################################
+# Family Media Manager - REST API Benchmark
+# Seeds a gallery and replays PWA traffic against the family-gallery/v1
+# routes, reporting latency percentiles, throughput and database queries
+#
+# Against an in-process stand-in (SQLite, with the tables built from the
+# plugin's own CREATE TABLE statements):
+#
+#   python3 fmm-benchmark.py --media 50000 --duration 30 --output before.json
+#
+# Against a local WordPress, seeded with WP-CLI:
+#
+#   python3 fmm-benchmark.py --wp-url http://localhost:8080 \
+#       --wp-path /var/www/html --seed --seed-file bench-users.json
+#
+# Results are written as JSON; --compare shows the change from an earlier run.
+###############################################################################
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import base64
+import random
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, urlencode, parse_qs
+
+
+SCRIPT_DIR = Path(__file__).parent
+API_PREFIX = "/wp-json/family-gallery/v1"
+
+# Header carrying the number of database queries a request made. The plugin
+# sends it when SAVEQUERIES is on in wp-config.php.
+QUERY_COUNT_HEADER = "X-FMM-Queries"
+
+# Plugin files holding the CREATE TABLE statements
+SCHEMA_FILES = ("includes/class-activator.php", "includes/class-comments.php")
+
+SCENARIOS = ("gallery-scroll", "gallery-offset", "album-open", "upload-burst")
+DEFAULT_MIX = "gallery-scroll=6,album-open=3,upload-burst=1"
+
+SEED_BATCH_SIZE = 1000
+PERCENTILES = (50, 95, 99)
+
+
+class BenchmarkError(Exception):
+    """Problem that stops the benchmark (bad settings, unreachable site)"""
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def parse_mix(text):
+    """'gallery-scroll=6,album-open=3' -> {"gallery-scroll": 6.0, ...}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise BenchmarkError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    if not mix or not any(mix.values()):
+        raise BenchmarkError("The traffic mix is empty")
+    return mix
+
+
+###############################################################################
+# Schema: the plugin's MySQL DDL, translated for SQLite
+###############################################################################
+
+TABLE_VAR_RE = re.compile(r"\$(\w+)\s*=\s*\$wpdb->prefix\s*\.\s*'(\w+)';")
+CREATE_TABLE_RE = re.compile(
+    r'"CREATE TABLE (?:IF NOT EXISTS )?\$(\w+) \((.*?)\n\s*\) \$charset_collate;"', re.DOTALL
+)
+KEY_RE = re.compile(r"^(UNIQUE )?KEY (\w+) \((.*)\)$")
+PRIMARY_KEY_RE = re.compile(r"^PRIMARY KEY \((.*)\)$")
+
+# WordPress core table the stand-in needs for logins and comment authors
+CORE_TABLES = {
+    "users": "CREATE TABLE {prefix}users (\n"
+             "    ID INTEGER PRIMARY KEY,\n"
+             "    user_login TEXT NOT NULL UNIQUE,\n"
+             "    display_name TEXT NOT NULL\n"
+             ")",
+}
+
+
+def read_plugin_schema(plugin_dir):
+    """{table suffix: column/key lines} from the plugin's CREATE TABLE statements"""
+    tables = {}
+    for rel in SCHEMA_FILES:
+        with open(Path(plugin_dir) / rel, 'r', encoding='utf-8') as f:
+            source = f.read()
+        names = dict(TABLE_VAR_RE.findall(source))
+        for var, body in CREATE_TABLE_RE.findall(source):
+            if var not in names:
+                raise BenchmarkError(f"Can't tell which table ${var} is in {rel}")
+            lines = [line.strip().rstrip(",") for line in body.strip().splitlines()]
+            tables[names[var]] = [line for line in lines if line]
+    if "family_media" not in tables:
+        raise BenchmarkError(f"No CREATE TABLE statements found under {plugin_dir}")
+    return tables
+
+
+def sqlite_column_type(mysql_type):
+    """Closest SQLite type affinity for a MySQL column type"""
+    base = re.sub(r"\(.*\)", "", mysql_type).upper()
+    if base.endswith("INT"):
+        return "INTEGER"
+    if base in ("DECIMAL", "FLOAT", "DOUBLE"):
+        return "REAL"
+    return "TEXT"
+
+
+def sqlite_schema(tables, prefix):
+    """CREATE TABLE / CREATE INDEX statements for SQLite"""
+    statements = [sql.format(prefix=prefix) for sql in CORE_TABLES.values()]
+
+    for suffix, lines in sorted(tables.items()):
+        table = prefix + suffix
+        columns, constraints, indexes = [], [], []
+        auto_increment = None
+
+        for line in lines:
+            key = KEY_RE.match(line)
+            primary = PRIMARY_KEY_RE.match(line)
+            if key:
+                unique, name, cols = key.groups()
+                cols = re.sub(r"\(\d+\)", "", cols)
+                indexes.append(f"CREATE {'UNIQUE ' if unique else ''}INDEX {table}_{name} ON {table} ({cols})")
+            elif primary:
+                if primary.group(1).strip() != auto_increment:
+                    constraints.append(line)
+            else:
+                name, mysql_type, *rest = line.split()
+                rest = " ".join(rest)
+                if "AUTO_INCREMENT" in rest:
+                    auto_increment = name
+                    columns.append(f"{name} INTEGER PRIMARY KEY AUTOINCREMENT")
+                    continue
+                rest = re.sub(r"\bUNSIGNED\b\s*|\s*ON UPDATE \w+", "", rest)
+                columns.append(f"{name} {sqlite_column_type(mysql_type)} {rest}".rstrip())
+
+        statements.append(f"CREATE TABLE {table} (\n    " + ",\n    ".join(columns + constraints) + "\n)")
+        statements.extend(indexes)
+
+    return statements
+
+
+###############################################################################
+# Seed data
+###############################################################################
+
+def generate_seed(user_ids, albums, media, shares_per_media, comments_per_media, years, seed):
+    """Rows for a gallery of the given size, as {table suffix: [row dict]}.
+
+    The same random seed gives the same gallery, so runs are comparable.
+    Albums belong to random users and most media goes into one of its
+    owner's albums; upload dates are spread over the last `years` years.
+    """
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1)
+    span = int(years * 365 * 86400)
+    rows = {"family_albums": [], "family_media": [], "family_sharing": [], "family_comments": []}
+
+    albums_by_owner = {}
+    for album_id in range(1, albums + 1):
+        owner = rng.choice(user_ids)
+        albums_by_owner.setdefault(owner, []).append(album_id)
+        rows["family_albums"].append({
+            "id": album_id,
+            "owner_id": owner,
+            "name": f"Album {album_id}",
+            "description": "",
+            "created_date": (now - timedelta(seconds=rng.randrange(span))).strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    for media_id in range(1, media + 1):
+        owner = rng.choice(user_ids)
+        owned_albums = albums_by_owner.get(owner)
+        is_photo = rng.random() < 0.9
+        uploaded = now - timedelta(seconds=rng.randrange(span))
+        rows["family_media"].append({
+            "id": media_id,
+            "owner_id": owner,
+            "cloud_provider": "google_drive",
+            "cloud_file_id": f"bench-{media_id}",
+            "filename": f"IMG_{media_id:06d}.jpg" if is_photo else f"VID_{media_id:06d}.mp4",
+            "file_type": "photo" if is_photo else "video",
+            "file_size": rng.randrange(200_000, 8_000_000 if is_photo else 90_000_000),
+            "thumbnail_path": None,
+            "content_hash": hashlib.sha256(f"fmm-benchmark-{seed}-{media_id}".encode()).hexdigest(),
+            "upload_date": uploaded.strftime("%Y-%m-%d %H:%M:%S"),
+            "album_id": rng.choice(owned_albums) if owned_albums and rng.random() < 0.7 else None,
+            "caption": "",
+            "status": "ready",
+        })
+
+        others = [u for u in user_ids if u != owner]
+        count = int(shares_per_media) + (rng.random() < shares_per_media % 1)
+        for user_id in rng.sample(others, min(count, len(others))):
+            rows["family_sharing"].append({
+                "media_id": media_id,
+                "shared_with_user_id": user_id,
+                "can_download": 1,
+                "shared_date": uploaded.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+
+        count = int(comments_per_media) + (rng.random() < comments_per_media % 1)
+        for _ in range(count):
+            rows["family_comments"].append({
+                "media_id": media_id,
+                "user_id": rng.choice(user_ids),
+                "comment_text": "Lovely!",
+                "created_date": uploaded.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+
+    # Counters that Family_Media_Manager_Stats keeps on the album rows
+    for album in rows["family_albums"]:
+        album["photo_count"] = 0
+        album["last_photo_date"] = None
+    by_id = {album["id"]: album for album in rows["family_albums"]}
+    for item in rows["family_media"]:
+        album = by_id.get(item["album_id"])
+        if album:
+            album["photo_count"] += 1
+            album["last_photo_date"] = max(album["last_photo_date"] or "", item["upload_date"])
+
+    return rows
+
+
+def insert_batches(rows, size=SEED_BATCH_SIZE):
+    """Split rows into (columns, [value tuples]) batches"""
+    for start in range(0, len(rows), size):
+        batch = rows[start:start + size]
+        columns = list(batch[0])
+        yield columns, [tuple(row[c] for c in columns) for row in batch]
+
+
+def sql_literal(value):
+    """MySQL literal for a seed value"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+###############################################################################
+# In-process stand-in: the plugin's read paths and upload on SQLite
+###############################################################################
+
+class StubDatabase:
+    """SQLite copy of the plugin's tables, one connection per thread"""
+
+    def __init__(self, path, prefix):
+        self.path = path
+        self.prefix = prefix
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def create(self, statements):
+        conn = self.connection()
+        for sql in statements:
+            conn.execute(sql)
+
+    def seed(self, users, rows):
+        conn = self.connection()
+        conn.execute("BEGIN")
+        conn.executemany(
+            f"INSERT INTO {self.prefix}users (ID, user_login, display_name) VALUES (?, ?, ?)",
+            [(user_id, login, login) for user_id, login in users]
+        )
+        for suffix, table_rows in rows.items():
+            for columns, values in insert_batches(table_rows):
+                conn.executemany(
+                    f"INSERT INTO {self.prefix}{suffix} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    values
+                )
+        for name, where in (("media", ""), ("photos", " WHERE file_type = 'photo'"),
+                            ("videos", " WHERE file_type = 'video'")):
+            conn.execute(
+                f"INSERT INTO {self.prefix}family_stats (name, value) "
+                f"SELECT ?, COUNT(*) FROM {self.prefix}family_media{where}",
+                (name,)
+            )
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+
+
+class StubRequest:
+    """One request's database access, counting queries like $wpdb->num_queries"""
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.conn = db.connection()
+        self.user_id = user_id
+        self.queries = 0
+
+    def table(self, suffix):
+        return self.db.prefix + suffix
+
+    def all(self, sql, params=()):
+        self.queries += 1
+        return self.conn.execute(sql, params).fetchall()
+
+    def one(self, sql, params=()):
+        rows = self.all(sql, params)
+        return rows[0] if rows else None
+
+    def var(self, sql, params=()):
+        row = self.one(sql, params)
+        return row[0] if row else None
+
+    def execute(self, sql, params=()):
+        self.queries += 1
+        return self.conn.execute(sql, params)
+
+
+class StubApi:
+    """Python ports of the routes the benchmark exercises.
+
+    Each method issues the same queries, in the same order, as the PHP
+    code path it mirrors (noted in the docstrings), so query counts and
+    index use match the plugin. Responses are always built fresh, as on a
+    response cache miss.
+    """
+
+    def gallery(self, req, params):
+        """Family_Media_Manager_API::build_gallery"""
+        per_page = max(1, min(100, int(params.get("per_page") or 20)))
+        media_table = req.table("family_media")
+
+        if "cursor" in params:
+            # Family_Media_Manager_Media_Library::get_media_page
+            access, access_args = self.access_clause(req)
+            where, args = ["status = 'ready'", access], list(access_args)
+            filter_clause, filter_args = " AND ".join(where), list(args)
+            if params["cursor"]:
+                try:
+                    upload_date, media_id = json.loads(base64.urlsafe_b64decode(
+                        params["cursor"] + "=" * (-len(params["cursor"]) % 4)))
+                except ValueError:
+                    return 400, {"code": "invalid_cursor", "message": "Invalid cursor", "data": {"status": 400}}
+                where.append("(upload_date < ? OR (upload_date = ? AND id < ?))")
+                args += [upload_date, upload_date, media_id]
+            rows = req.all(
+                f"SELECT * FROM {media_table} m WHERE {' AND '.join(where)} "
+                f"ORDER BY upload_date DESC, id DESC LIMIT ?",
+                args + [per_page + 1]
+            )
+            next_cursor = None
+            if len(rows) > per_page:
+                rows = rows[:per_page]
+                next_cursor = base64.urlsafe_b64encode(json.dumps(
+                    [rows[-1]["upload_date"], rows[-1]["id"]]).encode()).decode().rstrip("=")
+            response = {"next_cursor": next_cursor}
+            if params.get("include_total"):
+                response["total"] = req.var(f"SELECT COUNT(*) FROM {media_table} m WHERE {filter_clause}",
+                                            filter_args)
+        else:
+            # Family_Media_Manager_Media_Library::get_media
+            page = max(1, int(params.get("page") or 1))
+            access, access_args = self.access_clause(req)
+            rows = req.all(
+                f"SELECT * FROM {media_table} m WHERE status = 'ready' AND {access} "
+                f"ORDER BY upload_date DESC LIMIT ? OFFSET ?",
+                access_args + (per_page, (page - 1) * per_page)
+            )
+            total = req.var(f"SELECT COUNT(*) FROM {media_table} m WHERE status = 'ready' AND {access}",
+                            access_args)
+            response = {"total": total, "pages": -(-total // per_page)}
+
+        photos = [self.format_item(row) for row in rows]
+        if params.get("include_counts"):
+            photos = self.add_item_counts(req, photos)
+        response["photos"] = photos
+        return 200, response
+
+    def albums(self, req, params):
+        """Family_Media_Manager_API::get_albums"""
+        rows = req.all(f"SELECT * FROM {req.table('family_albums')} WHERE 1=1 ORDER BY created_date DESC")
+        return 200, [{
+            "id": row["id"],
+            "name": row["name"],
+            "description": row["description"],
+            "photo_count": row["photo_count"],
+            "created_date": row["created_date"],
+            "last_photo_date": row["last_photo_date"],
+            "owner_id": row["owner_id"],
+        } for row in rows]
+
+    def album(self, req, params, album_id):
+        """Family_Media_Manager_API::build_album"""
+        albums_table = req.table("family_albums")
+        album = req.one(f"SELECT * FROM {albums_table} WHERE id = ?", (album_id,))
+        if not album:
+            return 404, {"code": "not_found", "message": "Album not found", "data": {"status": 404}}
+
+        # Family_Media_Manager_Albums::user_can_access loads the album again
+        req.one(f"SELECT * FROM {albums_table} WHERE id = ?", (album_id,))
+        if album["owner_id"] != req.user_id and not req.var(
+            f"SELECT COUNT(*) FROM {req.table('family_media')} m "
+            f"INNER JOIN {req.table('family_sharing')} s ON m.id = s.media_id "
+            f"WHERE m.album_id = ? AND s.shared_with_user_id = ?",
+            (album_id, req.user_id)
+        ):
+            return 403, {"code": "forbidden", "message": "Access denied", "data": {"status": 403}}
+
+        # Family_Media_Manager_Albums::get_album_media -> get_media
+        media_table = req.table("family_media")
+        access, access_args = self.access_clause(req)
+        rows = req.all(
+            f"SELECT * FROM {media_table} m WHERE status = 'ready' AND album_id = ? AND {access} "
+            f"ORDER BY upload_date DESC LIMIT ? OFFSET ?",
+            (album_id,) + access_args + (20, 0)
+        )
+        req.var(f"SELECT COUNT(*) FROM {media_table} m WHERE status = 'ready' AND album_id = ? AND {access}",
+                (album_id,) + access_args)
+
+        photos = [self.format_item(row) for row in rows]
+        if params.get("include_counts"):
+            photos = self.add_item_counts(req, photos)
+
+        return 200, {
+            "id": album["id"],
+            "name": album["name"],
+            "description": album["description"],
+            "photos": photos,
+            "photo_count": len(photos),
+            "created_date": album["created_date"],
+            "owner_id": album["owner_id"],
+        }
+
+    def upload(self, req, content):
+        """Family_Media_Manager_Uploader::handle_upload with background uploads on"""
+        media_table = req.table("family_media")
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        existing = req.one(f"SELECT * FROM {media_table} WHERE content_hash = ? AND owner_id = ?",
+                           (content_hash, req.user_id))
+        if existing:
+            return 200, {"success": True, "media_id": existing["id"], "duplicate": True,
+                         "status": existing["status"], "thumbnail_url": ""}
+
+        # Family_Media_Manager_Media_Library::add_media inside Stats::transaction;
+        # pending items are only counted once the queue marks them ready
+        req.execute("BEGIN IMMEDIATE")
+        cursor = req.execute(
+            f"INSERT INTO {media_table} (owner_id, cloud_provider, cloud_file_id, filename, file_type, "
+            f"file_size, content_hash, upload_date, caption, status) "
+            f"VALUES (?, 'google_drive', '', ?, 'photo', ?, ?, ?, '', 'pending')",
+            (req.user_id, f"photo_{content_hash[:12]}.jpg", len(content), content_hash,
+             datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        req.execute("COMMIT")
+
+        return 202, {"success": True, "media_id": cursor.lastrowid, "status": "pending", "thumbnail_url": ""}
+
+    def access_clause(self, req):
+        """Family_Media_Manager_Sharing::access_clause"""
+        return (
+            f"(m.owner_id = ? OR EXISTS (SELECT 1 FROM {req.table('family_sharing')} s "
+            f"WHERE s.media_id = m.id AND s.shared_with_user_id = ?))",
+            (req.user_id, req.user_id)
+        )
+
+    def add_item_counts(self, req, photos):
+        """Family_Media_Manager_API::add_item_counts"""
+        ids = [photo["id"] for photo in photos]
+        if not ids:
+            return photos
+        placeholders = ", ".join("?" * len(ids))
+        comments = dict(req.all(
+            f"SELECT media_id, COUNT(*) FROM {req.table('family_comments')} "
+            f"WHERE media_id IN ({placeholders}) GROUP BY media_id", ids))
+        shares = dict(req.all(
+            f"SELECT media_id, COUNT(*) FROM {req.table('family_sharing')} "
+            f"WHERE media_id IN ({placeholders}) GROUP BY media_id", ids))
+        for photo in photos:
+            photo["comment_count"] = comments.get(photo["id"], 0)
+            photo["shared_with_count"] = shares.get(photo["id"], 0)
+        return photos
+
+    def format_item(self, row):
+        """Family_Media_Manager_API::format_gallery_item"""
+        return {
+            "id": row["id"],
+            "thumbnail_url": "",
+            "thumbnail_srcset": {},
+            "filename": row["filename"],
+            "file_type": row["file_type"],
+            "upload_date": row["upload_date"],
+            "caption": row["caption"],
+            "owner_id": row["owner_id"],
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "FMMBenchmarkStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body go out in separate writes; without this, delayed
+    # ACKs add ~40ms to every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, queries):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(QUERY_COUNT_HEADER, str(queries))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def current_user(self, req):
+        """User ID from Basic auth; any password is accepted"""
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Basic "):
+            return None
+        try:
+            username = base64.b64decode(header[6:]).decode("utf-8").partition(":")[0]
+        except ValueError:
+            return None
+        return req.var(f"SELECT ID FROM {req.table('users')} WHERE user_login = ?", (username,))
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        params = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        req = StubRequest(self.server.db, None)
+        req.user_id = self.current_user(req)
+        api = self.server.api
+
+        if req.user_id is None:
+            status, data = 401, {"code": "rest_forbidden", "message": "Sorry, you are not allowed to do that.",
+                                 "data": {"status": 401}}
+        elif method == "GET" and path == API_PREFIX + "/gallery":
+            status, data = api.gallery(req, params)
+        elif method == "GET" and path == API_PREFIX + "/albums":
+            status, data = api.albums(req, params)
+        elif method == "GET" and re.fullmatch(API_PREFIX + r"/albums/\d+", path):
+            status, data = api.album(req, params, int(path.rsplit("/", 1)[1]))
+        elif method == "POST" and path == API_PREFIX + "/upload":
+            status, data = api.upload(req, body)
+        else:
+            status, data = 404, {"code": "rest_no_route",
+                                 "message": "No route was found matching the URL and request method.",
+                                 "data": {"status": 404}}
+
+        self.send_json(status, data, req.queries)
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+
+def start_stub(args, workdir):
+    """Build, seed and start the stand-in; returns (server, users, album IDs)"""
+    db = StubDatabase(os.path.join(workdir, "gallery.sqlite"), args.table_prefix)
+    db.create(sqlite_schema(read_plugin_schema(args.plugin_dir), args.table_prefix))
+
+    users = [(user_id, f"bench{user_id}") for user_id in range(1, args.users + 1)]
+    rows = generate_seed([u for u, _ in users], args.albums, args.media,
+                         args.shares_per_media, args.comments_per_media, args.years, args.seed)
+    db.seed(users, rows)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.db = db
+    server.api = StubApi()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    credentials = [{"id": user_id, "username": login, "password": "bench"} for user_id, login in users]
+    return server, credentials, [album["id"] for album in rows["family_albums"]]
+
+
+###############################################################################
+# Real WordPress: seeding through WP-CLI
+###############################################################################
+
+def wp_cli(args, *command, input=None):
+    """Run a WP-CLI command against --wp-path and return its output"""
+    cmd = [args.wp_cli, f"--path={args.wp_path}", *command]
+    try:
+        result = subprocess.run(cmd, input=input, capture_output=True, text=True, check=True)
+    except FileNotFoundError:
+        raise BenchmarkError(f"WP-CLI not found ({args.wp_cli}); install it or pass --wp-cli")
+    except subprocess.CalledProcessError as e:
+        raise BenchmarkError(f"'{' '.join(command[:3])}' failed: {e.stderr.strip() or e.stdout.strip()}")
+    return result.stdout.strip()
+
+
+def seed_wordpress(args):
+    """Create benchmark users and gallery rows in a local WordPress.
+
+    Returns the seed manifest (users with application passwords, album
+    IDs), which is also saved to --seed-file for later runs.
+    """
+    prefix = wp_cli(args, "db", "prefix")
+    users = []
+    for n in range(1, args.users + 1):
+        login = f"bench{n}"
+        try:
+            user_id = int(wp_cli(args, "user", "get", login, "--field=ID"))
+        except BenchmarkError:
+            user_id = int(wp_cli(args, "user", "create", login, f"{login}@example.invalid",
+                                 "--role=author", "--porcelain"))
+        password = wp_cli(args, "user", "application-password", "create", str(user_id),
+                          "fmm-benchmark", "--porcelain")
+        users.append({"id": user_id, "username": login, "password": password})
+
+    user_list = ", ".join(str(u["id"]) for u in users)
+    rows = generate_seed([u["id"] for u in users], args.albums, args.media,
+                         args.shares_per_media, args.comments_per_media, args.years, args.seed)
+
+    # Previous benchmark rows go first so runs start from the same gallery
+    sql = io.StringIO()
+    sql.write(f"DELETE FROM {prefix}family_comments WHERE user_id IN ({user_list});\n")
+    sql.write(f"DELETE s FROM {prefix}family_sharing s JOIN {prefix}family_media m ON m.id = s.media_id "
+              f"WHERE m.owner_id IN ({user_list});\n")
+    sql.write(f"DELETE FROM {prefix}family_media WHERE owner_id IN ({user_list});\n")
+    sql.write(f"DELETE FROM {prefix}family_albums WHERE owner_id IN ({user_list});\n")
+    wp_cli(args, "db", "query", input=sql.getvalue())
+
+    # Seed IDs are shifted past the site's own rows
+    media_base = int(wp_cli(args, "db", "query", f"SELECT COALESCE(MAX(id), 0) FROM {prefix}family_media",
+                            "--skip-column-names") or 0)
+    album_base = int(wp_cli(args, "db", "query", f"SELECT COALESCE(MAX(id), 0) FROM {prefix}family_albums",
+                            "--skip-column-names") or 0)
+    for album in rows["family_albums"]:
+        album["id"] += album_base
+    for item in rows["family_media"]:
+        item["id"] += media_base
+        if item["album_id"]:
+            item["album_id"] += album_base
+    for suffix in ("family_sharing", "family_comments"):
+        for row in rows[suffix]:
+            row["media_id"] += media_base
+
+    sql = io.StringIO()
+    for suffix, table_rows in rows.items():
+        for columns, values in insert_batches(table_rows):
+            sql.write(f"INSERT INTO {prefix}{suffix} ({', '.join(columns)}) VALUES\n")
+            sql.write(",\n".join("(" + ", ".join(map(sql_literal, row)) + ")" for row in values))
+            sql.write(";\n")
+
+    wp_cli(args, "db", "query", input=sql.getvalue())
+    wp_cli(args, "family-media", "stats", "rebuild")
+
+    manifest = {"wp_url": args.wp_url, "users": users,
+                "albums": [album["id"] for album in rows["family_albums"]],
+                "media": args.media, "seed": args.seed}
+    if args.seed_file:
+        with open(args.seed_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    return manifest
+
+
+###############################################################################
+# Traffic
+###############################################################################
+
+class ApiClient:
+    """Keep-alive connection to the REST API for one simulated user"""
+
+    def __init__(self, base_url, username, password, timeout=60):
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise BenchmarkError(f"Not a valid address: {base_url}")
+
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip("/") + API_PREFIX
+        self.timeout = timeout
+        token = base64.b64encode(f"{username}:{password}".encode('utf-8')).decode('ascii')
+        self.auth = "Basic " + token
+        self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def request(self, method, route, params=None, body=None, content_type=None):
+        """Returns (status, parsed JSON, seconds, query count or None)"""
+        path = self.prefix + route + ("?" + urlencode(params) if params else "")
+        headers = {"Authorization": self.auth, "Connection": "keep-alive"}
+        if body is not None:
+            headers["Content-Type"] = content_type
+            headers["Content-Length"] = str(len(body))
+
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, None, time.perf_counter() - started, None
+        elapsed = time.perf_counter() - started
+
+        if response.will_close:
+            self.close()
+
+        queries = response.getheader(QUERY_COUNT_HEADER)
+        try:
+            result = json.loads(data or b"null")
+        except ValueError:
+            result = None
+        return response.status, result, elapsed, int(queries) if queries else None
+
+
+def fake_jpeg(rng, size):
+    """Unique bytes that the uploader's finfo check sees as a JPEG"""
+    return b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + rng.randbytes(max(0, size - 13)) + b"\xff\xd9"
+
+
+def multipart(content, filename):
+    """(body, content type) for a POST /upload request"""
+    boundary = "fmmbench" + hashlib.md5(content[:64]).hexdigest()
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"photo\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode('utf-8') + content + f"\r\n--{boundary}--\r\n".encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class Recorder:
+    """Collects one sample per request, shared by all workers"""
+
+    def __init__(self):
+        self.samples = []
+        self.scenarios = {}
+        self.lock = threading.Lock()
+
+    def add(self, route, status, seconds, queries):
+        with self.lock:
+            self.samples.append((route, status, seconds, queries))
+
+    def scenario_done(self, name):
+        with self.lock:
+            self.scenarios[name] = self.scenarios.get(name, 0) + 1
+
+
+class Traffic:
+    """PWA-like sessions: what the app requests for each user action"""
+
+    def __init__(self, args, albums):
+        self.args = args
+        self.albums = albums
+
+    def call(self, client, recorder, route_name, method, route, **kwargs):
+        status, data, seconds, queries = client.request(method, route, **kwargs)
+        recorder.add(route_name, status, seconds, queries)
+        return status, data
+
+    def gallery_scroll(self, client, recorder, rng):
+        """Open the gallery and scroll through --scroll-pages pages"""
+        cursor = ""
+        for _ in range(self.args.scroll_pages):
+            params = {"cursor": cursor, "per_page": self.args.per_page}
+            if self.args.include_counts:
+                params["include_counts"] = 1
+            status, data = self.call(client, recorder, "GET /gallery?cursor", "GET", "/gallery", params=params)
+            cursor = data.get("next_cursor") if status == 200 and isinstance(data, dict) else None
+            if not cursor:
+                break
+
+    def gallery_offset(self, client, recorder, rng):
+        """The same scroll with ?page=N, as before cursor paging"""
+        for page in range(1, self.args.scroll_pages + 1):
+            params = {"page": page, "per_page": self.args.per_page}
+            if self.args.include_counts:
+                params["include_counts"] = 1
+            status, data = self.call(client, recorder, "GET /gallery?page", "GET", "/gallery", params=params)
+            if status != 200 or not isinstance(data, dict) or page >= (data.get("pages") or 0):
+                break
+
+    def album_open(self, client, recorder, rng):
+        """Open the album list, then one album"""
+        status, data = self.call(client, recorder, "GET /albums", "GET", "/albums")
+        albums = [a["id"] for a in data] if status == 200 and isinstance(data, list) and data else self.albums
+        if albums:
+            params = {"include_counts": 1} if self.args.include_counts else None
+            self.call(client, recorder, "GET /albums/{id}", "GET", f"/albums/{rng.choice(albums)}", params=params)
+
+    def upload_burst(self, client, recorder, rng):
+        """Send --burst-size new photos back to back"""
+        for _ in range(self.args.burst_size):
+            content = fake_jpeg(rng, self.args.upload_kb * 1024)
+            body, content_type = multipart(content, f"photo_{rng.getrandbits(48):012x}.jpg")
+            self.call(client, recorder, "POST /upload", "POST", "/upload", body=body, content_type=content_type)
+
+    def run(self, base_url, users, mix, recorder):
+        """Run --concurrency workers until --duration or --iterations is reached"""
+        names, weights = zip(*mix.items())
+        deadline = time.monotonic() + self.args.duration
+        remaining = [self.args.iterations or None]
+        remaining_lock = threading.Lock()
+
+        def take():
+            with remaining_lock:
+                if remaining[0] is None:
+                    return time.monotonic() < deadline
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker(index):
+            rng = random.Random(self.args.seed * 1000 + index)
+            user = users[index % len(users)]
+            client = ApiClient(base_url, user["username"], user["password"])
+            try:
+                while take():
+                    name = rng.choices(names, weights)[0]
+                    getattr(self, name.replace("-", "_"))(client, recorder, rng)
+                    recorder.scenario_done(name)
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+
+###############################################################################
+# Results
+###############################################################################
+
+def summarize(recorder, elapsed):
+    """Per-route and overall latency, throughput and query counts"""
+    routes = {}
+    for route, status, seconds, queries in recorder.samples:
+        routes.setdefault(route, []).append((status, seconds, queries))
+
+    def stats(samples):
+        latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+        queries = [q for _, _, q in samples if q is not None]
+        result = {
+            "requests": len(samples),
+            "errors": sum(1 for status, _, _ in samples if not 200 <= status < 300),
+            "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+            "latency_ms": {f"p{p}": round(percentile(latencies, p), 2) for p in PERCENTILES},
+        }
+        result["latency_ms"]["mean"] = round(sum(latencies) / len(latencies), 2)
+        result["latency_ms"]["max"] = round(latencies[-1], 2)
+        if queries:
+            result["queries"] = {"mean": round(sum(queries) / len(queries), 2), "max": max(queries)}
+        return result
+
+    all_samples = [sample for samples in routes.values() for sample in samples]
+    return {
+        "duration_s": round(elapsed, 2),
+        "scenarios": dict(sorted(recorder.scenarios.items())),
+        "overall": stats(all_samples) if all_samples else None,
+        "routes": {route: stats(samples) for route, samples in sorted(routes.items())},
+    }
+
+
+def print_summary(summary):
+    print(f"\n{'route':<22}{'requests':>9}{'errors':>8}{'req/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for route, stats in list(summary["routes"].items()) + [("all", summary["overall"])]:
+        if not stats:
+            continue
+        latency = stats["latency_ms"]
+        queries = stats.get("queries", {}).get("mean", "-")
+        print(f"{route:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>9}"
+              f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}{queries:>9}")
+
+
+def compare(summary, baseline_path, max_regression):
+    """Print the p95 change per route against an earlier results file.
+
+    Returns False if any route got slower by more than max_regression
+    percent (when given).
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)["results"]["routes"]
+
+    ok = True
+    print(f"\nCompared with {baseline_path} (p95 ms):")
+    for route, stats in summary["routes"].items():
+        if route not in baseline:
+            continue
+        old, new = baseline[route]["latency_ms"]["p95"], stats["latency_ms"]["p95"]
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            flag, ok = "  REGRESSION", False
+        print(f"  {route:<22}{old:>9} -> {new:<9}{change:+.1f}%{flag}")
+    return ok
+
+
+def git_revision():
+    """Commit of the plugin being measured, when run from a checkout"""
+    try:
+        return subprocess.run(["git", "-C", str(SCRIPT_DIR), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+###############################################################################
+# Command line
+###############################################################################
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Family Media Manager REST API against an in-process "
+                    "stand-in (default) or a local WordPress."
+    )
+    target = parser.add_argument_group("target")
+    target.add_argument("--wp-url", help="benchmark this WordPress instead of the stand-in")
+    target.add_argument("--wp-path", help="WordPress folder, for seeding with WP-CLI")
+    target.add_argument("--wp-cli", default="wp", help="WP-CLI command (default: %(default)s)")
+    target.add_argument("--seed", dest="seed_wordpress", action="store_true",
+                        help="create benchmark users and media in the WordPress first")
+    target.add_argument("--seed-file",
+                        help="users and albums from an earlier --seed (written by --seed)")
+    target.add_argument("--username", help="user to send every request as, without --seed-file")
+    target.add_argument("--app-password", help="application password for --username "
+                                               "(or set FMM_APP_PASSWORD)")
+    target.add_argument("--plugin-dir", default=str(SCRIPT_DIR),
+                        help="plugin checkout to read the schema from (default: %(default)s)")
+    target.add_argument("--table-prefix", default="wp_",
+                        help="table prefix in the stand-in (default: %(default)s)")
+
+    data = parser.add_argument_group("seed data")
+    data.add_argument("--users", type=int, default=10, help="default: %(default)s")
+    data.add_argument("--albums", type=int, default=50, help="default: %(default)s")
+    data.add_argument("--media", type=int, default=10000, help="default: %(default)s")
+    data.add_argument("--shares-per-media", type=float, default=1.5, help="default: %(default)s")
+    data.add_argument("--comments-per-media", type=float, default=0.5, help="default: %(default)s")
+    data.add_argument("--years", type=float, default=5,
+                      help="spread upload dates over this many years (default: %(default)s)")
+    data.add_argument("--random-seed", dest="seed", type=int, default=1,
+                      help="seed for data and traffic, for repeatable runs (default: %(default)s)")
+
+    traffic = parser.add_argument_group("traffic")
+    traffic.add_argument("--mix", default=DEFAULT_MIX,
+                         help=f"scenario weights, from {', '.join(SCENARIOS)} (default: %(default)s)")
+    traffic.add_argument("--concurrency", type=int, default=4,
+                         help="simulated users at once (default: %(default)s)")
+    traffic.add_argument("--duration", type=float, default=20,
+                         help="seconds to run for (default: %(default)s)")
+    traffic.add_argument("--iterations", type=int, default=0,
+                         help="run this many scenarios instead of for --duration")
+    traffic.add_argument("--scroll-pages", type=int, default=5,
+                         help="gallery pages per scroll (default: %(default)s)")
+    traffic.add_argument("--per-page", type=int, default=20, help="default: %(default)s")
+    traffic.add_argument("--include-counts", action="store_true",
+                         help="ask for comment and share counts with gallery pages")
+    traffic.add_argument("--burst-size", type=int, default=5,
+                         help="photos per upload burst (default: %(default)s)")
+    traffic.add_argument("--upload-kb", type=int, default=200,
+                         help="size of each uploaded photo (default: %(default)s)")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--output", help="results file (default: fmm-benchmark-<time>.json)")
+    output.add_argument("--compare", metavar="RESULTS", help="show the change from an earlier results file")
+    output.add_argument("--max-regression", type=float, metavar="PERCENT",
+                        help="with --compare, exit 1 if any route's p95 grew by more than this")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+        workdir = None
+        server = None
+
+        if args.wp_url:
+            target = {"type": "wordpress", "wp_url": args.wp_url}
+            if args.seed_wordpress:
+                if not args.wp_path:
+                    raise BenchmarkError("--seed needs --wp-path")
+                print(f"Seeding {args.wp_url}: {args.users} users, {args.albums} albums, "
+                      f"{args.media} media...", flush=True)
+                manifest = seed_wordpress(args)
+            elif args.seed_file:
+                with open(args.seed_file, 'r') as f:
+                    manifest = json.load(f)
+            else:
+                password = args.app_password or os.environ.get("FMM_APP_PASSWORD")
+                if not (args.username and password):
+                    raise BenchmarkError("Pass --seed, --seed-file or --username and --app-password")
+                manifest = {"users": [{"username": args.username, "password": password}], "albums": []}
+            base_url, users, albums = args.wp_url, manifest["users"], manifest["albums"]
+
+            # Fail early rather than time thousands of connection errors
+            client = ApiClient(base_url, users[0]["username"], users[0]["password"])
+            status, data, _, _ = client.request("GET", "/albums")
+            client.close()
+            if status == 0:
+                raise BenchmarkError(f"Could not connect to {base_url}")
+            if status in (401, 403):
+                raise BenchmarkError(f"WordPress rejected the login for {users[0]['username']} ({status})")
+        else:
+            target = {"type": "stub", "database": "sqlite " + sqlite3.sqlite_version}
+            print(f"Building stand-in: {args.users} users, {args.albums} albums, "
+                  f"{args.media} media...", flush=True)
+            workdir = tempfile.mkdtemp(prefix="fmm-benchmark-")
+            server, users, albums = start_stub(args, workdir)
+            host, port = server.server_address[:2]
+            base_url = f"http://{host}:{port}"
+
+        print(f"Running {args.mix} with {args.concurrency} users "
+              + (f"for {args.iterations} scenarios" if args.iterations else f"for {args.duration:g}s")
+              + "...", flush=True)
+        recorder = Recorder()
+        elapsed = Traffic(args, albums).run(base_url, users, mix, recorder)
+    except BenchmarkError as e:
+        print(e, file=sys.stderr)
+        return 2
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Benchmark failed: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if not recorder.samples:
+        print("No requests were made", file=sys.stderr)
+        return 1
+
+    summary = summarize(recorder, elapsed)
+    print_summary(summary)
+
+    output = args.output or f"fmm-benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "target": target,
+            "seed": {"users": args.users, "albums": args.albums, "media": args.media,
+                     "shares_per_media": args.shares_per_media,
+                     "comments_per_media": args.comments_per_media, "random_seed": args.seed},
+            "traffic": {"mix": mix, "concurrency": args.concurrency, "duration": args.duration,
+                        "iterations": args.iterations, "scroll_pages": args.scroll_pages,
+                        "per_page": args.per_page, "include_counts": args.include_counts,
+                        "burst_size": args.burst_size, "upload_kb": args.upload_kb},
+            "results": summary,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare and not compare(summary, args.compare, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
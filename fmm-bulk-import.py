@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+###############################################################################
+# Family Media Manager - Bulk Importer
+# Uploads a whole folder tree of photos and videos to the family gallery
+#
+# Uses the WordPress address saved by the setup wizard in
+# ~/.fmm-setup/config.json and a WordPress Application Password
+# (Users -> Profile -> Application Passwords) for the uploading user:
+#
+#   FMM_APP_PASSWORD="abcd efgh ijkl mnop qrst uvwx" \
+#       python3 fmm-bulk-import.py ~/Pictures/family --username grandma
+#
+# Progress is recorded in a journal, so running the same command again after
+# an interruption skips everything that was already uploaded.
+###############################################################################
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import hashlib
+import argparse
+import mimetypes
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+CONFIG_FILE = Path.home() / ".fmm-setup" / "config.json"
+JOURNAL_DIR = CONFIG_FILE.parent / "imports"
+UPLOAD_ROUTE = "/wp-json/family-gallery/v1/upload"
+
+# What Family_Media_Manager_Uploader accepts
+MEDIA_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp4", ".mov", ".avi", ".webm")
+MAX_FILE_SIZE = 100 * 1024 * 1024
+
+SEND_CHUNK_SIZE = 256 * 1024
+MAX_ATTEMPTS = 3
+JOURNAL_SYNC_EVERY = 25
+PROGRESS_INTERVAL = 2.0
+
+
+class ImportAborted(Exception):
+    """Problem that stops the whole import (bad settings, rejected login)"""
+
+
+def load_config(path):
+    """Read the setup wizard's config.json (empty if it doesn't exist)"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def find_media(root):
+    """Yield (relative path, absolute path) for every file the gallery accepts"""
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith(".") or not name.lower().endswith(MEDIA_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def format_size(num_bytes):
+    """Human readable size, e.g. 1.5 MB"""
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+###############################################################################
+# Journal
+###############################################################################
+
+class Journal:
+    """Append-only record of finished uploads (one JSON object per line).
+
+    A file counts as imported while its size and modification time match
+    the journal entry, so edited files are uploaded again.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.done = {}
+        self.pending_sync = 0
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # half-written last line from a crash
+                    if entry.get("status") == "done":
+                        self.done[entry["path"]] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def is_done(self, rel, stat):
+        entry = self.done.get(rel)
+        return bool(entry) and entry["size"] == stat.st_size and entry["mtime"] == int(stat.st_mtime)
+
+    def record(self, rel, stat, status, **extra):
+        entry = dict(path=rel, size=stat.st_size, mtime=int(stat.st_mtime), status=status, **extra)
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        if status == "done":
+            self.done[rel] = entry
+        self.pending_sync += 1
+        if self.pending_sync >= JOURNAL_SYNC_EVERY:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.pending_sync = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def default_journal(root, wp_url):
+    """One journal per (folder, site) pair under ~/.fmm-setup/imports"""
+    key = hashlib.sha256(f"{os.path.abspath(root)}\n{wp_url}".encode('utf-8')).hexdigest()[:16]
+    return JOURNAL_DIR / f"{key}.jsonl"
+
+
+###############################################################################
+# Uploading
+###############################################################################
+
+class Uploader:
+    """Posts files to the upload endpoint, one keep-alive connection per thread"""
+
+    def __init__(self, wp_url, username, password, timeout=300):
+        url = urlsplit(wp_url)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise ImportAborted(f"Not a valid WordPress address: {wp_url}")
+
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.route = url.path.rstrip("/") + UPLOAD_ROUTE
+        self.timeout = timeout
+        token = base64.b64encode(f"{username}:{password}".encode('utf-8')).decode('ascii')
+        self.auth = "Basic " + token
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def reset(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def multipart(self, path, fields):
+        """(body iterator, content type, length) streaming the file from disk"""
+        boundary = uuid.uuid4().hex
+        name = os.path.basename(path).replace('"', "")
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        head = b""
+        for key, value in fields.items():
+            head += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{key}\"\r\n\r\n"
+                     f"{value}\r\n").encode('utf-8')
+        head += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"photo\"; "
+                 f"filename=\"{name}\"\r\nContent-Type: {mime_type}\r\n\r\n").encode('utf-8')
+        tail = f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+        def body():
+            yield head
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(SEND_CHUNK_SIZE), b''):
+                    yield chunk
+            yield tail
+
+        length = len(head) + os.path.getsize(path) + len(tail)
+        return body(), f"multipart/form-data; boundary={boundary}", length
+
+    def upload(self, path, fields):
+        """Upload one file; returns the parsed JSON response.
+
+        Connection problems and server errors are retried with a fresh
+        connection; a rejected login raises ImportAborted to stop the import.
+        """
+        last_error = None
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(2 ** attempt)
+            body, content_type, length = self.multipart(path, fields)
+            try:
+                conn = self.connection()
+                conn.request("POST", self.route, body=body, headers={
+                    "Authorization": self.auth,
+                    "Content-Type": content_type,
+                    "Content-Length": str(length),
+                    "Connection": "keep-alive",
+                })
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.reset()
+                last_error = str(e) or e.__class__.__name__
+                continue
+
+            if response.will_close:
+                self.reset()
+
+            try:
+                result = json.loads(data or b"{}")
+            except ValueError:
+                result = {}
+
+            if response.status in (401, 403):
+                raise ImportAborted(f"WordPress rejected the login ({response.status}): "
+                                   f"{result.get('message', 'check the username and application password')}")
+            if 200 <= response.status < 300:
+                return result
+
+            last_error = result.get("message") or f"HTTP {response.status}"
+            if response.status < 500:
+                break
+
+        raise RuntimeError(last_error)
+
+
+###############################################################################
+# Command line
+###############################################################################
+
+def print_json_event(event, **data):
+    """Print one JSON progress line (for scripts driving the importer)"""
+    print(json.dumps(dict(event=event, **data)), flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Upload a folder of photos and videos to Family Media Manager. "
+                    "Interrupted imports pick up where they stopped."
+    )
+    parser.add_argument("folder", help="folder to import (searched recursively)")
+    parser.add_argument("--config", default=str(CONFIG_FILE),
+                        help="setup wizard configuration to read the WordPress "
+                             "address from (default: %(default)s)")
+    parser.add_argument("--wp-url", help="WordPress address (overrides the config file)")
+    parser.add_argument("--username", help="WordPress username to upload as")
+    parser.add_argument("--app-password",
+                        help="WordPress application password (or set FMM_APP_PASSWORD)")
+    parser.add_argument("--album-id", type=int, help="add every file to this album")
+    parser.add_argument("--connections", type=int, default=4,
+                        help="uploads to run at once (default: %(default)s)")
+    parser.add_argument("--journal", help="journal file (default: one per folder and site "
+                                          "under ~/.fmm-setup/imports)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only count what would be uploaded")
+    parser.add_argument("--json", action="store_true",
+                        help="print JSON progress lines instead of text")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {args.config}: {e}", file=sys.stderr)
+        return 2
+
+    wp_url = (args.wp_url or config.get("wp_url") or "").rstrip("/")
+    username = args.username or config.get("username")
+    password = args.app_password or os.environ.get("FMM_APP_PASSWORD") or config.get("app_password")
+
+    if not os.path.isdir(args.folder):
+        print(f"Folder not found: {args.folder}", file=sys.stderr)
+        return 2
+    if not wp_url:
+        print("No WordPress address: run the setup wizard or pass --wp-url", file=sys.stderr)
+        return 2
+    if not args.dry_run and not (username and password):
+        print("Pass --username and --app-password (or set FMM_APP_PASSWORD)", file=sys.stderr)
+        return 2
+
+    journal = Journal(args.journal or default_journal(args.folder, wp_url))
+
+    # Work out what's left to do
+    todo = []
+    skipped = too_big = 0
+    for rel, path in find_media(args.folder):
+        stat = os.stat(path)
+        if journal.is_done(rel, stat):
+            skipped += 1
+        elif stat.st_size > MAX_FILE_SIZE:
+            too_big += 1
+        else:
+            todo.append((rel, path, stat))
+    total_bytes = sum(stat.st_size for _, _, stat in todo)
+
+    if args.json:
+        print_json_event("plan", files=len(todo), bytes=total_bytes,
+                         already_imported=skipped, too_big=too_big)
+    else:
+        print(f"{len(todo)} files to upload ({format_size(total_bytes)}), "
+              f"{skipped} already imported, {too_big} over 100MB skipped", flush=True)
+
+    if args.dry_run or not todo:
+        journal.close()
+        return 0
+
+    try:
+        uploader = Uploader(wp_url, username, password)
+    except ImportAborted as e:
+        print(e, file=sys.stderr)
+        journal.close()
+        return 2
+
+    fields = {"album_id": args.album_id} if args.album_id else {}
+    uploaded = failed = 0
+    sent_bytes = 0
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        rate = dict(files_per_second=round(uploaded / elapsed, 2),
+                    mb_per_second=round(sent_bytes / elapsed / (1024 * 1024), 2))
+        if args.json:
+            print_json_event("summary" if final else "progress", uploaded=uploaded, failed=failed,
+                             remaining=len(todo) - uploaded - failed, bytes=sent_bytes,
+                             seconds=round(elapsed, 2), **rate)
+        else:
+            print(f"{'Done: ' if final else ''}{uploaded} uploaded, {failed} failed, "
+                  f"{len(todo) - uploaded - failed} left - "
+                  f"{rate['files_per_second']:.1f} files/s, {rate['mb_per_second']:.2f} MB/s", flush=True)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, args.connections))
+    pending = {}
+    queue = iter(todo)
+    status = 0
+
+    def submit_next():
+        item = next(queue, None)
+        if item is not None:
+            pending[pool.submit(uploader.upload, item[1], fields)] = item
+
+    def collect(future):
+        nonlocal uploaded, failed, sent_bytes
+        rel, path, stat = pending.pop(future)
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except ImportAborted:
+            raise
+        except Exception as e:
+            failed += 1
+            journal.record(rel, stat, "failed", error=str(e))
+            if not args.json:
+                print(f"Failed: {rel}: {e}", file=sys.stderr, flush=True)
+        else:
+            uploaded += 1
+            sent_bytes += stat.st_size
+            journal.record(rel, stat, "done", media_id=result.get("media_id"))
+
+    try:
+        # Keep only a few uploads queued per connection so Ctrl+C stops quickly
+        for _ in range(max(1, args.connections) * 2):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(future)
+                submit_next()
+
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.perf_counter()
+                report()
+    except ImportAborted as e:
+        print(e, file=sys.stderr)
+        status = 2
+    except KeyboardInterrupt:
+        print("Interrupted - finishing the uploads in progress; "
+              "run the same command again to continue", file=sys.stderr)
+        status = 130
+    finally:
+        # Let in-flight uploads finish so they are journaled, not repeated
+        pool.shutdown(wait=True, cancel_futures=True)
+        for future in list(pending):
+            try:
+                collect(future)
+            except ImportAborted:
+                pass
+        journal.close()
+
+    report(final=True)
+    if status:
+        return status
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+###############################################################################
+# Family Media Manager - Google Drive Stand-in
+# A small local HTTP server that speaks the parts of the Drive v3 API the
+# plugin uses, so uploads can be tested without a Google account
+#
+#   python3 fmm-drive-stub.py --port 8765 --drop-every 3
+#
+# then add this to wp-config.php:
+#
+#   define('FAMILY_MEDIA_MANAGER_DRIVE_API', 'http://127.0.0.1:8765');
+#
+# Supported: folder search/create, resumable uploads (including status
+# queries and resuming), downloads with ?alt=media, and deletes. Any bearer
+# token is accepted. --drop-every N cuts the connection halfway through every
+# Nth upload chunk to exercise the plugin's resume logic.
+###############################################################################
+
+import os
+import re
+import sys
+import json
+import uuid
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+COPY_CHUNK_SIZE = 64 * 1024
+
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class DriveStub:
+    """In-memory file list and upload sessions, with contents on disk"""
+
+    def __init__(self, storage_dir, drop_every=0):
+        self.storage_dir = storage_dir
+        self.drop_every = drop_every
+        self.files = {}
+        self.sessions = {}
+        self.chunks = 0
+        self.lock = threading.Lock()
+
+    def new_id(self):
+        return uuid.uuid4().hex
+
+    def add_file(self, metadata, path=None, size=0):
+        file = {
+            "kind": "drive#file",
+            "id": self.new_id(),
+            "name": metadata.get("name", "Untitled"),
+            "mimeType": metadata.get("mimeType", "application/octet-stream"),
+            "parents": metadata.get("parents", []),
+            "size": str(size),
+        }
+        with self.lock:
+            self.files[file["id"]] = dict(file, path=path)
+        return file
+
+    def find(self, name=None, folders_only=False):
+        with self.lock:
+            files = list(self.files.values())
+        return [
+            {key: value for key, value in f.items() if key != "path"}
+            for f in files
+            if (name is None or f["name"] == name)
+            and (not folders_only or f["mimeType"] == FOLDER_MIME_TYPE)
+        ]
+
+    def should_drop(self):
+        """Count an upload chunk; True if this one should be cut off"""
+        with self.lock:
+            self.chunks += 1
+            return self.drop_every > 0 and self.chunks % self.drop_every == 0
+
+
+class DriveStubHandler(BaseHTTPRequestHandler):
+    server_version = "FMMDriveStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def drive(self):
+        return self.server.drive
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    # -- helpers --------------------------------------------------------------
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": {"code": status, "message": message}})
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def authorized(self, query):
+        header = self.headers.get("Authorization", "")
+        if header.startswith("Bearer ") and header[7:].strip():
+            return True
+        return bool(query.get("access_token", [""])[0])
+
+    def route(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if not self.authorized(query):
+            self.send_error_json(401, "Missing access token")
+            return None, None
+        return url.path.rstrip("/"), query
+
+    # -- endpoints ------------------------------------------------------------
+
+    def do_GET(self):
+        path, query = self.route()
+        if path is None:
+            return
+
+        if path == "/drive/v3/files":
+            q = query.get("q", [""])[0]
+            name = re.search(r"name='((?:[^'\\]|\\.)*)'", q)
+            files = self.drive.find(
+                name.group(1) if name else None,
+                folders_only=FOLDER_MIME_TYPE in q
+            )
+            self.send_json(200, {"kind": "drive#fileList", "files": files})
+            return
+
+        match = re.fullmatch(r"/drive/v3/files/([^/]+)", path)
+        if match:
+            with self.drive.lock:
+                file = self.drive.files.get(match.group(1))
+            if not file:
+                self.send_error_json(404, "File not found")
+            elif query.get("alt", [""])[0] == "media":
+                self.send_media(file)
+            else:
+                self.send_json(200, {k: v for k, v in file.items() if k != "path"})
+            return
+
+        self.send_error_json(404, "Not found")
+
+    def send_media(self, file):
+        if not file["path"]:
+            self.send_error_json(400, "File has no content")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", file["mimeType"])
+        self.send_header("Content-Length", file["size"])
+        self.end_headers()
+        with open(file["path"], "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                self.wfile.write(chunk)
+
+    def do_DELETE(self):
+        path, query = self.route()
+        if path is None:
+            return
+
+        match = re.fullmatch(r"/drive/v3/files/([^/]+)", path)
+        if not match:
+            self.send_error_json(404, "Not found")
+            return
+
+        with self.drive.lock:
+            file = self.drive.files.pop(match.group(1), None)
+        if not file:
+            self.send_error_json(404, "File not found")
+            return
+        if file["path"]:
+            try:
+                os.remove(file["path"])
+            except OSError:
+                pass
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        path, query = self.route()
+        if path is None:
+            return
+
+        try:
+            metadata = json.loads(self.read_body() or b"{}")
+        except ValueError:
+            self.send_error_json(400, "Invalid JSON")
+            return
+
+        if path == "/drive/v3/files":
+            self.send_json(200, self.drive.add_file(metadata))
+            return
+
+        if path == "/upload/drive/v3/files" and query.get("uploadType") == ["resumable"]:
+            self.start_session(metadata)
+            return
+
+        self.send_error_json(400, "Only resumable uploads are supported")
+
+    def start_session(self, metadata):
+        total = self.headers.get("X-Upload-Content-Length")
+        upload_id = self.drive.new_id()
+        fd, path = tempfile.mkstemp(prefix="upload-", dir=self.drive.storage_dir)
+        os.close(fd)
+
+        if metadata.get("mimeType") is None and self.headers.get("X-Upload-Content-Type"):
+            metadata["mimeType"] = self.headers["X-Upload-Content-Type"]
+
+        with self.drive.lock:
+            self.drive.sessions[upload_id] = {
+                "metadata": metadata,
+                "total": int(total) if total else None,
+                "received": 0,
+                "path": path,
+            }
+
+        host = self.headers.get("Host") or "%s:%d" % self.server.server_address[:2]
+        location = f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+        self.send_json(200, {}, {"Location": location})
+
+    def do_PUT(self):
+        path, query = self.route()
+        if path is None:
+            return
+
+        upload_id = query.get("upload_id", [""])[0]
+        with self.drive.lock:
+            session = self.drive.sessions.get(upload_id)
+        if path != "/upload/drive/v3/files" or not session:
+            self.read_body()
+            self.send_error_json(404, "Upload session not found")
+            return
+
+        match = CONTENT_RANGE.fullmatch(self.headers.get("Content-Range", "").strip())
+        if not match:
+            self.read_body()
+            self.send_error_json(400, "Bad Content-Range")
+            return
+
+        start, end, total = match.groups()
+        if total != "*":
+            session["total"] = int(total)
+        length = int(self.headers.get("Content-Length") or 0)
+
+        if start is None or length == 0:
+            # Status query
+            self.read_body()
+            self.send_progress(session, upload_id)
+            return
+
+        start, end = int(start), int(end)
+        if start != session["received"] or end - start + 1 != length:
+            self.read_body()
+            self.send_progress(session, upload_id)
+            return
+
+        # Cut the connection halfway through, keeping what arrived, like a
+        # phone losing signal mid-upload
+        drop = self.drive.should_drop()
+        wanted = length // 2 if drop else length
+
+        with open(session["path"], "r+b") as f:
+            f.seek(start)
+            remaining = wanted
+            while remaining:
+                data = self.rfile.read(min(COPY_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                f.write(data)
+                remaining -= len(data)
+        session["received"] = start + wanted - remaining
+
+        if drop or remaining:
+            self.close_connection = True
+            self.connection.close()
+            return
+
+        self.send_progress(session, upload_id)
+
+    def send_progress(self, session, upload_id):
+        """308 with the received range, or the file once it's complete"""
+        if session["total"] is not None and session["received"] >= session["total"]:
+            with self.drive.lock:
+                self.drive.sessions.pop(upload_id, None)
+            file = self.drive.add_file(session["metadata"], session["path"], session["received"])
+            self.send_json(200, {k: file[k] for k in ("kind", "id", "name", "mimeType")})
+            return
+
+        headers = {}
+        if session["received"]:
+            headers["Range"] = f"bytes=0-{session['received'] - 1}"
+        self.send_response(308)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the Google Drive API so Family "
+                    "Media Manager uploads can be tested offline."
+    )
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument("--storage", metavar="DIR",
+                        help="folder to keep uploaded files in (default: a temporary folder)")
+    parser.add_argument("--drop-every", type=int, default=0, metavar="N",
+                        help="drop the connection halfway through every Nth upload chunk")
+    parser.add_argument("--quiet", action="store_true",
+                        help="don't log each request")
+    return parser
+
+
+def make_server(host, port, storage_dir, drop_every=0, quiet=False):
+    """Create (but don't start) the stand-in server"""
+    server = ThreadingHTTPServer((host, port), DriveStubHandler)
+    server.daemon_threads = True
+    server.drive = DriveStub(storage_dir, drop_every)
+    server.quiet = quiet
+    return server
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    storage_dir = args.storage or tempfile.mkdtemp(prefix="fmm-drive-")
+    os.makedirs(storage_dir, exist_ok=True)
+
+    server = make_server(args.host, args.port, storage_dir, args.drop_every, args.quiet)
+    host, port = server.server_address[:2]
+    print(f"Drive stand-in listening on http://{host}:{port} (files in {storage_dir})", flush=True)
+    print(f"Add to wp-config.php: define('FAMILY_MEDIA_MANAGER_DRIVE_API', 'http://{host}:{port}');",
+          flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
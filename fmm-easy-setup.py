@@ -2,17 +2,1244 @@
 ###############################################################################
 # Family Media Manager - Easy Setup Wizard (GUI)
 # Cross-platform graphical installer for Windows, Linux, and macOS
+#
+# Run without arguments to start the wizard, or pass --help to see the
+# options for scripted (headless) installs.
 ###############################################################################
 
-import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox, ttk
 import os
 import sys
 import shutil
 import re
 import json
+import hashlib
+import argparse
+import queue
+import threading
+import time
+import tempfile
+import gzip
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
+try:
+    import brotli  # optional - enables .br precompressed PWA assets
+except ImportError:
+    brotli = None
+
+# tkinter is only imported when the wizard starts (see load_tkinter), so the
+# command-line installer works on headless servers and starts quickly
+tk = filedialog = messagebox = ttk = None
+
+
+# Files that make up the WordPress plugin (relative to the setup folder)
+PLUGIN_FILES = [
+    "family-media-manager.php",
+    "includes",
+    "admin",
+    "public"
+]
+
+# Where the wizard and the CLI remember the last configuration
+CONFIG_FILE = Path.home() / ".fmm-setup" / "config.json"
+
+# Per-site configuration files written by --batch
+SITES_CONFIG_DIR = CONFIG_FILE.parent / "sites"
+
+# Manifest written into every deployed folder so re-installs can be incremental
+MANIFEST_NAME = ".fmm-manifest.json"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class InstallError(Exception):
+    """Raised when an install step cannot be completed"""
+
+
+class InstallCancelled(InstallError):
+    """Raised when the user cancels an install step"""
+
+
+###############################################################################
+# Incremental deploy engine
+###############################################################################
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_files(src_root, items):
+    """List every file under the given items of src_root.
+
+    Returns a dict mapping POSIX-style relative paths to absolute paths.
+    """
+    files = {}
+    src_root = Path(src_root)
+
+    for item in items:
+        src = src_root / item
+        if src.is_file():
+            paths = [src]
+        elif src.is_dir():
+            paths = sorted(p for p in src.rglob("*") if p.is_file())
+        else:
+            continue
+
+        for path in paths:
+            files[path.relative_to(src_root).as_posix()] = str(path)
+
+    return files
+
+
+def build_manifest(files, cancel=None):
+    """Hash every file in a {relative path: absolute path} dict.
+
+    Returns a dict mapping the relative paths to {"sha256", "size"}.
+    """
+    manifest = {}
+    for rel, path in files.items():
+        check_cancelled(cancel)
+        manifest[rel] = {
+            "sha256": hash_file(path),
+            "size": os.path.getsize(path)
+        }
+    return manifest
+
+
+def check_cancelled(cancel):
+    """Raise InstallCancelled if the cancel event has been set"""
+    if cancel is not None and cancel.is_set():
+        raise InstallCancelled("Installation cancelled")
+
+
+def copy_file(src, dst, on_bytes=None, cancel=None):
+    """Copy a file (with metadata) in chunks so progress and cancel stay responsive"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for chunk in iter(lambda: fsrc.read(COPY_CHUNK_SIZE), b''):
+            check_cancelled(cancel)
+            fdst.write(chunk)
+            if on_bytes:
+                on_bytes(len(chunk))
+    shutil.copystat(src, dst)
+
+
+def load_manifest(dest_dir):
+    """Load the manifest of a previous deploy, or {} if there is none"""
+    manifest_path = os.path.join(dest_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r') as f:
+            data = json.load(f)
+        return data.get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(dest_dir, files):
+    """Atomically write the manifest into dest_dir"""
+    manifest_path = os.path.join(dest_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"version": 1, "files": files}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def _deployed_mtime(dest_path, wanted, previous):
+    """Return the mtime of the deployed copy if it already matches the source.
+
+    Returns None when the file is missing or its contents differ.
+    """
+    try:
+        stat = os.stat(dest_path)
+    except OSError:
+        return None
+
+    if stat.st_size != wanted["size"]:
+        return None
+
+    # Trust the previous manifest as long as nobody touched the file since
+    if previous and previous.get("sha256") == wanted["sha256"] \
+            and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return stat.st_mtime_ns
+
+    # No (or stale) manifest entry - compare the contents directly
+    if hash_file(dest_path) == wanted["sha256"]:
+        return stat.st_mtime_ns
+
+    return None
+
+
+def _remove_empty_dirs(root, rel_paths):
+    """Remove directories left empty after deleting rel_paths"""
+    parents = set()
+    for rel in rel_paths:
+        parent = os.path.dirname(rel)
+        while parent:
+            parents.add(parent)
+            parent = os.path.dirname(parent)
+
+    # Deepest first so children are removed before their parents
+    for rel in sorted(parents, key=lambda p: p.count("/"), reverse=True):
+        try:
+            os.rmdir(os.path.join(root, rel))
+        except OSError:
+            pass
+
+
+def deploy_tree(src_root, items, dest_dir, progress=None, cancel=None):
+    """Deploy items from src_root into dest_dir (see deploy_files)"""
+    return deploy_files(collect_files(src_root, items), dest_dir, progress, cancel)
+
+
+def _link_or_copy(src, dst):
+    """Hard-link src at dst, copying it where links aren't possible"""
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _carry_over(dest_dir, staging_dir, skip, cancel=None):
+    """Link every file of dest_dir into staging_dir except the skip set.
+
+    Brings over unchanged files and anything the deploy never created, so
+    the staged tree is complete.
+    """
+    for root, dirs, names in os.walk(dest_dir):
+        check_cancelled(cancel)
+        rel_root = os.path.relpath(root, dest_dir)
+        staged_root = staging_dir if rel_root == os.curdir else os.path.join(staging_dir, rel_root)
+        os.makedirs(staged_root, exist_ok=True)
+        shutil.copymode(root, staged_root)
+
+        # os.walk doesn't descend into symlinked folders; keep them as links
+        for name in [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            dirs.remove(name)
+            names.append(name)
+
+        for name in names:
+            rel = name if rel_root == os.curdir else f"{rel_root}/{name}".replace(os.sep, "/")
+            staged = os.path.join(staged_root, name)
+            if rel in skip or os.path.lexists(staged):
+                continue
+            _link_or_copy(os.path.join(root, name), staged)
+
+
+def _recover_swap(dest_dir, previous_dir):
+    """Finish or undo a deploy that stopped between its two renames"""
+    if not os.path.isdir(previous_dir):
+        return
+    if os.path.exists(dest_dir):
+        shutil.rmtree(previous_dir, ignore_errors=True)
+    else:
+        os.rename(previous_dir, dest_dir)
+
+
+def deploy_files(sources, dest_dir, progress=None, cancel=None):
+    """Deploy a {relative path: source path} dict into dest_dir.
+
+    Only files that changed since the last deploy are copied. The new tree
+    is built in a staging folder next to dest_dir: changed files are
+    copied there, and everything else in dest_dir (unchanged files, and
+    files the deploy never created) is hard-linked in. The staged tree
+    then replaces dest_dir with two renames, so the site never serves a
+    mix of old and new files. Between the renames dest_dir is briefly
+    missing; a deploy interrupted there is put right by the next run.
+    Files removed from the source since the last deploy are left out of
+    the new tree.
+
+    progress(done_bytes, total_bytes, done_files, total_files) is called as
+    files are copied. Setting the cancel event aborts the deploy with
+    InstallCancelled while files are still being staged, leaving dest_dir
+    exactly as it was.
+
+    Returns a dict with "copied", "removed", "unchanged" and "bytes" counts.
+    """
+    dest_dir = os.path.abspath(dest_dir)
+    parent_dir = os.path.dirname(dest_dir)
+    previous_dir = os.path.join(parent_dir, f".{os.path.basename(dest_dir)}.previous")
+    _recover_swap(dest_dir, previous_dir)
+
+    wanted = build_manifest(sources, cancel)
+    previous = load_manifest(dest_dir)
+    fresh_install = not os.path.isdir(dest_dir)
+
+    changed = []
+    files = {}
+    for rel, entry in wanted.items():
+        dest_path = os.path.join(dest_dir, *rel.split("/"))
+        mtime_ns = None
+        if not fresh_install:
+            mtime_ns = _deployed_mtime(dest_path, entry, previous.get(rel))
+
+        if mtime_ns is None:
+            changed.append(rel)
+        else:
+            files[rel] = dict(entry, mtime_ns=mtime_ns)
+
+    removed = [rel for rel in previous if rel not in wanted]
+
+    stats = {
+        "copied": len(changed),
+        "removed": len(removed),
+        "unchanged": len(wanted) - len(changed),
+        "bytes": sum(wanted[rel]["size"] for rel in changed)
+    }
+
+    # Nothing to do - don't touch a single file, not even the manifest
+    if not changed and not removed and files == previous:
+        return stats
+
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = os.path.join(
+        parent_dir,
+        f".{os.path.basename(dest_dir)}.staging-{os.getpid()}-{threading.get_ident()}"
+    )
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+
+    done = {"bytes": 0, "files": 0}
+
+    def on_bytes(count):
+        done["bytes"] += count
+        if progress:
+            progress(done["bytes"], stats["bytes"], done["files"], len(changed))
+
+    try:
+        # Stage: copy every added/changed file
+        for rel in changed:
+            check_cancelled(cancel)
+            staged = os.path.join(staging_dir, *rel.split("/"))
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            size = wanted[rel]["size"]
+            # Only large files report progress while they are being copied
+            copy_file(sources[rel], staged, on_bytes if size > COPY_CHUNK_SIZE else None, cancel)
+            if size <= COPY_CHUNK_SIZE:
+                done["bytes"] += size
+            done["files"] += 1
+            files[rel] = dict(wanted[rel], mtime_ns=os.stat(staged).st_mtime_ns)
+            if progress:
+                progress(done["bytes"], stats["bytes"], done["files"], len(changed))
+
+        # ...and link in the rest of the live tree
+        if not fresh_install:
+            _carry_over(dest_dir, staging_dir, set(changed) | set(removed) | {MANIFEST_NAME}, cancel)
+            _remove_empty_dirs(staging_dir, removed)
+
+        write_manifest(staging_dir, files)
+
+        # From here on the deploy can't be cancelled - it only renames folders
+        if fresh_install:
+            os.rename(staging_dir, dest_dir)
+        else:
+            os.rename(dest_dir, previous_dir)
+            os.rename(staging_dir, dest_dir)
+            shutil.rmtree(previous_dir, ignore_errors=True)
+    finally:
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return stats
+
+
+def format_size(num_bytes):
+    """Human readable file size"""
+    for unit in ("bytes", "KB", "MB"):
+        if num_bytes < 1024 or unit == "MB":
+            break
+        num_bytes /= 1024
+    return f"{num_bytes:.0f} {unit}" if unit == "bytes" else f"{num_bytes:.1f} {unit}"
+
+
+###############################################################################
+# PWA asset pipeline (minify, fingerprint, precompress)
+###############################################################################
+
+# Text files that get .gz / .br siblings
+PRECOMPRESS_EXTENSIONS = (".js", ".css", ".html", ".json")
+
+# Don't bother precompressing tiny files
+PRECOMPRESS_MIN_SIZE = 512
+
+FINGERPRINT_LENGTH = 10
+
+# Scripts combined by --bundle, in the order they have to run
+BUNDLE_SCRIPTS = (
+    "js/auth.js",
+    "js/resize.js",
+    "js/camera.js",
+    "js/upload.js",
+    "js/gallery.js",
+    "js/albums.js",
+    "js/app.js",
+)
+BUNDLE_NAME = "js/bundle.js"
+MINIFIED_BUNDLE_NAME = "js/bundle.min.js"
+
+# Files the service worker downloads when it installs
+PRECACHE_EXTENSIONS = (".html", ".js", ".css", ".json", ".png", ".jpg", ".svg", ".ico", ".webp")
+PRECACHE_PREFIX = "family-gallery-"
+
+# Limits for the service worker's runtime caches, keyed by the constant that
+# names each cache. Override with "cache_budgets" in the config file, e.g.
+# {"IMAGE_CACHE": {"max_entries": 5000, "max_mb": 250}}
+DEFAULT_CACHE_BUDGETS = {
+    "API_CACHE": {"max_entries": 200, "max_mb": 5},
+    "IMAGE_CACHE": {"max_entries": 2000, "max_mb": 100},
+}
+
+VLQ_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+JS_WORD_CHARS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+
+# Keywords after which a "/" starts a regular expression, not a division
+JS_REGEX_KEYWORDS = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await"
+}
+
+
+def _read_js_string(source, i):
+    """Return the index just past the string literal starting at source[i]"""
+    quote = source[i]
+    i += 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == "\\" else 1
+    return i + 1
+
+
+def _read_js_regex(source, i):
+    """Return the index just past the regex literal (and flags) starting at source[i]"""
+    i += 1
+    in_class = False
+    while i < len(source):
+        c = source[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            break
+        elif c == "\n":
+            break
+        i += 1
+    i += 1
+    while i < len(source) and source[i] in JS_WORD_CHARS:
+        i += 1
+    return i
+
+
+def minify_js_lines(source):
+    """Strip comments and redundant whitespace from JavaScript.
+
+    Line breaks are kept (so automatic semicolon insertion behaves exactly
+    as before) and string, template and regex literals are copied as-is.
+    Returns a list of (source line index, minified line) tuples.
+    """
+    out = []
+    line = []
+    line_start = None
+    src_line = 0
+    pending_space = False
+    last_token = ""          # last significant character or word emitted
+    template_depths = []     # brace depth of each open ${ ... } expression
+    brace_depth = 0
+    i = 0
+    n = len(source)
+
+    def emit(text):
+        nonlocal line_start, pending_space
+        if line_start is None:
+            line_start = src_line
+        if pending_space and line:
+            prev = line[-1][-1]
+            first = text[0]
+            if (prev in JS_WORD_CHARS and first in JS_WORD_CHARS) \
+                    or (prev in "+-" and first in "+-") or "/" in (prev, first):
+                line.append(" ")
+        pending_space = False
+        line.append(text)
+
+    def end_line():
+        nonlocal line, line_start, pending_space
+        if line:
+            out.append((line_start, "".join(line)))
+        line = []
+        line_start = None
+        pending_space = False
+
+    def read_template(i):
+        """Find the end of template text: the closing backtick or the next ${"""
+        while i < n:
+            if source[i] == "\\":
+                i += 2
+                continue
+            if source[i] == "`":
+                return i + 1, False
+            if source.startswith("${", i):
+                return i + 2, True
+            i += 1
+        return i, False
+
+    while i < n:
+        c = source[i]
+
+        if c == "\n":
+            end_line()
+            src_line += 1
+            i += 1
+        elif c in " \t\r\f\v":
+            pending_space = True
+            i += 1
+        elif source.startswith("//", i):
+            while i < n and source[i] != "\n":
+                i += 1
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            newlines = source.count("\n", i, end)
+            if newlines:
+                end_line()
+                src_line += newlines
+            else:
+                pending_space = True
+            i = end
+        elif c in "\"'":
+            end = _read_js_string(source, i)
+            emit(source[i:end])
+            last_token = c
+            i = end
+        elif c == "`" or (c == "}" and template_depths and brace_depth == template_depths[-1]):
+            if c == "}":
+                template_depths.pop()
+            end, opens_expression = read_template(i + 1)
+            # Literal line breaks inside a template become \n escapes so the
+            # output keeps one statement line per source line
+            text = source[i:end]
+            src_line += text.count("\n")
+            emit(text.replace("\r\n", "\n").replace("\n", "\\n"))
+            if opens_expression:
+                template_depths.append(brace_depth)
+                last_token = "{"
+            else:
+                last_token = "`"
+            i = end
+        elif c == "/" and (last_token == "" or last_token in JS_REGEX_KEYWORDS
+                           or last_token in "(,=:[!&|?{};+-*%<>~^"):
+            end = _read_js_regex(source, i)
+            emit(source[i:end])
+            last_token = "/"
+            i = end
+        elif c in JS_WORD_CHARS:
+            end = i
+            while end < n and source[end] in JS_WORD_CHARS:
+                end += 1
+            word = source[i:end]
+            emit(word)
+            last_token = word
+            i = end
+        else:
+            if c == "{":
+                brace_depth += 1
+            elif c == "}":
+                brace_depth -= 1
+            emit(c)
+            last_token = c
+            i += 1
+
+    end_line()
+    return out
+
+
+def minify_js(source):
+    """Minify JavaScript (see minify_js_lines)"""
+    return "\n".join(text for _, text in minify_js_lines(source)) + "\n"
+
+
+def _minify_css_code(css):
+    """Collapse whitespace in a piece of CSS that contains no strings"""
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}")
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    parts = []
+    code = []
+    i = 0
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            code.append(" ")
+        elif c in "\"'":
+            # Strings are copied untouched
+            end = _read_js_string(source, i)
+            parts.append(_minify_css_code("".join(code)))
+            parts.append(source[i:end])
+            code = []
+            i = end
+        else:
+            code.append(c)
+            i += 1
+    parts.append(_minify_css_code("".join(code)))
+
+    return "".join(parts).strip() + "\n"
+
+
+def fingerprint_name(rel, content):
+    """js/app.js -> js/app.<hash>.js, with the hash taken from the content"""
+    digest = hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]
+    base, ext = os.path.splitext(rel)
+    return f"{base}.{digest}{ext}"
+
+
+def rewrite_asset_references(content, renamed):
+    """Point references to original asset paths at their fingerprinted names"""
+    for old, new in renamed.items():
+        content = re.sub(
+            r"(?<=[\"'/])" + re.escape(old) + r"(?=[\"'?#])",
+            new,
+            content
+        )
+    return content
+
+
+def precompress(data):
+    """Return {".gz": bytes, ".br": bytes} for the encodings that pay off.
+
+    gzip output is made reproducible (no timestamp) so unchanged files hash
+    the same on every install. Brotli is used when the optional brotli
+    package is installed.
+    """
+    variants = {}
+    if len(data) < PRECOMPRESS_MIN_SIZE:
+        return variants
+
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        variants[".gz"] = gz
+
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            variants[".br"] = br
+
+    return variants
+
+
+def _vlq(value):
+    """Encode one source map field as base64 VLQ"""
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    out = ""
+    while True:
+        digit = value & 31
+        value >>= 5
+        if value:
+            digit |= 32
+        out += VLQ_CHARS[digit]
+        if not value:
+            return out
+
+
+def bundle_scripts(scripts, bundle_name, minify=True):
+    """Concatenate scripts into one bundle with a version 3 source map.
+
+    scripts is an ordered list of (relative path, source) pairs. Every line
+    of the bundle is mapped back to the line (and first column) it came
+    from, and the original sources are embedded in the map so the browser's
+    developer tools can show them without fetching anything else.
+    Returns (bundle text, source map dict).
+    """
+    lines = []
+    mappings = []
+    prev_source = prev_line = prev_column = 0
+
+    for index, (rel, source) in enumerate(scripts):
+        source_lines = source.split("\n")
+        if minify:
+            pieces = minify_js_lines(source)
+        else:
+            pieces = list(enumerate(source_lines))
+            if pieces and pieces[-1][1] == "":
+                pieces.pop()
+
+        for src_line, text in pieces:
+            original = source_lines[src_line]
+            column = len(original) - len(original.lstrip()) if minify else 0
+            mappings.append(
+                "A" + _vlq(index - prev_source) + _vlq(src_line - prev_line)
+                + _vlq(column - prev_column)
+            )
+            prev_source, prev_line, prev_column = index, src_line, column
+            lines.append(text)
+
+        # Keep each file's last statement separate from the next file
+        lines.append(";")
+        mappings.append("")
+
+    map_name = os.path.basename(bundle_name) + ".map"
+    lines.append(f"//# sourceMappingURL={map_name}")
+
+    source_map = {
+        "version": 3,
+        "file": os.path.basename(bundle_name),
+        "sources": [os.path.relpath(rel, os.path.dirname(bundle_name)) for rel, _ in scripts],
+        "sourcesContent": [source for _, source in scripts],
+        "names": [],
+        "mappings": ";".join(mappings),
+    }
+    return "\n".join(lines) + "\n", source_map
+
+
+def replace_asset_group(content, patterns, replacement):
+    """Remove every match of patterns, putting replacement where the first one was.
+
+    replacement is expanded against the first match, so it can reuse its
+    groups (e.g. the indentation of the line it replaces).
+    """
+    matches = sorted(
+        (m for pattern in patterns for m in re.finditer(pattern, content)),
+        key=lambda m: m.start()
+    )
+    if not matches:
+        return content
+
+    parts = []
+    last = 0
+    for i, m in enumerate(matches):
+        parts.append(content[last:m.start()])
+        if i == 0:
+            parts.append(m.expand(replacement))
+        last = m.end()
+    parts.append(content[last:])
+    return "".join(parts)
+
+
+###############################################################################
+# Install engine (no GUI code - shared by the wizard and the command line)
+###############################################################################
+
+PWA_HTACCESS = """# Force HTTPS (required for PWA)
+RewriteEngine On
+RewriteCond %{HTTPS} off
+RewriteRule ^ https://%{HTTP_HOST}%{REQUEST_URI} [L,R=301]
+
+# Service Worker
+<Files "service-worker.js">
+    Header set Service-Worker-Allowed "/"
+    Header set Cache-Control "max-age=0, no-cache, no-store, must-revalidate"
+</Files>
+
+# Cache static assets
+<FilesMatch "\\.(css|js|jpg|jpeg|png|gif|webp)$">
+    Header set Cache-Control "max-age=31536000, public"
+</FilesMatch>
+"""
+
+# Used when the asset pipeline has fingerprinted and precompressed the files
+PWA_HTACCESS_OPTIMIZED = """# Force HTTPS (required for PWA)
+RewriteEngine On
+RewriteCond %{HTTPS} off
+RewriteRule ^ https://%{HTTP_HOST}%{REQUEST_URI} [L,R=301]
+
+# Serve the precompressed .br / .gz copies written by the installer
+RewriteCond %{HTTP:Accept-Encoding} br
+RewriteCond %{REQUEST_FILENAME}.br -f
+RewriteRule ^(.+)\\.(js|css|html|json)$ $1.$2.br [L]
+
+RewriteCond %{HTTP:Accept-Encoding} gzip
+RewriteCond %{REQUEST_FILENAME}.gz -f
+RewriteRule ^(.+)\\.(js|css|html|json)$ $1.$2.gz [L]
+
+RewriteRule \\.js\\.(br|gz)$ - [T=application/javascript,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.css\\.(br|gz)$ - [T=text/css,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.html\\.(br|gz)$ - [T=text/html,E=no-gzip:1,E=no-brotli:1]
+RewriteRule \\.json\\.(br|gz)$ - [T=application/json,E=no-gzip:1,E=no-brotli:1]
+
+<FilesMatch "\\.br$">
+    Header set Content-Encoding br
+    Header append Vary Accept-Encoding
+</FilesMatch>
+
+<FilesMatch "\\.gz$">
+    Header set Content-Encoding gzip
+    Header append Vary Accept-Encoding
+</FilesMatch>
+
+# Service Worker
+<FilesMatch "^service-worker\\.js(\\.(br|gz))?$">
+    Header set Service-Worker-Allowed "/"
+    Header set Cache-Control "max-age=0, no-cache, no-store, must-revalidate"
+</FilesMatch>
+
+# Pages are revalidated on every visit so they always point at current assets
+<FilesMatch "\\.(html|json)(\\.(br|gz))?$">
+    Header set Cache-Control "no-cache"
+</FilesMatch>
+
+# Fingerprinted scripts and styles never change - cache them forever
+<FilesMatch "\\.[0-9a-f]{10}\\.(css|js)(\\.(br|gz))?$">
+    Header set Cache-Control "max-age=31536000, public, immutable"
+</FilesMatch>
+
+# Cache images
+<FilesMatch "\\.(jpg|jpeg|png|gif|webp)$">
+    Header set Cache-Control "max-age=31536000, public"
+</FilesMatch>
+"""
+
+# Written to wp-content/uploads/family-gallery. Thumbnails are named after
+# their source's hash and versioned with ?v=, so they can be cached forever
+THUMBNAIL_HTACCESS = """# Family Media Manager thumbnails (written by fmm-easy-setup.py)
+<IfModule mod_mime.c>
+    AddType image/webp .webp
+</IfModule>
+
+# Serve the WebP copy of a thumbnail to browsers that accept it
+<IfModule mod_rewrite.c>
+    RewriteEngine On
+    RewriteCond %{HTTP_ACCEPT} image/webp
+    RewriteCond %{REQUEST_FILENAME} ^(.+)\\.jpg$
+    RewriteCond %1.webp -f
+    RewriteRule ^([0-9a-f]{64}(?:-[0-9]+)?)\\.jpg$ $1.webp [T=image/webp,E=webp:1,L]
+</IfModule>
+
+<IfModule mod_headers.c>
+    <FilesMatch "\\.(jpg|jpeg|png|webp)$">
+        Header set Cache-Control "max-age=31536000, public, immutable"
+    </FilesMatch>
+    <FilesMatch "\\.jpg$">
+        Header append Vary Accept
+    </FilesMatch>
+    Header append Vary Accept env=REDIRECT_webp
+
+    # Variant lists are read by the plugin only
+    <FilesMatch "\\.json$">
+        Header set Cache-Control "no-cache"
+    </FilesMatch>
+</IfModule>
+"""
+
+
+class FMMInstaller:
+    """Runs the install steps without any user interface.
+
+    Progress is reported through the optional progress callback, which is
+    called as progress(step, message, percent). Setting the optional cancel
+    event (a threading.Event) stops a running step with InstallCancelled
+    before anything in the live folders is changed.
+    """
+
+    def __init__(self, wp_path="", wp_url="", pwa_path="", google_client_id="",
+                 google_client_secret="", script_dir=None, progress=None, cancel=None,
+                 optimize_assets=True, bundle_scripts=False, cache_budgets=None):
+        self.wp_path = wp_path
+        self.wp_url = wp_url.rstrip("/")
+        self.pwa_path = pwa_path
+        self.google_client_id = google_client_id
+        self.google_client_secret = google_client_secret
+        self.install_pwa = False
+        self.script_dir = Path(script_dir) if script_dir else Path(__file__).parent
+        self.progress = progress
+        self.cancel = cancel
+        self.optimize_assets = optimize_assets
+        self.bundle_scripts = bundle_scripts
+        self.cache_budgets = {
+            name: dict(limits, **(cache_budgets or {}).get(name, {}))
+            for name, limits in DEFAULT_CACHE_BUDGETS.items()
+        }
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create an installer from a dict shaped like config.json"""
+        return cls(
+            wp_path=config.get("wp_path", ""),
+            wp_url=config.get("wp_url", ""),
+            pwa_path=config.get("pwa_path", ""),
+            google_client_id=config.get("google_client_id", ""),
+            google_client_secret=config.get("google_client_secret", ""),
+            optimize_assets=config.get("optimize_assets", True),
+            bundle_scripts=config.get("bundle_scripts", False),
+            cache_budgets=config.get("cache_budgets"),
+            **kwargs
+        )
+
+    @property
+    def plugin_dir(self):
+        return os.path.join(self.wp_path, "wp-content", "plugins", "family-media-manager")
+
+    @property
+    def redirect_uri(self):
+        return f"{self.wp_url}/wp-admin/admin.php?page=family-media-manager-settings&action=oauth_callback"
+
+    def report(self, step, message, percent):
+        """Send a progress update to whoever is listening"""
+        if self.progress:
+            self.progress(step, message, percent)
+
+    def validate_wordpress(self):
+        """Make sure wp_path points at a WordPress installation"""
+        if not self.wp_path:
+            raise InstallError("Please select a WordPress folder")
+
+        if not os.path.isfile(os.path.join(self.wp_path, "wp-config.php")):
+            raise InstallError("wp-config.php not found. Please select the correct folder.")
+
+    def copy_progress(self, step, label):
+        """Turn deploy_files() byte counts into progress reports"""
+        last = {"percent": None, "files": None}
+
+        def progress(done_bytes, total_bytes, done_files, total_files):
+            percent = int(100 * done_bytes / total_bytes) if total_bytes else 100
+            if (percent, done_files) == (last["percent"], last["files"]):
+                return
+            last.update(percent=percent, files=done_files)
+            self.report(
+                step,
+                f"{label}... {done_files} of {total_files} files "
+                f"({format_size(done_bytes)} of {format_size(total_bytes)})",
+                percent
+            )
+
+        return progress
+
+    def install_plugin(self):
+        """Copy the plugin into wp-content/plugins"""
+        self.report("plugin", "Checking plugin files...", 0)
+
+        try:
+            stats = deploy_tree(
+                self.script_dir,
+                PLUGIN_FILES,
+                self.plugin_dir,
+                self.copy_progress("plugin", "Copying plugin files"),
+                self.cancel
+            )
+        except OSError as e:
+            raise InstallError(f"Error installing plugin:\n\n{e}")
+
+        self.install_thumbnail_config()
+
+        self.report("plugin", "Plugin installed successfully!", 100)
+        return stats
+
+    @property
+    def thumbnail_dir(self):
+        return os.path.join(self.wp_path, "wp-content", "uploads", "family-gallery")
+
+    def install_thumbnail_config(self):
+        """Write the caching rules for the thumbnail folder
+
+        Left alone if it already matches, so redeploys don't touch it.
+        """
+        path = os.path.join(self.thumbnail_dir, ".htaccess")
+        try:
+            with open(path, encoding="utf-8") as f:
+                if f.read() == THUMBNAIL_HTACCESS:
+                    return path
+        except OSError:
+            pass
+
+        try:
+            os.makedirs(self.thumbnail_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(THUMBNAIL_HTACCESS)
+        except OSError as e:
+            raise InstallError(f"Error writing thumbnail cache settings:\n\n{e}")
+        return path
+
+    def write_build_file(self, build_dir, rel, content):
+        """Write a generated file into the PWA build folder, returning its path"""
+        path = os.path.join(build_dir, *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with open(path, mode, **({} if mode == 'wb' else {"encoding": "utf-8"})) as f:
+            f.write(content)
+        return path
+
+    def bundle_pwa(self, build_dir, sources):
+        """Combine the app's scripts into one file with a source map.
+
+        index.html loads the bundle in place of the individual scripts and
+        the service worker precaches it instead of them.
+        """
+        scripts = []
+        for rel in BUNDLE_SCRIPTS:
+            if rel in sources:
+                with open(sources.pop(rel), 'r', encoding='utf-8') as f:
+                    scripts.append((rel, f.read()))
+        if not scripts:
+            return sources
+
+        # Already minified bundles are left alone by optimize_pwa
+        bundle_rel = MINIFIED_BUNDLE_NAME if self.optimize_assets else BUNDLE_NAME
+        content, source_map = bundle_scripts(scripts, bundle_rel, minify=self.optimize_assets)
+        sources[bundle_rel] = self.write_build_file(build_dir, bundle_rel, content)
+        sources[bundle_rel + ".map"] = self.write_build_file(
+            build_dir, bundle_rel + ".map", json.dumps(source_map, separators=(",", ":"))
+        )
+
+        bundled = [re.escape(rel) for rel, _ in scripts]
+        rewrites = {
+            "index.html": (
+                [r'(?m)^([ \t]*)<script\s+src="' + rel + r'"\s*>\s*</script>[ \t]*\n' for rel in bundled],
+                rf'\1<script src="{bundle_rel}"></script>\n'
+            ),
+            "service-worker.js": (
+                [r"(?m)^([ \t]*)'/" + rel + r"',[ \t]*\n" for rel in bundled],
+                rf"\1'/{bundle_rel}',\n"
+            ),
+        }
+        for rel, (patterns, replacement) in rewrites.items():
+            if rel in sources:
+                with open(sources[rel], 'r', encoding='utf-8') as f:
+                    content = f.read()
+                content = replace_asset_group(content, patterns, replacement)
+                sources[rel] = self.write_build_file(build_dir, rel, content)
+
+        return sources
+
+    def optimize_pwa(self, build_dir, sources):
+        """Minify and fingerprint the PWA's scripts and styles.
+
+        Assets under js/ and css/ are renamed to include a hash of their
+        content, and index.html and service-worker.js are rewritten to use
+        the new names, so the files can be cached forever.
+        """
+        renamed = {}
+        for rel in sorted(sources):
+            if not rel.startswith(("js/", "css/")) or not rel.endswith((".js", ".css")):
+                continue
+
+            with open(sources.pop(rel), 'r', encoding='utf-8') as f:
+                content = f.read()
+            if rel.endswith(".js") and not rel.endswith(".min.js"):
+                content = minify_js(content)
+            elif rel.endswith(".css") and not rel.endswith(".min.css"):
+                content = minify_css(content)
+
+            new_rel = fingerprint_name(rel, content.encode('utf-8'))
+            sources[new_rel] = self.write_build_file(build_dir, new_rel, content)
+            renamed[rel] = new_rel
+
+        for rel in ("index.html", "service-worker.js"):
+            if rel in sources:
+                with open(sources[rel], 'r', encoding='utf-8') as f:
+                    content = rewrite_asset_references(f.read(), renamed)
+                sources[rel] = self.write_build_file(build_dir, rel, content)
+
+        return sources
+
+    def write_cache_budgets(self, build_dir, sources):
+        """Write the configured runtime cache limits into the service worker"""
+        if "service-worker.js" not in sources:
+            return sources
+
+        lines = ",\n".join(
+            f"    [{name}]: {{ maxEntries: {int(limits['max_entries'])}, "
+            f"maxBytes: {int(limits['max_mb'] * 1024 * 1024)} }}"
+            for name, limits in sorted(self.cache_budgets.items())
+        )
+
+        with open(sources["service-worker.js"], 'r', encoding='utf-8') as f:
+            content = f.read()
+        content = re.sub(
+            r"const CACHE_BUDGETS = \{.*?\n\};",
+            lambda m: f"const CACHE_BUDGETS = {{\n{lines}\n}};",
+            content, count=1, flags=re.DOTALL
+        )
+        sources["service-worker.js"] = self.write_build_file(build_dir, "service-worker.js", content)
+        return sources
+
+    def write_precache_manifest(self, build_dir, sources):
+        """Point the service worker's precache list at the files being deployed.
+
+        Every app file is listed with a hash of its content, and the cache
+        name is derived from the whole list, so a new install replaces the
+        cache exactly when something changed - and the service worker only
+        re-downloads the entries whose revision differs.
+        """
+        if "service-worker.js" not in sources:
+            return sources
+
+        entries = {}
+        for rel in sorted(sources):
+            if rel == "service-worker.js" or rel.startswith(".") \
+                    or not rel.endswith(PRECACHE_EXTENSIONS):
+                continue
+            entries["/" + rel] = hash_file(sources[rel])[:FINGERPRINT_LENGTH]
+        if "/index.html" in entries:
+            entries["/"] = entries["/index.html"]
+
+        precache = sorted(entries.items())
+        version = hashlib.sha256(json.dumps(precache).encode('utf-8')).hexdigest()
+        lines = ",\n".join(
+            f"    {{ url: {json.dumps(url)}, revision: {json.dumps(revision)} }}"
+            for url, revision in precache
+        )
+
+        with open(sources["service-worker.js"], 'r', encoding='utf-8') as f:
+            content = f.read()
+        content = re.sub(
+            r"const CACHE_NAME = '[^']*';",
+            f"const CACHE_NAME = '{PRECACHE_PREFIX}{version[:FINGERPRINT_LENGTH]}';",
+            content, count=1
+        )
+        content = re.sub(
+            r"const STATIC_CACHE_URLS = \[.*?\];",
+            lambda m: f"const STATIC_CACHE_URLS = [\n{lines}\n];",
+            content, count=1, flags=re.DOTALL
+        )
+        sources["service-worker.js"] = self.write_build_file(build_dir, "service-worker.js", content)
+        return sources
+
+    def precompress_pwa(self, build_dir, sources):
+        """Write .gz (and .br, if available) copies of the text files"""
+        for rel in sorted(sources):
+            if not rel.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            with open(sources[rel], 'rb') as f:
+                data = f.read()
+            for suffix, compressed in precompress(data).items():
+                sources[rel + suffix] = self.write_build_file(build_dir, rel + suffix, compressed)
+
+        return sources
+
+    def build_pwa(self, build_dir):
+        """Prepare the PWA for this site.
+
+        Returns a {relative path: source path} dict of every file to deploy.
+        Files that have to be changed for this site are written into
+        build_dir; everything else is deployed straight from pwa/.
+        """
+        pwa_src = self.script_dir / "pwa"
+        sources = {}
+        if pwa_src.is_dir():
+            sources = collect_files(pwa_src, sorted(os.listdir(pwa_src)))
+
+        # Update app.js with WordPress URL
+        if "js/app.js" in sources:
+            with open(sources["js/app.js"], 'r', encoding='utf-8') as f:
+                content = f.read()
+            content = content.replace("window.location.origin", f"'{self.wp_url}'")
+            sources["js/app.js"] = self.write_build_file(build_dir, "js/app.js", content)
+
+        if self.bundle_scripts:
+            sources = self.bundle_pwa(build_dir, sources)
+
+        if self.optimize_assets:
+            sources = self.optimize_pwa(build_dir, sources)
+
+        sources = self.write_cache_budgets(build_dir, sources)
+        sources = self.write_precache_manifest(build_dir, sources)
+
+        if self.optimize_assets:
+            sources = self.precompress_pwa(build_dir, sources)
+
+        # Create .htaccess for HTTPS redirect and caching
+        htaccess = PWA_HTACCESS_OPTIMIZED if self.optimize_assets else PWA_HTACCESS
+        sources[".htaccess"] = self.write_build_file(build_dir, ".htaccess", htaccess)
+
+        return sources
+
+    def install_pwa_files(self):
+        """Copy the PWA and point it at the WordPress site"""
+        if not self.pwa_path:
+            raise InstallError("Please select a PWA installation folder")
+
+        try:
+            self.report("pwa", "Preparing app files...", 0)
+            with tempfile.TemporaryDirectory(prefix="fmm-pwa-") as build_dir:
+                sources = self.build_pwa(build_dir)
+                check_cancelled(self.cancel)
+                stats = deploy_files(
+                    sources,
+                    self.pwa_path,
+                    self.copy_progress("pwa", "Copying app files"),
+                    self.cancel
+                )
+        except OSError as e:
+            raise InstallError(f"Error installing PWA:\n\n{e}")
+
+        self.install_pwa = True
+        self.report("pwa", "Mobile app installed successfully!", 100)
+        return stats
+
+    def config(self):
+        """Configuration as it is written to config.json"""
+        return {
+            "wp_path": self.wp_path,
+            "wp_url": self.wp_url,
+            "pwa_path": self.pwa_path,
+            "install_pwa": self.install_pwa,
+            "google_client_id": self.google_client_id,
+            "google_client_secret": self.google_client_secret,
+            "redirect_uri": self.redirect_uri,
+            "optimize_assets": self.optimize_assets,
+            "bundle_scripts": self.bundle_scripts,
+            "cache_budgets": self.cache_budget_overrides()
+        }
+
+    def cache_budget_overrides(self):
+        """Cache budgets that differ from DEFAULT_CACHE_BUDGETS, as saved in config.json"""
+        overrides = {}
+        for name, limits in self.cache_budgets.items():
+            changed = {key: value for key, value in limits.items()
+                       if DEFAULT_CACHE_BUDGETS[name].get(key) != value}
+            if changed:
+                overrides[name] = changed
+        return overrides
+
+    def save_configuration(self, config_file=None):
+        """Write the configuration to ~/.fmm-setup/config.json"""
+        config_file = Path(config_file) if config_file else CONFIG_FILE
+
+        check_cancelled(self.cancel)
+        self.report("config", "Saving configuration...", 50)
+        try:
+            config_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(config_file, 'w') as f:
+                json.dump(self.config(), f, indent=2)
+        except OSError as e:
+            raise InstallError(f"Error saving configuration:\n\n{e}")
+
+        self.report("config", "Configuration saved!", 100)
+        return config_file
+
+    def run(self, install_pwa=True, config_file=None, save_config=True):
+        """Run every install step in order, returning a summary dict"""
+        self.validate_wordpress()
+
+        if not self.wp_url:
+            raise InstallError("Please enter your WordPress URL")
+
+        summary = {"plugin": self.install_plugin(), "pwa": None, "config_file": None}
+
+        if install_pwa and self.pwa_path:
+            summary["pwa"] = self.install_pwa_files()
+
+        if save_config:
+            summary["config_file"] = str(self.save_configuration(config_file))
+
+        return summary
+
 
 class FMMSetupWizard:
     def __init__(self, root):
@@ -30,6 +1257,13 @@ class FMMSetupWizard:
         self.install_pwa = False
         self.script_dir = Path(__file__).parent
         
+        # App build settings have no screen of their own; keep whatever an
+        # earlier (possibly scripted) install saved
+        saved = load_saved_config()
+        self.optimize_assets = saved.get("optimize_assets", True)
+        self.bundle_scripts = saved.get("bundle_scripts", False)
+        self.cache_budgets = saved.get("cache_budgets")
+        
         # Style
         self.configure_style()
         
@@ -87,6 +1321,111 @@ class FMMSetupWizard:
         button_frame.pack(fill=tk.X, padx=20, pady=10)
         return button_frame
     
+    def run_install_step(self, text, work, on_success, on_cancel):
+        """Run an install step on a worker thread and show its progress.
+        
+        work(installer) runs in the background; progress comes back through
+        a queue that is polled from the Tk main loop, so the window stays
+        responsive. on_success(result) or on_cancel() is called on the main
+        thread when the step ends; errors are shown in a message box.
+        """
+        content = self.create_content_frame()
+        
+        progress_label = tk.Label(
+            content,
+            text=text,
+            font=("Arial", 11),
+            bg=self.bg_color,
+            fg=self.text_color
+        )
+        progress_label.pack(pady=20)
+        
+        progress = ttk.Progressbar(
+            content,
+            length=400,
+            mode='determinate',
+            value=0
+        )
+        progress.pack(pady=10)
+        
+        events = queue.Queue()
+        cancel = threading.Event()
+        installer = self.make_installer(
+            progress=lambda step, message, percent: events.put(("progress", (message, percent))),
+            cancel=cancel
+        )
+        
+        button_frame = self.create_button_frame()
+        
+        def request_cancel():
+            cancel.set()
+            cancel_button.config(state=tk.DISABLED)
+            progress_label.config(text="Cancelling...")
+        
+        cancel_button = tk.Button(
+            button_frame,
+            text="Cancel",
+            command=request_cancel,
+            width=15
+        )
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        def worker():
+            try:
+                events.put(("done", work(installer)))
+            except InstallCancelled:
+                events.put(("cancelled", None))
+            except Exception as e:
+                events.put(("error", str(e)))
+        
+        def poll():
+            try:
+                while True:
+                    kind, data = events.get_nowait()
+                    if kind == "progress":
+                        message, percent = data
+                        if not cancel.is_set():
+                            progress_label.config(text=message)
+                        progress['value'] = percent
+                    elif kind == "done":
+                        on_success(data)
+                        return
+                    elif kind == "cancelled":
+                        messagebox.showinfo(
+                            "Cancelled",
+                            "Installation was cancelled. Nothing was changed."
+                        )
+                        on_cancel()
+                        return
+                    else:
+                        messagebox.showerror("Installation Error", data)
+                        on_cancel()
+                        return
+            except queue.Empty:
+                pass
+            self.root.after(50, poll)
+        
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+    
+    def make_installer(self, progress=None, cancel=None):
+        """Create an install engine from the answers given so far"""
+        installer = FMMInstaller(
+            wp_path=self.wp_path,
+            wp_url=self.wp_url,
+            pwa_path=self.pwa_path,
+            google_client_id=self.google_client_id,
+            google_client_secret=self.google_client_secret,
+            script_dir=self.script_dir,
+            progress=progress,
+            cancel=cancel,
+            optimize_assets=self.optimize_assets,
+            bundle_scripts=self.bundle_scripts,
+            cache_budgets=self.cache_budgets
+        )
+        installer.install_pwa = self.install_pwa
+        return installer
+    
     def show_welcome(self):
         """Welcome screen"""
         self.current_step = 0
@@ -252,15 +1591,10 @@ class FMMSetupWizard:
     
     def validate_wp_and_continue(self):
         """Validate WordPress path and continue"""
-        if not self.wp_path:
-            messagebox.showerror("Required", "Please select a WordPress folder")
-            return
-        
-        if not os.path.isfile(os.path.join(self.wp_path, "wp-config.php")):
-            messagebox.showerror(
-                "Invalid WordPress Installation",
-                "wp-config.php not found. Please select the correct folder."
-            )
+        try:
+            self.make_installer().validate_wordpress()
+        except InstallError as e:
+            messagebox.showerror("Invalid WordPress Installation", str(e))
             return
         
         self.show_plugin_installation()
@@ -271,84 +1605,19 @@ class FMMSetupWizard:
         self.clear_window()
         self.create_header("Installing WordPress Plugin")
         
-        content = self.create_content_frame()
-        
-        progress_label = tk.Label(
-            content,
-            text="Installing plugin files...",
-            font=("Arial", 11),
-            bg=self.bg_color,
-            fg=self.text_color
-        )
-        progress_label.pack(pady=20)
-        
-        progress = ttk.Progressbar(
-            content,
-            length=400,
-            mode='determinate',
-            value=0
-        )
-        progress.pack(pady=10)
-        
-        self.root.update()
-        
-        try:
-            # Step 1: Create plugin directory
-            progress_label.config(text="Creating plugin folder...")
-            self.root.update()
-            progress['value'] = 10
-            self.root.update()
-            
-            plugin_dir = os.path.join(self.wp_path, "wp-content", "plugins", "family-media-manager")
-            if os.path.exists(plugin_dir):
-                shutil.rmtree(plugin_dir)
-            os.makedirs(plugin_dir, exist_ok=True)
-            
-            # Step 2: Copy plugin files
-            progress_label.config(text="Copying plugin files...")
-            self.root.update()
-            progress['value'] = 40
-            self.root.update()
-            
-            files_to_copy = [
-                "family-media-manager.php",
-                "includes",
-                "admin",
-                "public"
-            ]
-            
-            for file_item in files_to_copy:
-                src = os.path.join(self.script_dir, file_item)
-                dst = os.path.join(plugin_dir, file_item)
-                
-                if os.path.exists(src):
-                    if os.path.isdir(src):
-                        if os.path.exists(dst):
-                            shutil.rmtree(dst)
-                        shutil.copytree(src, dst)
-                    else:
-                        shutil.copy2(src, dst)
-            
-            # Step 3: Set permissions (Windows doesn't need this, but we can try)
-            progress_label.config(text="Setting permissions...")
-            self.root.update()
-            progress['value'] = 70
-            self.root.update()
-            
-            progress_label.config(text="Plugin installed successfully!")
-            self.root.update()
-            progress['value'] = 100
-            self.root.update()
-            
+        def installed(stats):
             messagebox.showinfo(
                 "Plugin Installed",
                 "Plugin files have been installed successfully!\n\nNext: You'll need to activate it in WordPress."
             )
-            
             self.show_wordpress_url()
         
-        except Exception as e:
-            messagebox.showerror("Installation Error", f"Error installing plugin:\n\n{str(e)}")
+        self.run_install_step(
+            "Installing plugin files...",
+            lambda installer: installer.install_plugin(),
+            installed,
+            self.show_wordpress_path
+        )
     
     def show_wordpress_url(self):
         """Step 3: Get WordPress URL"""
@@ -558,98 +1827,7 @@ class FMMSetupWizard:
         self.clear_window()
         self.create_header("Installing Mobile App")
         
-        content = self.create_content_frame()
-        
-        progress_label = tk.Label(
-            content,
-            text="Installing app files...",
-            font=("Arial", 11),
-            bg=self.bg_color,
-            fg=self.text_color
-        )
-        progress_label.pack(pady=20)
-        
-        progress = ttk.Progressbar(
-            content,
-            length=400,
-            mode='determinate',
-            value=0
-        )
-        progress.pack(pady=10)
-        
-        self.root.update()
-        
-        try:
-            progress_label.config(text="Creating mobile app folder...")
-            self.root.update()
-            progress['value'] = 10
-            self.root.update()
-            
-            os.makedirs(self.pwa_path, exist_ok=True)
-            
-            progress_label.config(text="Copying app files...")
-            self.root.update()
-            progress['value'] = 40
-            self.root.update()
-            
-            pwa_src = os.path.join(self.script_dir, "pwa")
-            if os.path.exists(pwa_src):
-                for item in os.listdir(pwa_src):
-                    src = os.path.join(pwa_src, item)
-                    dst = os.path.join(self.pwa_path, item)
-                    if os.path.isdir(src):
-                        if os.path.exists(dst):
-                            shutil.rmtree(dst)
-                        shutil.copytree(src, dst)
-                    else:
-                        shutil.copy2(src, dst)
-            
-            progress_label.config(text="Configuring API connection...")
-            self.root.update()
-            progress['value'] = 60
-            self.root.update()
-            
-            # Update app.js with WordPress URL
-            app_js_path = os.path.join(self.pwa_path, "js", "app.js")
-            if os.path.exists(app_js_path):
-                with open(app_js_path, 'r') as f:
-                    content = f.read()
-                content = content.replace("window.location.origin", f"'{self.wp_url}'")
-                with open(app_js_path, 'w') as f:
-                    f.write(content)
-            
-            # Create .htaccess for HTTPS redirect
-            progress_label.config(text="Creating .htaccess file...")
-            self.root.update()
-            progress['value'] = 80
-            self.root.update()
-            
-            htaccess_content = """# Force HTTPS (required for PWA)
-RewriteEngine On
-RewriteCond %{HTTPS} off
-RewriteRule ^ https://%{HTTP_HOST}%{REQUEST_URI} [L,R=301]
-
-# Service Worker
-<Files "service-worker.js">
-    Header set Service-Worker-Allowed "/"
-    Header set Cache-Control "max-age=0, no-cache, no-store, must-revalidate"
-</Files>
-
-# Cache static assets
-<FilesMatch "\\.(css|js|jpg|jpeg|png|gif|webp)$">
-    Header set Cache-Control "max-age=31536000, public"
-</FilesMatch>
-"""
-            
-            htaccess_path = os.path.join(self.pwa_path, ".htaccess")
-            with open(htaccess_path, 'w') as f:
-                f.write(htaccess_content)
-            
-            progress_label.config(text="Mobile app installed successfully!")
-            self.root.update()
-            progress['value'] = 100
-            self.root.update()
-            
+        def installed(stats):
             self.install_pwa = True
             
             messagebox.showinfo(
@@ -659,8 +1837,12 @@ RewriteRule ^ https://%{HTTP_HOST}%{REQUEST_URI} [L,R=301]
             
             self.show_google_setup()
         
-        except Exception as e:
-            messagebox.showerror("Installation Error", f"Error installing PWA:\n\n{str(e)}")
+        self.run_install_step(
+            "Installing app files...",
+            lambda installer: installer.install_pwa_files(),
+            installed,
+            self.show_pwa_path
+        )
     
     def show_google_setup(self):
         """Step 5: Google Drive setup instructions"""
@@ -860,59 +2042,12 @@ A popup will show your credentials. Copy them and come back here!
         self.clear_window()
         self.create_header("Saving Configuration")
         
-        content = self.create_content_frame()
-        
-        progress_label = tk.Label(
-            content,
-            text="Saving configuration...",
-            font=("Arial", 11),
-            bg=self.bg_color,
-            fg=self.text_color
+        self.run_install_step(
+            "Saving configuration...",
+            lambda installer: installer.save_configuration(),
+            lambda config_file: self.show_completion(),
+            self.show_google_credentials
         )
-        progress_label.pack(pady=20)
-        
-        progress = ttk.Progressbar(
-            content,
-            length=400,
-            mode='determinate',
-            value=0
-        )
-        progress.pack(pady=10)
-        
-        self.root.update()
-        
-        try:
-            progress['value'] = 50
-            self.root.update()
-            
-            # Create configuration file
-            config_dir = Path.home() / ".fmm-setup"
-            config_dir.mkdir(exist_ok=True)
-            
-            config_file = config_dir / "config.json"
-            
-            config = {
-                "wp_path": self.wp_path,
-                "wp_url": self.wp_url,
-                "pwa_path": self.pwa_path,
-                "install_pwa": self.install_pwa,
-                "google_client_id": self.google_client_id,
-                "google_client_secret": self.google_client_secret,
-                "redirect_uri": f"{self.wp_url}/wp-admin/admin.php?page=family-media-manager-settings&action=oauth_callback"
-            }
-            
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-            
-            progress['value'] = 100
-            self.root.update()
-            progress_label.config(text="Configuration saved!")
-            self.root.update()
-            
-            self.show_completion()
-        
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving configuration:\n\n{str(e)}")
     
     def show_completion(self):
         """Show completion screen"""
@@ -997,11 +2132,313 @@ A popup will show your credentials. Copy them and come back here!
         ).pack(side=tk.RIGHT, padx=5)
 
 
-def main():
+###############################################################################
+# Batch provisioning (many sites from one site list)
+###############################################################################
+
+def site_name(site, index):
+    """Short label for a site in progress output"""
+    if site.get("name"):
+        return site["name"]
+    url = site.get("wp_url", "").rstrip("/")
+    return re.sub(r"^https?://", "", url) or f"site-{index + 1}"
+
+
+def load_site_list(path):
+    """Read site definitions from a JSON list (or {"sites": [...]})"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    sites = data.get("sites", []) if isinstance(data, dict) else data
+    if not isinstance(sites, list) or not all(isinstance(site, dict) for site in sites):
+        raise ValueError("expected a list of site objects")
+
+    return sites
+
+
+def provision_site(site, index, events, install_pwa=True, save_config=True):
+    """Install one site from a batch; runs in a pool worker.
+
+    Progress is put on the events queue as (site, step, message, percent)
+    tuples. Never raises - failures are returned in the result dict.
+    """
+    name = site_name(site, index)
+
+    def progress(step, message, percent):
+        events.put((name, step, message, percent))
+
+    start = time.perf_counter()
+    try:
+        config_file = site.get("config_file") or \
+            SITES_CONFIG_DIR / (re.sub(r"[^A-Za-z0-9._-]+", "_", name) + ".json")
+
+        installer = FMMInstaller.from_config(site, progress=progress)
+        summary = installer.run(
+            install_pwa=install_pwa,
+            config_file=config_file,
+            save_config=save_config
+        )
+        result = dict(summary, site=name, ok=True)
+    except (InstallError, OSError) as e:
+        result = {"site": name, "ok": False, "error": str(e)}
+    except Exception as e:
+        # Anything unexpected fails this site only, not the whole batch
+        result = {"site": name, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(args):
+    """Provision every site in --batch concurrently; returns the exit code"""
+    try:
+        sites = load_site_list(args.batch)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {args.batch}: {e}", file=sys.stderr)
+        return 2
+
+    def emit(event, **data):
+        if args.json:
+            print_json_event(event, **data)
+        elif event == "progress":
+            print(f"[{data['site']}] [{data['step']}] {data['percent']:3d}% {data['message']}", flush=True)
+        elif event == "site":
+            status = "OK" if data["ok"] else f"FAILED: {data['error']}"
+            print(f"[{data['site']}] {status} ({data['seconds']:.2f}s)", flush=True)
+
+    workers = max(1, min(args.workers, len(sites) or 1))
+    if args.processes:
+        manager = multiprocessing.Manager()
+        events = manager.Queue()
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        manager = None
+        events = queue.Queue()
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    def drain_events():
+        while True:
+            try:
+                name, step, message, percent = events.get_nowait()
+            except queue.Empty:
+                return
+            emit("progress", site=name, step=step, message=message, percent=percent)
+
+    start = time.perf_counter()
+    results = []
+    try:
+        pending = {
+            pool.submit(provision_site,
+                        dict(site, **cli_overrides(args, site)),
+                        index, events,
+                        not args.skip_pwa, not args.no_save_config)
+            for index, site in enumerate(sites)
+        }
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            drain_events()
+            for future in done:
+                result = future.result()
+                results.append(result)
+                emit("site", **result)
+        drain_events()
+    finally:
+        pool.shutdown()
+        if manager:
+            manager.shutdown()
+
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if not r["ok"]]
+
+    if args.json:
+        print_json_event(
+            "summary",
+            sites=len(results),
+            succeeded=len(results) - len(failed),
+            failed=[{"site": r["site"], "error": r["error"]} for r in failed],
+            workers=workers,
+            seconds=round(elapsed, 3)
+        )
+    else:
+        print(f"\n{len(results) - len(failed)} of {len(results)} sites installed "
+              f"in {elapsed:.2f}s with {workers} workers")
+        for r in failed:
+            print(f"  FAILED {r['site']}: {r['error']}")
+
+    return 1 if failed else 0
+
+
+###############################################################################
+# Entry points
+###############################################################################
+
+def load_tkinter():
+    """Import tkinter on first use - only the wizard needs it"""
+    global tk, filedialog, messagebox, ttk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+
+
+def load_saved_config(config_file=CONFIG_FILE):
+    """The config.json an earlier install saved, or {} if there is none"""
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def run_gui():
+    """Start the graphical setup wizard"""
+    load_tkinter()
     root = tk.Tk()
     app = FMMSetupWizard(root)
     root.mainloop()
 
 
+def print_json_event(event, **data):
+    """Print one JSON progress line (for scripts driving the installer)"""
+    print(json.dumps(dict(event=event, **data)), flush=True)
+
+
+def build_parser():
+    """Command line options for scripted installs"""
+    parser = argparse.ArgumentParser(
+        description="Install the Family Media Manager plugin and mobile app. "
+                    "Run without arguments to start the graphical wizard."
+    )
+    parser.add_argument("--gui", action="store_true",
+                        help="start the graphical wizard")
+    parser.add_argument("--config", metavar="FILE",
+                        help="read settings from a JSON file in the same format as "
+                             "~/.fmm-setup/config.json; options below override it")
+    parser.add_argument("--wp-path", help="WordPress folder (contains wp-config.php)")
+    parser.add_argument("--wp-url", help="WordPress website address, e.g. https://example.com")
+    parser.add_argument("--pwa-path", help="folder to install the mobile app into")
+    parser.add_argument("--google-client-id", help="Google OAuth client ID")
+    parser.add_argument("--google-client-secret", help="Google OAuth client secret")
+    parser.add_argument("--skip-pwa", action="store_true",
+                        help="don't install the mobile app even if --pwa-path is set")
+    parser.add_argument("--no-optimize", action="store_true",
+                        help="copy the mobile app's scripts and styles as they are "
+                             "(no minifying, fingerprinting or precompressing)")
+    parser.add_argument("--bundle", action="store_true",
+                        help="combine the mobile app's scripts into one file "
+                             "(with a source map) to cut requests on first load")
+    parser.add_argument("--image-cache-mb", type=float, metavar="MB",
+                        help="space the mobile app may use for cached photos "
+                             f"(default: {DEFAULT_CACHE_BUDGETS['IMAGE_CACHE']['max_mb']})")
+    parser.add_argument("--save-config", metavar="FILE", default=str(CONFIG_FILE),
+                        help="where to save the configuration (default: %(default)s)")
+    parser.add_argument("--no-save-config", action="store_true",
+                        help="don't write a configuration file")
+    parser.add_argument("--json", action="store_true",
+                        help="print progress as one JSON object per line")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="provision every site in a JSON list of site definitions "
+                             "(wp_path, wp_url, pwa_path, google_client_id, "
+                             "google_client_secret, optional name)")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1),
+                        help="sites to provision at the same time in --batch mode "
+                             "(default: %(default)s)")
+    parser.add_argument("--processes", action="store_true",
+                        help="use worker processes instead of threads in --batch mode")
+    return parser
+
+
+def cli_overrides(args, config):
+    """Settings from command line flags that apply to every site.
+
+    Returned as keys to update config with; per-cache budgets are merged
+    into the ones config already has rather than replacing them.
+    """
+    overrides = {}
+    if args.no_optimize:
+        overrides["optimize_assets"] = False
+    if args.bundle:
+        overrides["bundle_scripts"] = True
+    if args.image_cache_mb is not None:
+        budgets = dict(config.get("cache_budgets") or {})
+        budgets["IMAGE_CACHE"] = dict(budgets.get("IMAGE_CACHE") or {}, max_mb=args.image_cache_mb)
+        overrides["cache_budgets"] = budgets
+    return overrides
+
+
+def load_cli_config(args):
+    """Merge --config and the individual options into one config dict"""
+    config = {}
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+
+    for key in ("wp_path", "wp_url", "pwa_path", "google_client_id", "google_client_secret"):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+
+    config.update(cli_overrides(args, config))
+    return config
+
+
+def run_cli(args):
+    """Run a headless install; returns the process exit code"""
+    if args.json:
+        def progress(step, message, percent):
+            print_json_event("progress", step=step, message=message, percent=percent)
+    else:
+        def progress(step, message, percent):
+            print(f"[{step}] {percent:3d}% {message}", flush=True)
+
+    try:
+        config = load_cli_config(args)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {args.config}: {e}", file=sys.stderr)
+        return 2
+
+    installer = FMMInstaller.from_config(config, progress=progress)
+
+    try:
+        summary = installer.run(
+            install_pwa=not args.skip_pwa,
+            config_file=args.save_config,
+            save_config=not args.no_save_config
+        )
+    except InstallError as e:
+        if args.json:
+            print_json_event("error", message=str(e))
+        else:
+            print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print_json_event("done", **summary)
+    else:
+        stats = summary["plugin"]
+        print(f"Plugin: {stats['copied']} copied, {stats['removed']} removed, "
+              f"{stats['unchanged']} unchanged")
+        print(f"Activate the plugin at {installer.wp_url}/wp-admin")
+
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv:
+        run_gui()
+        return 0
+
+    args = build_parser().parse_args(argv)
+    if args.gui:
+        run_gui()
+        return 0
+
+    if args.batch:
+        return run_batch(args)
+
+    return run_cli(args)
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+###############################################################################
+# Family Media Manager - Thumbnail Tool
+# Pre-generates and backfills gallery thumbnails outside of upload requests
+#
+# Thumbnails are named after the SHA-256 of their source file, exactly like
+# the plugin names them, so an upload of a file that has already been
+# processed here finds its thumbnail waiting and skips the work.
+#
+#   python3 fmm-thumbnails.py --wp-path /var/www/html/wordpress \
+#       --source ~/Pictures/family --size 300
+#
+# Needs Pillow (pip install Pillow); videos also need ffmpeg on the PATH.
+###############################################################################
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".webm")
+
+# Matches the plugin's family_media_manager_thumbnail_size default
+DEFAULT_THUMBNAIL_SIZE = 300
+JPEG_QUALITY = 85
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Where the plugin keeps thumbnails, relative to the WordPress folder
+THUMBNAIL_SUBDIR = os.path.join("wp-content", "uploads", "family-gallery")
+
+# Responsive variants (same as Family_Media_Manager_Thumbnail): widths as
+# multiples of the thumbnail size, each saved as WebP and JPEG
+VARIANT_SCALES = (0.5, 1, 1.5, 2)
+VARIANT_FORMATS = (("image/webp", "webp", "WEBP"), ("image/jpeg", "jpg", "JPEG"))
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def jpeg_size(path):
+    """Read (width, height) from a JPEG's frame header, or None.
+
+    Only the header is read, so checking thousands of existing thumbnails
+    is cheap and doesn't need Pillow.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(2) != b'\xff\xd8':
+                return None
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                length = int.from_bytes(f.read(2), 'big')
+                # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    header = f.read(5)
+                    return int.from_bytes(header[3:5], 'big'), int.from_bytes(header[1:3], 'big')
+                f.seek(length - 2, os.SEEK_CUR)
+    except OSError:
+        return None
+
+
+def index_path(thumbnail_path):
+    """<hash>.jpg -> <hash>.json, the sidecar listing the variants"""
+    return os.path.splitext(thumbnail_path)[0] + ".json"
+
+
+def read_index(thumbnail_path):
+    """Load a thumbnail's sidecar, or None if it is missing or unreadable"""
+    try:
+        with open(index_path(thumbnail_path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def is_current(thumbnail_path, size):
+    """True if the thumbnail and its variants were made at this size"""
+    if jpeg_size(thumbnail_path) != (size, size):
+        return False
+    index = read_index(thumbnail_path)
+    return index is not None and index.get("size") == size
+
+
+def media_kind(path):
+    """'image', 'video' or None for files the gallery doesn't accept"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in VIDEO_EXTENSIONS:
+        return "video"
+    return None
+
+
+def find_media(sources):
+    """Yield every image and video under the given files and folders"""
+    for source in sources:
+        if os.path.isfile(source):
+            if media_kind(source):
+                yield source
+            continue
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if not name.startswith(".") and media_kind(path):
+                    yield path
+
+
+def plan_thumbnails(sources, thumbnail_dir, size, force=False):
+    """Work out which thumbnails need to be made.
+
+    Returns (tasks, stats). Each task is a dict with the source, its kind
+    and the thumbnail to write; duplicate sources only produce one task.
+    """
+    tasks = []
+    seen = set()
+    stats = {"sources": 0, "duplicates": 0, "current": 0, "missing": 0, "stale": 0}
+
+    for path in find_media(sources):
+        stats["sources"] += 1
+        try:
+            digest = hash_file(path)
+        except OSError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+
+        if digest in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(digest)
+
+        dest = os.path.join(thumbnail_dir, digest + ".jpg")
+        if not os.path.exists(dest):
+            reason = "missing"
+        elif force or not is_current(dest, size):
+            reason = "stale"
+        else:
+            stats["current"] += 1
+            continue
+
+        stats[reason] += 1
+        tasks.append({"source": path, "kind": media_kind(path), "dest": dest, "reason": reason})
+
+    return tasks, stats
+
+
+def stale_thumbnails(thumbnail_dir, size, known):
+    """Hash-named thumbnails of the wrong size that no source was given for"""
+    stale = []
+    if not os.path.isdir(thumbnail_dir):
+        return stale
+    for name in sorted(os.listdir(thumbnail_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext != ".jpg" or len(stem) != 64 or name in known:
+            continue
+        if not is_current(os.path.join(thumbnail_dir, name), size):
+            stale.append(name)
+    return stale
+
+
+###############################################################################
+# Workers (run in a process pool)
+###############################################################################
+
+def _fit_square(image, size):
+    """Crop and scale an image to a size x size RGB square"""
+    from PIL import ImageOps
+    image = ImageOps.exif_transpose(image)
+    image = ImageOps.fit(image.convert("RGB"), (size, size))
+    return image
+
+
+def _video_placeholder(size):
+    """Grey square with a white play triangle (same as the plugin's)"""
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (size, size), (50, 50, 50))
+    center = size / 2
+    half = size / 6
+    ImageDraw.Draw(image).polygon(
+        [(center - half, center - half), (center - half, center + half), (center + half, center)],
+        fill=(255, 255, 255)
+    )
+    return image
+
+
+def _video_frame(source, size, ffmpeg):
+    """Grab the frame at one second with ffmpeg, or None if that fails"""
+    from PIL import Image
+    if not ffmpeg:
+        return None
+
+    fd, frame_path = tempfile.mkstemp(suffix=".jpg")
+    os.close(fd)
+    try:
+        result = subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-ss", "00:00:01", "-i", source,
+             "-vframes", "1", frame_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120
+        )
+        if result.returncode != 0 or os.path.getsize(frame_path) == 0:
+            return None
+        with Image.open(frame_path) as frame:
+            return _fit_square(frame, size)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    finally:
+        os.unlink(frame_path)
+
+
+def _save_atomic(image, path, format, **options):
+    """Save next to the destination and rename, so the web server never
+    serves a half-written file"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".thumb-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_thumbnail_set(image, dest, size):
+    """Write the square thumbnail, its responsive variants and the sidecar.
+
+    image should be square and at least as large as the biggest variant
+    that is wanted; widths it is too small for are skipped, as the plugin
+    does.
+    """
+    from PIL import Image, features
+
+    base = os.path.splitext(dest)[0]
+    resample = Image.Resampling.LANCZOS
+    variants = []
+
+    for scale in VARIANT_SCALES:
+        width = round(size * scale)
+        if width > image.width:
+            continue
+        scaled = image if width == image.width else image.resize((width, width), resample)
+        for mime, extension, format in VARIANT_FORMATS:
+            if format == "WEBP" and not features.check("webp"):
+                continue
+            file = f"{os.path.basename(base)}-{width}.{extension}"
+            _save_atomic(scaled, os.path.join(os.path.dirname(dest), file), format,
+                         quality=JPEG_QUALITY, optimize=True)
+            variants.append({"file": file, "width": width, "type": mime})
+
+    thumbnail = image if image.width == size else image.resize((size, size), resample)
+    _save_atomic(thumbnail, dest, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    # The sidecar goes last: its presence means the whole set is complete
+    previous = read_index(dest) or {}
+    fd, tmp_path = tempfile.mkstemp(prefix=".thumb-", dir=os.path.dirname(dest))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({"size": size, "variants": variants}, f, separators=(",", ":"))
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, index_path(dest))
+
+    # Remove variants from an earlier size that this set doesn't have
+    current = {variant["file"] for variant in variants}
+    for variant in previous.get("variants", []):
+        file = os.path.basename(variant.get("file", ""))
+        if file and file not in current:
+            try:
+                os.unlink(os.path.join(os.path.dirname(dest), file))
+            except OSError:
+                pass
+
+
+def make_thumbnail(task, size, ffmpeg=None):
+    """Render one thumbnail; returns (task, error message or None)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return task, "Pillow is not installed (pip install Pillow)"
+
+    try:
+        largest = round(size * max(VARIANT_SCALES))
+        if task["kind"] == "image":
+            with Image.open(task["source"]) as image:
+                # Don't blow small photos up past their own resolution
+                thumbnail = _fit_square(image, max(size, min(largest, *image.size)))
+        else:
+            # Like the plugin, video variants are made from the frame at the
+            # thumbnail size, so they don't go above it
+            thumbnail = _video_frame(task["source"], size, ffmpeg) or _video_placeholder(size)
+
+        write_thumbnail_set(thumbnail, task["dest"], size)
+    except Exception as e:
+        return task, str(e) or e.__class__.__name__
+
+    return task, None
+
+
+def flush_response_cache(wp_cli, wp_path):
+    """Have the plugin retire its cached API responses, whose thumbnail
+    URLs (?v=) and srcsets are out of date once thumbnails change.
+
+    Returns None, or why it couldn't be done.
+    """
+    try:
+        subprocess.run([wp_cli, f"--path={wp_path}", "family-media", "cache", "flush"],
+                       capture_output=True, text=True, check=True, timeout=120)
+    except FileNotFoundError:
+        return f"WP-CLI not found ({wp_cli})"
+    except subprocess.CalledProcessError as e:
+        return e.stderr.strip() or e.stdout.strip() or f"exit code {e.returncode}"
+    except subprocess.TimeoutExpired:
+        return "WP-CLI timed out"
+    return None
+
+
+###############################################################################
+# Command line
+###############################################################################
+
+def print_json_event(event, **data):
+    """Print one JSON progress line (for scripts driving the tool)"""
+    print(json.dumps(dict(event=event, **data)), flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Create missing or outdated Family Media Manager thumbnails "
+                    "in parallel, ahead of (or after) uploading the originals."
+    )
+    parser.add_argument("--wp-path", required=True,
+                        help="WordPress folder (contains wp-config.php)")
+    parser.add_argument("--source", action="append", required=True, metavar="PATH",
+                        help="photo/video file or folder to make thumbnails for "
+                             "(can be given more than once)")
+    parser.add_argument("--size", type=int, default=DEFAULT_THUMBNAIL_SIZE,
+                        help="thumbnail size in pixels - use the value from the "
+                             "plugin's settings page (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument("--force", action="store_true",
+                        help="regenerate thumbnails even if they look current")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report what would be generated")
+    parser.add_argument("--wp-cli", default="wp",
+                        help="WP-CLI command, used to flush the plugin's cached API "
+                             "responses after thumbnails change (default: %(default)s)")
+    parser.add_argument("--json", action="store_true",
+                        help="print JSON progress lines instead of text")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.json:
+        emit = print_json_event
+    else:
+        def emit(event, **data):
+            if event == "thumbnail":
+                status = "ok" if data["ok"] else f"FAILED: {data['error']}"
+                print(f"[{data['done']}/{data['total']}] {data['source']} ({data['reason']}) {status}",
+                      flush=True)
+
+    if not os.path.isfile(os.path.join(args.wp_path, "wp-config.php")):
+        print(f"wp-config.php not found in {args.wp_path}", file=sys.stderr)
+        return 2
+    if args.size < 1:
+        print("--size must be at least 1", file=sys.stderr)
+        return 2
+
+    thumbnail_dir = os.path.join(args.wp_path, THUMBNAIL_SUBDIR)
+    start = time.perf_counter()
+
+    tasks, stats = plan_thumbnails(args.source, thumbnail_dir, args.size, args.force)
+    known = {os.path.basename(task["dest"]) for task in tasks}
+    stats["stale_without_source"] = len(stale_thumbnails(thumbnail_dir, args.size, known))
+
+    if tasks and not args.dry_run:
+        try:
+            import PIL  # noqa: F401 - only checking it's there before starting workers
+        except ImportError:
+            print("Pillow is needed to make thumbnails: pip install Pillow", file=sys.stderr)
+            return 2
+
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg and any(task["kind"] == "video" for task in tasks):
+            print("ffmpeg not found - videos get a placeholder thumbnail", file=sys.stderr)
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [pool.submit(make_thumbnail, task, args.size, ffmpeg) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                task, error = future.result()
+                failed += error is not None
+                emit("thumbnail", done=done, total=len(tasks), source=task["source"],
+                     reason=task["reason"], ok=error is None, error=error)
+        stats["generated"] = len(tasks) - failed
+        stats["failed"] = failed
+
+        if stats["generated"]:
+            error = flush_response_cache(args.wp_cli, args.wp_path)
+            stats["cache_flushed"] = error is None
+            if error:
+                print(f"Couldn't flush cached API responses: {error}\n"
+                      f"Run 'wp family-media cache flush' so the gallery shows the new thumbnails",
+                      file=sys.stderr)
+    else:
+        stats["generated"] = stats["failed"] = 0
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+
+    if args.json:
+        print_json_event("summary", dry_run=args.dry_run, **stats)
+    else:
+        print(f"{stats['sources']} source files ({stats['duplicates']} duplicates): "
+              f"{stats['current']} current, {stats['missing']} missing, {stats['stale']} stale")
+        if not args.dry_run:
+            print(f"Generated {stats['generated']}, failed {stats['failed']} "
+                  f"in {stats['seconds']:.2f}s")
+        if stats["stale_without_source"]:
+            print(f"{stats['stale_without_source']} other thumbnails are not "
+                  f"{args.size}px; pass their originals with --source to update them")
+
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
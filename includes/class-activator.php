@@ -11,6 +11,7 @@ class Family_Media_Manager_Activator {
         global $wpdb;
         
         $charset_collate = $wpdb->get_charset_collate();
+        $previous_db_version = (int) get_option('family_media_manager_db_version', 0);
         
         // Media items table
         $table_media = $wpdb->prefix . 'family_media';
@@ -23,14 +24,24 @@ class Family_Media_Manager_Activator {
             file_type VARCHAR(50) NOT NULL,
             file_size BIGINT(20) UNSIGNED NOT NULL,
             thumbnail_path VARCHAR(255) DEFAULT NULL,
+            content_hash CHAR(64) DEFAULT NULL,
             upload_date DATETIME NOT NULL,
             taken_date DATETIME DEFAULT NULL,
             album_id BIGINT(20) UNSIGNED DEFAULT NULL,
             caption TEXT DEFAULT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'ready',
+            local_path VARCHAR(255) DEFAULT NULL,
+            attempts SMALLINT(5) UNSIGNED NOT NULL DEFAULT 0,
+            last_error VARCHAR(255) DEFAULT NULL,
             PRIMARY KEY (id),
             KEY owner_id (owner_id),
             KEY upload_date (upload_date),
-            KEY album_id (album_id)
+            KEY album_id (album_id),
+            KEY album_upload_date (album_id, upload_date),
+            KEY upload_date_id (upload_date, id),
+            KEY owner_upload_date (owner_id, upload_date, id),
+            KEY status (status),
+            UNIQUE KEY owner_content_hash (owner_id, content_hash)
         ) $charset_collate;";
         
         // Sharing permissions table
@@ -43,7 +54,8 @@ class Family_Media_Manager_Activator {
             shared_date DATETIME NOT NULL,
             PRIMARY KEY (id),
             KEY media_id (media_id),
-            KEY shared_with_user_id (shared_with_user_id)
+            KEY shared_with_user_id (shared_with_user_id),
+            UNIQUE KEY media_user (media_id, shared_with_user_id)
         ) $charset_collate;";
         
         // User cloud storage tokens table
@@ -67,15 +79,41 @@ class Family_Media_Manager_Activator {
             description TEXT DEFAULT NULL,
             created_date DATETIME NOT NULL,
             cover_media_id BIGINT(20) UNSIGNED DEFAULT NULL,
+            photo_count INT(10) UNSIGNED NOT NULL DEFAULT 0,
+            last_photo_date DATETIME DEFAULT NULL,
             PRIMARY KEY (id),
             KEY owner_id (owner_id)
         ) $charset_collate;";
         
+        // Site-wide counters (see Family_Media_Manager_Stats)
+        $table_stats = $wpdb->prefix . 'family_stats';
+        $sql_stats = "CREATE TABLE $table_stats (
+            name VARCHAR(50) NOT NULL,
+            value BIGINT(20) NOT NULL DEFAULT 0,
+            PRIMARY KEY (name)
+        ) $charset_collate;";
+        
+        self::remove_duplicate_shares($table_sharing);
+        
+        // Duplicates used to be detected across all users
+        self::drop_index($table_media, 'content_hash');
+        
         require_once(ABSPATH . 'wp-admin/includes/upgrade.php');
         dbDelta($sql_media);
         dbDelta($sql_sharing);
         dbDelta($sql_tokens);
         dbDelta($sql_albums);
+        dbDelta($sql_stats);
+        
+        // Fill in the counters for media that was there before them. This
+        // counts the whole media table, so it only runs on installs from
+        // before the counters' current rules (DB version 7), not on every
+        // activation.
+        if ($previous_db_version < 7) {
+            require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-response-cache.php';
+            require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-stats.php';
+            Family_Media_Manager_Stats::rebuild();
+        }
         
         // Create comments table
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-comments.php';
@@ -83,7 +121,44 @@ class Family_Media_Manager_Activator {
         
         // Set default options
         add_option('family_media_manager_version', FAMILY_MEDIA_MANAGER_VERSION);
+        update_option('family_media_manager_db_version', FAMILY_MEDIA_MANAGER_DB_VERSION);
         add_option('family_media_manager_thumbnail_size', 300);
         add_option('family_media_manager_photos_per_page', 20);
+        add_option('family_media_manager_async_uploads', 0);
+    }
+
+    /**
+     * Drop an index dbDelta can't remove (it only adds)
+     */
+    private static function drop_index($table, $index) {
+        global $wpdb;
+        
+        if ($wpdb->get_var($wpdb->prepare('SHOW TABLES LIKE %s', $table)) !== $table) {
+            return;
+        }
+        
+        if ($wpdb->get_var($wpdb->prepare("SHOW INDEX FROM $table WHERE Key_name = %s", $index))) {
+            $wpdb->query("ALTER TABLE $table DROP INDEX `$index`");
+        }
+    }
+
+    /**
+     * Drop repeated shares of the same media with the same user, keeping
+     * the oldest, so the media_user unique key can be added on upgrade
+     */
+    private static function remove_duplicate_shares($table) {
+        global $wpdb;
+        
+        if ($wpdb->get_var($wpdb->prepare('SHOW TABLES LIKE %s', $table)) !== $table) {
+            return;
+        }
+        
+        $wpdb->query(
+            "DELETE s1 FROM $table s1
+             INNER JOIN $table s2
+                ON s1.media_id = s2.media_id
+               AND s1.shared_with_user_id = s2.shared_with_user_id
+               AND s1.id > s2.id"
+        );
     }
 }
@@ -54,14 +54,11 @@ class Family_Media_Manager_Albums {
         
         $where_clause = implode(' AND ', $where);
         
-        $sql = "SELECT a.*, 
-                       COUNT(m.id) as photo_count,
-                       MAX(m.upload_date) as last_photo_date
-                FROM $table a
-                LEFT JOIN {$wpdb->prefix}family_media m ON a.id = m.album_id
+        // photo_count and last_photo_date are kept up to date by Family_Media_Manager_Stats
+        $sql = "SELECT * 
+                FROM $table
                 WHERE $where_clause
-                GROUP BY a.id
-                ORDER BY a.{$args['order_by']} {$args['order']}";
+                ORDER BY {$args['order_by']} {$args['order']}";
         
         return $wpdb->get_results($sql);
     }
@@ -101,11 +98,15 @@ class Family_Media_Manager_Albums {
             return false;
         }
         
-        return $wpdb->update(
+        $result = $wpdb->update(
             $table,
             $update_data,
             array('id' => $album_id)
         );
+        
+        Family_Media_Manager_Response_Cache::invalidate_albums($album_id);
+        
+        return $result;
     }
 
     /**
@@ -114,47 +115,83 @@ class Family_Media_Manager_Albums {
     public static function delete_album($album_id) {
         global $wpdb;
         
-        // Remove album ID from media items (don't delete media)
         $media_table = $wpdb->prefix . 'family_media';
-        $wpdb->update(
-            $media_table,
-            array('album_id' => null),
-            array('album_id' => $album_id)
-        );
-        
-        // Delete album
         $table = $wpdb->prefix . 'family_albums';
-        return $wpdb->delete($table, array('id' => $album_id));
+        
+        // The album's counters go with its row, so nothing else needs updating
+        $result = Family_Media_Manager_Stats::transaction(function() use ($wpdb, $media_table, $table, $album_id) {
+            // Remove album ID from media items (don't delete media)
+            $wpdb->update(
+                $media_table,
+                array('album_id' => null),
+                array('album_id' => $album_id)
+            );
+            
+            // Delete album
+            return $wpdb->delete($table, array('id' => $album_id));
+        });
+        
+        Family_Media_Manager_Response_Cache::invalidate_albums($album_id);
+        
+        return $result;
     }
 
     /**
      * Add media to album
      */
     public static function add_media_to_album($media_id, $album_id) {
-        global $wpdb;
-        
-        $table = $wpdb->prefix . 'family_media';
-        
-        return $wpdb->update(
-            $table,
-            array('album_id' => $album_id),
-            array('id' => $media_id)
-        );
+        return self::move_media($media_id, $album_id);
     }
 
     /**
      * Remove media from album
      */
     public static function remove_media_from_album($media_id) {
+        return self::move_media($media_id, null);
+    }
+
+    /**
+     * Set a media item's album and move its count, in one transaction
+     *
+     * The row is locked and read inside the transaction, so two moves of
+     * the same item can't both count it out of the same old album.
+     */
+    private static function move_media($media_id, $album_id) {
         global $wpdb;
         
         $table = $wpdb->prefix . 'family_media';
         
-        return $wpdb->update(
-            $table,
-            array('album_id' => null),
-            array('id' => $media_id)
-        );
+        $old_album_id = null;
+        
+        $result = Family_Media_Manager_Stats::transaction(function() use ($wpdb, $table, $media_id, $album_id, &$old_album_id) {
+            $media = Family_Media_Manager_Media_Library::get_media_by_id($media_id, true);
+            
+            if (!$media) {
+                return false;
+            }
+            
+            $old_album_id = $media->album_id;
+            
+            $result = $wpdb->update(
+                $table,
+                array('album_id' => $album_id),
+                array('id' => $media->id)
+            );
+            
+            if ($result === false) {
+                return false;
+            }
+            
+            Family_Media_Manager_Stats::media_moved($media, $album_id);
+            
+            return true;
+        });
+        
+        if ($result) {
+            Family_Media_Manager_Response_Cache::invalidate_albums(array($old_album_id, $album_id));
+        }
+        
+        return $result;
     }
 
     /**
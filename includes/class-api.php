@@ -35,6 +35,31 @@ class Family_Media_Manager_API {
             'permission_callback' => array($this, 'check_auth'),
         ));
 
+        // Resumable chunked upload
+        register_rest_route($namespace, '/uploads', array(
+            'methods'             => 'POST',
+            'callback'            => array($this, 'create_chunked_upload'),
+            'permission_callback' => array($this, 'check_auth'),
+        ));
+
+        register_rest_route($namespace, '/uploads/(?P<upload_id>[0-9a-f]{32})', array(
+            'methods'             => 'GET',
+            'callback'            => array($this, 'get_chunked_upload'),
+            'permission_callback' => array($this, 'check_auth'),
+        ));
+
+        register_rest_route($namespace, '/uploads/(?P<upload_id>[0-9a-f]{32})', array(
+            'methods'             => 'PUT',
+            'callback'            => array($this, 'append_chunked_upload'),
+            'permission_callback' => array($this, 'check_auth'),
+        ));
+
+        register_rest_route($namespace, '/uploads/(?P<upload_id>[0-9a-f]{32})', array(
+            'methods'             => 'DELETE',
+            'callback'            => array($this, 'cancel_chunked_upload'),
+            'permission_callback' => array($this, 'check_auth'),
+        ));
+
         // Get gallery
         register_rest_route($namespace, '/gallery', array(
             'methods'             => 'GET',
@@ -49,6 +74,20 @@ class Family_Media_Manager_API {
             'permission_callback' => array($this, 'check_auth'),
         ));
 
+        // Background processing status
+        register_rest_route($namespace, '/media/(?P<id>\d+)/status', array(
+            'methods'             => 'GET',
+            'callback'            => array($this, 'get_media_status'),
+            'permission_callback' => array($this, 'check_auth'),
+        ));
+
+        // Retry a failed background upload
+        register_rest_route($namespace, '/media/(?P<id>\d+)/retry', array(
+            'methods'             => 'POST',
+            'callback'            => array($this, 'retry_media'),
+            'permission_callback' => array($this, 'check_auth'),
+        ));
+
         // Get download URL
         register_rest_route($namespace, '/media/(?P<id>\d+)/download', array(
             'methods'             => 'GET',
@@ -121,6 +160,21 @@ class Family_Media_Manager_API {
         ));
     }
 
+    /**
+     * Report how many database queries a request made (for fmm-benchmark.py)
+     *
+     * Only when SAVEQUERIES is on, so production responses are unchanged.
+     */
+    public function add_query_count_header($response, $server, $request) {
+        global $wpdb;
+
+        if (defined('SAVEQUERIES') && SAVEQUERIES && strpos($request->get_route(), '/family-gallery/v1/') === 0) {
+            $response->header('X-FMM-Queries', $wpdb->num_queries);
+        }
+
+        return $response;
+    }
+
     /**
      * Check authentication
      */
@@ -145,38 +199,140 @@ class Family_Media_Manager_API {
         $result = Family_Media_Manager_Uploader::handle_upload($files['photo'], $caption, $album_id);
 
         if ($result['success']) {
+            // 202 while the upload waits in the background queue
+            return new WP_REST_Response($result, $result['status'] === 'ready' ? 200 : 202);
+        } else {
+            return new WP_Error('upload_failed', $result['error'], array('status' => 500));
+        }
+    }
+
+    /**
+     * Start (or resume) a chunked upload
+     *
+     * Takes filename, size and sha256 (hex), plus optional caption and
+     * album_id. Responds with upload_id and the offset to send from.
+     */
+    public function create_chunked_upload($request) {
+        $result = Family_Media_Manager_Chunked_Upload::create(
+            $request->get_param('filename'),
+            $request->get_param('size'),
+            $request->get_param('sha256'),
+            $request->get_param('caption') ?: '',
+            $request->get_param('album_id')
+        );
+
+        if (is_wp_error($result)) {
+            return $result;
+        }
+
+        return new WP_REST_Response($result, $result['offset'] ? 200 : 201);
+    }
+
+    /**
+     * How much of a chunked upload has arrived
+     */
+    public function get_chunked_upload($request) {
+        $result = Family_Media_Manager_Chunked_Upload::get($request->get_param('upload_id'));
+
+        if (is_wp_error($result)) {
+            return $result;
+        }
+
+        return new WP_REST_Response($result, 200);
+    }
+
+    /**
+     * Append raw bytes to a chunked upload
+     *
+     * The body is the chunk itself. Its position comes from a
+     * "Content-Range: bytes start-end/total" header or ?offset=. The last
+     * chunk answers like POST /upload.
+     */
+    public function append_chunked_upload($request) {
+        $offset = $request->get_param('offset');
+        $range = $request->get_header('content_range');
+
+        if ($range && preg_match('/^bytes (\d+)-\d+\/(\d+|\*)$/', trim($range), $matches)) {
+            $offset = $matches[1];
+        }
+
+        if ($offset === null || !is_numeric($offset)) {
+            return new WP_Error('missing_offset', 'Send a Content-Range header or offset parameter', array('status' => 400));
+        }
+
+        $result = Family_Media_Manager_Chunked_Upload::append(
+            $request->get_param('upload_id'),
+            (int) $offset,
+            $request->get_body()
+        );
+
+        if (is_wp_error($result)) {
+            return $result;
+        }
+
+        // More to come
+        if (isset($result['upload_id'])) {
             return new WP_REST_Response($result, 200);
+        }
+
+        if ($result['success']) {
+            return new WP_REST_Response($result, $result['status'] === 'ready' ? 200 : 202);
         } else {
             return new WP_Error('upload_failed', $result['error'], array('status' => 500));
         }
     }
 
+    /**
+     * Abandon a chunked upload
+     */
+    public function cancel_chunked_upload($request) {
+        $result = Family_Media_Manager_Chunked_Upload::cancel($request->get_param('upload_id'));
+
+        if (is_wp_error($result)) {
+            return $result;
+        }
+
+        return new WP_REST_Response(array('success' => true), 200);
+    }
+
     /**
      * Get gallery endpoint
+     *
+     * Pass ?cursor= (empty for the first page) to page with next_cursor
+     * instead of ?page=N; add include_total=1 to also get the total count,
+     * and include_counts=1 for each item's comment and share counts.
+     * Responses are cached per user and support ETag revalidation.
      */
     public function get_gallery($request) {
+        return Family_Media_Manager_Response_Cache::remember($request, 'gallery', function() use ($request) {
+            return $this->build_gallery($request);
+        });
+    }
+
+    /**
+     * Build the gallery response
+     */
+    private function build_gallery($request) {
+        if ($request->has_param('cursor')) {
+            return $this->get_gallery_by_cursor($request);
+        }
+
         $page = $request->get_param('page') ?: 1;
         $per_page = $request->get_param('per_page') ?: 20;
         $user_id = $request->get_param('user_id');
 
         $result = Family_Media_Manager_Media_Library::get_media(array(
-            'page'     => $page,
-            'per_page' => $per_page,
-            'user_id'  => $user_id
+            'page'      => $page,
+            'per_page'  => $per_page,
+            'user_id'   => $user_id,
+            'viewer_id' => get_current_user_id()
         ));
 
         // Format response
-        $photos = array();
-        foreach ($result['media'] as $media) {
-            $photos[] = array(
-                'id'            => $media->id,
-                'thumbnail_url' => $this->get_thumbnail_url($media->thumbnail_path),
-                'filename'      => $media->filename,
-                'file_type'     => $media->file_type,
-                'upload_date'   => $media->upload_date,
-                'caption'       => $media->caption,
-                'owner_id'      => $media->owner_id
-            );
+        $photos = array_map(array($this, 'format_gallery_item'), $result['media']);
+        
+        if ($request->get_param('include_counts')) {
+            $photos = $this->add_item_counts($photos);
         }
 
         return new WP_REST_Response(array(
@@ -186,6 +342,78 @@ class Family_Media_Manager_API {
         ), 200);
     }
 
+    /**
+     * Cursor-paginated gallery
+     */
+    private function get_gallery_by_cursor($request) {
+        $cursor = null;
+
+        if ($request->get_param('cursor') !== '') {
+            $cursor = Family_Media_Manager_Media_Library::decode_cursor((string) $request->get_param('cursor'));
+
+            if (!$cursor) {
+                return new WP_Error('invalid_cursor', 'Invalid cursor', array('status' => 400));
+            }
+        }
+
+        $result = Family_Media_Manager_Media_Library::get_media_page(array(
+            'per_page'      => min(100, (int) ($request->get_param('per_page') ?: 20)),
+            'user_id'       => $request->get_param('user_id'),
+            'viewer_id'     => get_current_user_id(),
+            'cursor'        => $cursor,
+            'include_total' => (bool) $request->get_param('include_total')
+        ));
+
+        $response = array(
+            'photos'      => array_map(array($this, 'format_gallery_item'), $result['media']),
+            'next_cursor' => $result['next_cursor']
+        );
+
+        if ($request->get_param('include_counts')) {
+            $response['photos'] = $this->add_item_counts($response['photos']);
+        }
+
+        if (isset($result['total'])) {
+            $response['total'] = $result['total'];
+        }
+
+        return new WP_REST_Response($response, 200);
+    }
+
+    /**
+     * Format a media row for gallery listings
+     */
+    private function format_gallery_item($media) {
+        return array(
+            'id'               => $media->id,
+            'thumbnail_url'    => $this->get_thumbnail_url($media->thumbnail_path),
+            'thumbnail_srcset' => $this->get_thumbnail_srcset($media->thumbnail_path),
+            'filename'         => $media->filename,
+            'file_type'        => $media->file_type,
+            'upload_date'      => $media->upload_date,
+            'caption'          => $media->caption,
+            'owner_id'         => $media->owner_id
+        );
+    }
+
+    /**
+     * Add comment_count and shared_with_count to formatted items, with one
+     * grouped query each for the whole page
+     */
+    private function add_item_counts($photos) {
+        $ids = wp_list_pluck($photos, 'id');
+        $comment_counts = Family_Media_Manager_Comments::get_comment_counts($ids);
+        $share_counts = Family_Media_Manager_Sharing::get_share_counts($ids);
+
+        foreach ($photos as &$photo) {
+            $photo['comment_count'] = $comment_counts[(int) $photo['id']];
+            $photo['shared_with_count'] = $share_counts[(int) $photo['id']];
+        }
+        unset($photo);
+
+        return $photos;
+    }
+
     /**
      * Get single media endpoint
      */
@@ -203,18 +431,66 @@ class Family_Media_Manager_API {
         }
 
         return new WP_REST_Response(array(
-            'id'            => $media->id,
-            'thumbnail_url' => $this->get_thumbnail_url($media->thumbnail_path),
-            'filename'      => $media->filename,
-            'file_type'     => $media->file_type,
-            'file_size'     => $media->file_size,
-            'upload_date'   => $media->upload_date,
-            'taken_date'    => $media->taken_date,
-            'caption'       => $media->caption,
-            'owner_id'      => $media->owner_id
+            'id'               => $media->id,
+            'thumbnail_url'    => $this->get_thumbnail_url($media->thumbnail_path),
+            'thumbnail_srcset' => $this->get_thumbnail_srcset($media->thumbnail_path),
+            'filename'         => $media->filename,
+            'file_type'        => $media->file_type,
+            'file_size'        => $media->file_size,
+            'upload_date'      => $media->upload_date,
+            'taken_date'       => $media->taken_date,
+            'caption'          => $media->caption,
+            'owner_id'         => $media->owner_id
         ), 200);
     }
 
+    /**
+     * Get media processing status endpoint
+     */
+    public function get_media_status($request) {
+        $media_id = $request->get_param('id');
+        $media = Family_Media_Manager_Media_Library::get_media_by_id($media_id);
+
+        if (!$media) {
+            return new WP_Error('not_found', 'Media not found', array('status' => 404));
+        }
+
+        // Check access
+        if (!Family_Media_Manager_Sharing::user_can_access($media_id, get_current_user_id())) {
+            return new WP_Error('forbidden', 'Access denied', array('status' => 403));
+        }
+
+        $status = Family_Media_Manager_Upload_Queue::get_status($media);
+        $status['thumbnail_url'] = $this->get_thumbnail_url($media->thumbnail_path);
+
+        return new WP_REST_Response($status, 200);
+    }
+
+    /**
+     * Retry failed upload endpoint
+     */
+    public function retry_media($request) {
+        $media_id = $request->get_param('id');
+        $media = Family_Media_Manager_Media_Library::get_media_by_id($media_id);
+
+        if (!$media) {
+            return new WP_Error('not_found', 'Media not found', array('status' => 404));
+        }
+
+        // Only owner can retry
+        if ($media->owner_id != get_current_user_id()) {
+            return new WP_Error('forbidden', 'Only the owner can retry uploads', array('status' => 403));
+        }
+
+        if ($media->status !== 'failed') {
+            return new WP_Error('not_failed', 'Upload has not failed', array('status' => 400));
+        }
+
+        Family_Media_Manager_Upload_Queue::retry_failed($media_id);
+
+        return new WP_REST_Response(array('success' => true, 'status' => 'pending'), 202);
+    }
+
     /**
      * Get download URL endpoint
      */
@@ -260,13 +536,18 @@ class Family_Media_Manager_API {
             return new WP_Error('forbidden', 'Only the owner can delete media', array('status' => 403));
         }
 
-        // Delete thumbnail
+        // Delete from database
+        Family_Media_Manager_Media_Library::delete_media($media_id);
+
+        // Delete thumbnail (kept if another upload of the same file uses it)
         if ($media->thumbnail_path) {
             Family_Media_Manager_Thumbnail::delete($media->thumbnail_path);
         }
 
-        // Delete from database
-        Family_Media_Manager_Media_Library::delete_media($media_id);
+        // Drop the queued copy of an upload that hasn't been processed yet
+        if ($media->local_path) {
+            @unlink($media->local_path);
+        }
 
         return new WP_REST_Response(array('success' => true), 200);
     }
@@ -294,12 +575,29 @@ class Family_Media_Manager_API {
      * Get thumbnail URL helper
      */
     private function get_thumbnail_url($thumbnail_path) {
-        if (!$thumbnail_path) {
-            return '';
+        return Family_Media_Manager_Thumbnail::get_thumbnail_url($thumbnail_path);
+    }
+
+    /**
+     * Get thumbnail srcset helper
+     *
+     * Maps each format to a srcset string ('url 150w, url 300w, ...') for
+     * the variants listed in the thumbnail's sidecar. Returned as an object
+     * so it is {} in JSON when there are none.
+     */
+    private function get_thumbnail_srcset($thumbnail_path) {
+        $srcset = array();
+        $base_url = Family_Media_Manager_Thumbnail::get_base_url();
+
+        foreach (Family_Media_Manager_Thumbnail::get_variants($thumbnail_path) as $mime => $files) {
+            $candidates = array();
+            foreach ($files as $width => $file) {
+                $candidates[] = $base_url . rawurlencode($file) . ' ' . $width . 'w';
+            }
+            $srcset[$mime] = implode(', ', $candidates);
         }
 
-        $upload_dir = wp_upload_dir();
-        return $upload_dir['baseurl'] . '/family-gallery/' . basename($thumbnail_path);
+        return (object) $srcset;
     }
     
     /**
@@ -349,9 +647,23 @@ class Family_Media_Manager_API {
     
     /**
      * Get album endpoint
+     *
+     * Add include_counts=1 for each item's comment and share counts.
      */
     public function get_album($request) {
         $album_id = $request->get_param('id');
+        
+        $include_counts = (bool) $request->get_param('include_counts');
+        
+        return Family_Media_Manager_Response_Cache::remember($request, 'album/' . $album_id, function() use ($album_id, $include_counts) {
+            return $this->build_album($album_id, $include_counts);
+        }, array('album_' . (int) $album_id));
+    }
+    
+    /**
+     * Build the single album response
+     */
+    private function build_album($album_id, $include_counts = false) {
         $album = Family_Media_Manager_Albums::get_album($album_id);
         
         if (!$album) {
@@ -364,20 +676,27 @@ class Family_Media_Manager_API {
         }
         
         // Get photos in album
-        $media_result = Family_Media_Manager_Albums::get_album_media($album_id);
+        $media_result = Family_Media_Manager_Albums::get_album_media($album_id, array(
+            'viewer_id' => get_current_user_id()
+        ));
         
         $photos = array();
         foreach ($media_result['media'] as $media) {
             $photos[] = array(
-                'id'            => $media->id,
-                'thumbnail_url' => $this->get_thumbnail_url($media->thumbnail_path),
-                'filename'      => $media->filename,
-                'file_type'     => $media->file_type,
-                'upload_date'   => $media->upload_date,
-                'caption'       => $media->caption
+                'id'               => $media->id,
+                'thumbnail_url'    => $this->get_thumbnail_url($media->thumbnail_path),
+                'thumbnail_srcset' => $this->get_thumbnail_srcset($media->thumbnail_path),
+                'filename'         => $media->filename,
+                'file_type'        => $media->file_type,
+                'upload_date'      => $media->upload_date,
+                'caption'          => $media->caption
             );
         }
         
+        if ($include_counts) {
+            $photos = $this->add_item_counts($photos);
+        }
+        
         return new WP_REST_Response(array(
             'id'          => $album->id,
             'name'        => $album->name,
@@ -0,0 +1,245 @@
+<?php
+/**
+ * Resumable chunked uploads
+ *
+ * Large files are sent as raw binary in pieces instead of one multipart or
+ * base64 request. Each piece is appended to a partial file in the upload
+ * queue folder, so memory use is bounded by the chunk size. The client can
+ * ask how much has arrived and carry on from there after a dropped
+ * connection. When the last piece is in, the file's SHA-256 is checked
+ * against the one declared at the start and it goes through the normal
+ * upload handler.
+ */
+class Family_Media_Manager_Chunked_Upload {
+
+    /**
+     * Largest piece accepted in one request, in bytes
+     */
+    private static $max_chunk_size = 8388608;
+
+    /**
+     * Seconds an unfinished upload is kept
+     */
+    private static $ttl = DAY_IN_SECONDS;
+
+    /**
+     * Start an upload, or pick up an unfinished one of the same file
+     *
+     * Returns the session: upload_id, offset (bytes already received),
+     * size and max_chunk_size.
+     */
+    public static function create($filename, $size, $sha256, $caption = '', $album_id = null) {
+        $sha256 = strtolower((string) $sha256);
+
+        if (!preg_match('/^[0-9a-f]{64}$/', $sha256)) {
+            return new WP_Error('invalid_checksum', 'sha256 must be 64 hex characters', array('status' => 400));
+        }
+
+        $size = (int) $size;
+        $max_size = Family_Media_Manager_Uploader::get_max_file_size();
+
+        if ($size <= 0 || $size > $max_size) {
+            return new WP_Error('invalid_size', 'File size must be between 1 byte and ' . size_format($max_size), array('status' => 400));
+        }
+
+        $user_id = get_current_user_id();
+
+        // The same user sending the same file gets the same upload back
+        $upload_id = substr(hash('sha256', $user_id . '|' . $sha256 . '|' . $size), 0, 32);
+        $session = get_transient('fmm_upload_' . $upload_id);
+
+        if (!$session) {
+            self::cleanup();
+
+            $session = array(
+                'user_id'  => $user_id,
+                'filename' => sanitize_file_name($filename) ?: 'upload',
+                'size'     => $size,
+                'sha256'   => $sha256,
+                'caption'  => (string) $caption,
+                'album_id' => $album_id ? (int) $album_id : null
+            );
+            set_transient('fmm_upload_' . $upload_id, $session, self::$ttl);
+        }
+
+        return self::describe($upload_id, $session);
+    }
+
+    /**
+     * Current state of an upload
+     */
+    public static function get($upload_id) {
+        $session = self::load($upload_id);
+
+        if (is_wp_error($session)) {
+            return $session;
+        }
+
+        return self::describe($upload_id, $session);
+    }
+
+    /**
+     * Append a piece of the file
+     *
+     * $offset must equal the number of bytes received so far; otherwise a
+     * 409 carries the real offset so the client can resume from it. Once
+     * the last byte is in, returns the upload handler's result.
+     */
+    public static function append($upload_id, $offset, $data) {
+        $session = self::load($upload_id);
+
+        if (is_wp_error($session)) {
+            return $session;
+        }
+
+        $length = strlen($data);
+
+        if ($length === 0) {
+            return new WP_Error('empty_chunk', 'No data received', array('status' => 400));
+        }
+
+        if ($length > self::$max_chunk_size) {
+            return new WP_Error('chunk_too_large', 'Chunks may be at most ' . size_format(self::$max_chunk_size), array('status' => 413));
+        }
+
+        $path = self::get_path($upload_id);
+        $handle = fopen($path, 'cb');
+
+        if (!$handle || !flock($handle, LOCK_EX)) {
+            return new WP_Error('upload_busy', 'Could not write upload', array('status' => 500));
+        }
+
+        // Checked under the lock, so two retries of the same chunk can't both append
+        clearstatcache(true, $path);
+        $received = filesize($path);
+
+        if ((int) $offset !== $received || $received + $length > $session['size']) {
+            flock($handle, LOCK_UN);
+            fclose($handle);
+
+            return new WP_Error('offset_mismatch', 'Upload is at a different offset', array(
+                'status' => 409,
+                'offset' => $received
+            ));
+        }
+
+        fseek($handle, $received);
+        $written = fwrite($handle, $data);
+        fflush($handle);
+        flock($handle, LOCK_UN);
+        fclose($handle);
+
+        if ($written !== $length) {
+            // Drop the partial write so the client can resend the whole chunk
+            $truncate = fopen($path, 'cb');
+            ftruncate($truncate, $received);
+            fclose($truncate);
+
+            return new WP_Error('write_failed', 'Could not write upload', array('status' => 500));
+        }
+
+        // Refresh the expiry while the upload is moving
+        set_transient('fmm_upload_' . $upload_id, $session, self::$ttl);
+
+        if ($received + $length < $session['size']) {
+            return self::describe($upload_id, $session);
+        }
+
+        return self::complete($upload_id, $session);
+    }
+
+    /**
+     * Throw away an unfinished upload
+     */
+    public static function cancel($upload_id) {
+        $session = self::load($upload_id);
+
+        if (is_wp_error($session)) {
+            return $session;
+        }
+
+        @unlink(self::get_path($upload_id));
+        delete_transient('fmm_upload_' . $upload_id);
+
+        return true;
+    }
+
+    /**
+     * Verify the finished file and hand it to the upload handler
+     */
+    private static function complete($upload_id, $session) {
+        $path = self::get_path($upload_id);
+        delete_transient('fmm_upload_' . $upload_id);
+
+        if (!hash_equals($session['sha256'], hash_file('sha256', $path))) {
+            @unlink($path);
+
+            return new WP_Error('checksum_mismatch', 'The received file does not match its checksum. Please upload it again.', array('status' => 422));
+        }
+
+        $finfo = finfo_open(FILEINFO_MIME_TYPE);
+        $mime_type = finfo_file($finfo, $path);
+        finfo_close($finfo);
+
+        $result = Family_Media_Manager_Uploader::handle_upload(array(
+            'name'     => $session['filename'],
+            'type'     => $mime_type,
+            'tmp_name' => $path,
+            'error'    => 0,
+            'size'     => $session['size']
+        ), $session['caption'], $session['album_id']);
+
+        // The queue moves the file away; anything else leaves it here
+        @unlink($path);
+
+        return $result;
+    }
+
+    /**
+     * Session of an upload owned by the current user
+     */
+    private static function load($upload_id) {
+        $session = preg_match('/^[0-9a-f]{32}$/', $upload_id) ? get_transient('fmm_upload_' . $upload_id) : false;
+
+        if (!$session || (int) $session['user_id'] !== get_current_user_id()) {
+            return new WP_Error('upload_not_found', 'Upload not found or expired', array('status' => 404));
+        }
+
+        return $session;
+    }
+
+    /**
+     * Public view of a session
+     */
+    private static function describe($upload_id, $session) {
+        $path = self::get_path($upload_id);
+        clearstatcache(true, $path);
+
+        return array(
+            'upload_id'      => $upload_id,
+            'offset'         => file_exists($path) ? filesize($path) : 0,
+            'size'           => $session['size'],
+            'max_chunk_size' => self::$max_chunk_size
+        );
+    }
+
+    /**
+     * Where the partial file is kept
+     */
+    private static function get_path($upload_id) {
+        return Family_Media_Manager_Upload_Queue::get_queue_dir() . '/' . $upload_id . '.part';
+    }
+
+    /**
+     * Delete partial files whose upload has expired
+     */
+    private static function cleanup() {
+        $files = glob(Family_Media_Manager_Upload_Queue::get_queue_dir() . '/*.part');
+
+        foreach ($files ?: array() as $file) {
+            if (filemtime($file) < time() - self::$ttl) {
+                @unlink($file);
+            }
+        }
+    }
+}
@@ -0,0 +1,67 @@
+<?php
+/**
+ * WP-CLI commands
+ *
+ * Check and repair the gallery statistics counters, and flush the
+ * cached API responses.
+ */
+class Family_Media_Manager_CLI {
+
+    /**
+     * Compare the stored counters with a fresh count of the media table
+     *
+     * ## EXAMPLES
+     *
+     *     wp family-media stats verify
+     */
+    public function verify($args, $assoc_args) {
+        $drift = Family_Media_Manager_Stats::verify();
+
+        if (empty($drift)) {
+            WP_CLI::success('All counters are correct.');
+            return;
+        }
+
+        WP_CLI\Utils\format_items('table', $drift, array('counter', 'stored', 'actual'));
+        WP_CLI::error(sprintf('%d counter(s) have drifted. Run "wp family-media stats rebuild" to fix them.', count($drift)));
+    }
+
+    /**
+     * Recount every counter from the media table
+     *
+     * ## EXAMPLES
+     *
+     *     wp family-media stats rebuild
+     */
+    public function rebuild($args, $assoc_args) {
+        $drift = Family_Media_Manager_Stats::rebuild();
+
+        if (!empty($drift)) {
+            WP_CLI\Utils\format_items('table', $drift, array('counter', 'stored', 'actual'));
+        }
+
+        WP_CLI::success(sprintf('Counters rebuilt (%d corrected).', count($drift)));
+    }
+}
+
+/**
+ * WP-CLI commands for the REST API response cache
+ */
+class Family_Media_Manager_Cache_CLI {
+
+    /**
+     * Retire every cached API response
+     *
+     * Run after thumbnails are changed outside the plugin (fmm-thumbnails.py
+     * does this itself), so listings pick up the new URLs and srcsets.
+     *
+     * ## EXAMPLES
+     *
+     *     wp family-media cache flush
+     */
+    public function flush($args, $assoc_args) {
+        Family_Media_Manager_Response_Cache::invalidate();
+
+        WP_CLI::success('Cached API responses flushed.');
+    }
+}
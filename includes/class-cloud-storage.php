@@ -15,6 +15,36 @@ class Family_Media_Manager_Cloud_Storage {
      */
     private $provider;
 
+    /**
+     * Size of each piece of a resumable upload (a multiple of 256KB) - 8MB
+     */
+    private static $upload_chunk_size = 8388608;
+
+    /**
+     * How many times an interrupted upload is resumed before giving up
+     */
+    private static $upload_max_retries = 5;
+
+    /**
+     * How many times in a row Drive may answer without taking any bytes
+     */
+    private static $upload_max_stalls = 5;
+
+    /**
+     * Refresh access tokens this many seconds before they expire
+     */
+    private static $token_refresh_margin = 60;
+
+    /**
+     * How long to wait for another request's token refresh, in seconds
+     */
+    private static $token_lock_timeout = 15;
+
+    /**
+     * How long a resolved Drive folder ID is reused
+     */
+    private static $folder_cache_ttl = WEEK_IN_SECONDS;
+
     /**
      * Initialize the cloud storage handler
      */
@@ -91,6 +121,9 @@ class Family_Media_Manager_Cloud_Storage {
         
         if (isset($body['access_token'])) {
             $this->save_tokens($body['access_token'], $body['refresh_token'] ?? null, $body['expires_in'] ?? 3600);
+            
+            // A new connection may be a different Drive account
+            delete_transient($this->folder_cache_key('FamilyGallery'));
             return true;
         }
         
@@ -113,14 +146,33 @@ class Family_Media_Manager_Cloud_Storage {
             'refresh_token' => $refresh_token,
             'expires_at'    => $expires_at
         ));
+        
+        wp_cache_delete($this->token_cache_key(), 'family_media_manager');
     }
 
     /**
-     * Get valid access token (refresh if expired)
+     * Object cache key for this user's token row
      */
-    private function get_access_token() {
+    private function token_cache_key() {
+        return 'token_' . $this->provider . '_' . $this->user_id;
+    }
+
+    /**
+     * Load this user's token row, from the object cache when possible
+     */
+    private function load_token_data($use_cache = true) {
         global $wpdb;
         
+        $cache_key = $this->token_cache_key();
+        
+        if ($use_cache) {
+            $token_data = wp_cache_get($cache_key, 'family_media_manager');
+            
+            if ($token_data !== false) {
+                return $token_data;
+            }
+        }
+        
         $table = $wpdb->prefix . 'family_cloud_tokens';
         $token_data = $wpdb->get_row($wpdb->prepare(
             "SELECT * FROM $table WHERE user_id = %d AND provider = %s",
@@ -128,19 +180,73 @@ class Family_Media_Manager_Cloud_Storage {
             $this->provider
         ));
         
+        if ($token_data) {
+            // Keep it only while it's usable
+            $ttl = strtotime($token_data->expires_at) - time() - self::$token_refresh_margin;
+            
+            if ($ttl > 0) {
+                wp_cache_set($cache_key, $token_data, 'family_media_manager', $ttl);
+            }
+        }
+        
+        return $token_data;
+    }
+
+    /**
+     * Does this token row need refreshing?
+     *
+     * $rejected is a token the provider has turned down, which needs
+     * replacing however long it still has to run.
+     */
+    private function token_expiring($token_data, $rejected = null) {
+        return ($rejected !== null && $token_data->access_token === $rejected) ||
+            strtotime($token_data->expires_at) - self::$token_refresh_margin < time();
+    }
+
+    /**
+     * Get valid access token (refresh if expired)
+     *
+     * The token row is cached, and only one request per user refreshes it:
+     * the others wait on a database lock and then pick up the new token.
+     * Pass a token the provider answered 401 to in $rejected to get a new one.
+     */
+    private function get_access_token($rejected = null) {
+        global $wpdb;
+        
+        $token_data = $this->load_token_data();
+        
         if (!$token_data) {
             return false;
         }
         
-        // Check if token is expired
-        if (strtotime($token_data->expires_at) < time()) {
-            // Refresh token
-            if ($this->provider === 'google_drive') {
-                $this->refresh_google_token($token_data->refresh_token);
-                return $this->get_access_token(); // Recursively get new token
+        if (!$this->token_expiring($token_data, $rejected)) {
+            return $token_data->access_token;
+        }
+        
+        if ($this->provider !== 'google_drive') {
+            return $token_data->access_token;
+        }
+        
+        $lock = 'fmm_token_refresh_' . $this->user_id;
+        $locked = $wpdb->get_var($wpdb->prepare('SELECT GET_LOCK(%s, %d)', $lock, self::$token_lock_timeout));
+        
+        // Another request may have refreshed it while we waited
+        $token_data = $this->load_token_data(false);
+        
+        if ($token_data && $this->token_expiring($token_data, $rejected) && $locked) {
+            if ($this->refresh_google_token($token_data->refresh_token)) {
+                $token_data = $this->load_token_data(false);
             }
         }
         
+        if ($locked) {
+            $wpdb->query($wpdb->prepare('SELECT RELEASE_LOCK(%s)', $lock));
+        }
+        
+        if (!$token_data || strtotime($token_data->expires_at) < time() || $token_data->access_token === $rejected) {
+            return false;
+        }
+        
         return $token_data->access_token;
     }
 
@@ -176,8 +282,10 @@ class Family_Media_Manager_Cloud_Storage {
 
     /**
      * Upload file to cloud storage
+     *
+     * $content_hash is the file's SHA-256, when the caller already has it.
      */
-    public function upload_file($file_path, $filename) {
+    public function upload_file($file_path, $filename, $content_hash = null) {
         $access_token = $this->get_access_token();
         
         if (!$access_token) {
@@ -185,16 +293,33 @@ class Family_Media_Manager_Cloud_Storage {
         }
         
         if ($this->provider === 'google_drive') {
-            return $this->upload_to_google_drive($file_path, $filename, $access_token);
+            return $this->upload_to_google_drive($file_path, $filename, $access_token, $content_hash);
         }
         
         return array('success' => false, 'error' => 'Unsupported provider');
     }
 
+    /**
+     * Base URL of the Google Drive API
+     *
+     * Define FAMILY_MEDIA_MANAGER_DRIVE_API in wp-config.php to point the
+     * plugin at a stand-in such as fmm-drive-stub.py for offline testing.
+     */
+    private function drive_api_url($path) {
+        $base = defined('FAMILY_MEDIA_MANAGER_DRIVE_API') ? FAMILY_MEDIA_MANAGER_DRIVE_API : 'https://www.googleapis.com';
+        return rtrim($base, '/') . $path;
+    }
+
     /**
      * Upload file to Google Drive
+     *
+     * Uses Drive's resumable protocol: the file is streamed from disk in
+     * fixed-size chunks, so memory use doesn't grow with the file, and an
+     * interrupted chunk is resumed from the last byte Drive received. The
+     * session is remembered for a day, so retrying the same upload later
+     * carries on where it stopped.
      */
-    private function upload_to_google_drive($file_path, $filename, $access_token) {
+    private function upload_to_google_drive($file_path, $filename, $access_token, $content_hash = null) {
         // First, create/get the FamilyGallery folder
         $folder_id = $this->get_or_create_folder('FamilyGallery', $access_token);
         
@@ -202,57 +327,290 @@ class Family_Media_Manager_Cloud_Storage {
             return array('success' => false, 'error' => 'Could not create folder');
         }
         
-        // Upload file
-        $boundary = wp_generate_password(32, false);
-        $file_content = file_get_contents($file_path);
-        $mime_type = mime_content_type($file_path);
+        $file_size = filesize($file_path);
+        
+        if (!$content_hash) {
+            $content_hash = hash_file('sha256', $file_path);
+        }
+        
+        $session_key = 'family_media_manager_upload_' . md5(
+            $this->user_id . '|' . $content_hash . '|' . $filename . '|' . $folder_id
+        );
+        
+        // Resume an earlier session for this file if Drive still has it
+        $session_uri = get_transient($session_key);
+        $status = false;
+        
+        if ($session_uri) {
+            $status = $this->query_resumable_upload($session_uri, $file_size, $access_token);
+            
+            if (isset($status['unauthorized'])) {
+                $access_token = $this->get_access_token($access_token);
+                
+                if (!$access_token) {
+                    return array('success' => false, 'error' => 'Not authenticated');
+                }
+                
+                $status = $this->query_resumable_upload($session_uri, $file_size, $access_token);
+            }
+            
+            if ($status === false || isset($status['unauthorized']) || isset($status['error'])) {
+                $session_uri = false;
+            }
+        }
+        
+        if (!$session_uri) {
+            $session_uri = $this->start_resumable_upload($file_path, $filename, $folder_id, $access_token);
+            
+            if (!$session_uri) {
+                // The folder may have been deleted; look it up again next time
+                delete_transient($this->folder_cache_key('FamilyGallery'));
+                return array('success' => false, 'error' => 'Could not start upload');
+            }
+            
+            set_transient($session_key, $session_uri, DAY_IN_SECONDS);
+            $status = array('done' => false, 'offset' => 0);
+        }
+        
+        $handle = fopen($file_path, 'rb');
+        
+        if (!$handle) {
+            return array('success' => false, 'error' => 'Could not read file');
+        }
+        
+        $retries = 0;
+        $stalls = 0;
+        $reauthorized = false;
+        
+        while (!$status['done']) {
+            $next = $this->send_upload_chunk($handle, $session_uri, $status['offset'], $file_size, $access_token);
+            
+            if ($next === false) {
+                // Connection dropped or Drive had a hiccup: ask how much arrived
+                if (++$retries > self::$upload_max_retries) {
+                    fclose($handle);
+                    return array('success' => false, 'error' => 'Upload interrupted, please try again');
+                }
+                
+                sleep(min($retries, 5));
+                $next = $this->query_resumable_upload($session_uri, $file_size, $access_token);
+                
+                if ($next === false) {
+                    continue;
+                }
+            }
+            
+            if (isset($next['unauthorized'])) {
+                // The token ran out mid-upload: get a new one and carry on
+                // with the same session. A second 401 in a row means the
+                // new token isn't accepted either.
+                $access_token = $reauthorized ? false : $this->get_access_token($access_token);
+                
+                if (!$access_token) {
+                    fclose($handle);
+                    return array('success' => false, 'error' => 'Not authenticated');
+                }
+                
+                $reauthorized = true;
+                continue;
+            }
+            
+            if (isset($next['error'])) {
+                fclose($handle);
+                delete_transient($session_key);
+                return array('success' => false, 'error' => $next['error']);
+            }
+            
+            $reauthorized = false;
+            
+            if (!$next['done'] && $next['offset'] <= $status['offset']) {
+                // Drive answered but kept none of the chunk
+                if (++$stalls > self::$upload_max_stalls) {
+                    fclose($handle);
+                    return array('success' => false, 'error' => 'Upload is not making progress, please try again');
+                }
+                
+                sleep(min($stalls, 5));
+            } else {
+                $stalls = 0;
+            }
+            
+            $status = $next;
+        }
+        
+        fclose($handle);
+        delete_transient($session_key);
         
+        if (isset($status['file']['id'])) {
+            return array(
+                'success' => true,
+                'file_id' => $status['file']['id'],
+                'file_name' => $status['file']['name'] ?? $filename
+            );
+        }
+        
+        return array('success' => false, 'error' => 'Upload failed');
+    }
+
+    /**
+     * Open a resumable upload session, returning its URI
+     */
+    private function start_resumable_upload($file_path, $filename, $folder_id, $access_token) {
         $metadata = json_encode(array(
             'name' => $filename,
             'parents' => array($folder_id)
         ));
         
-        $body = "--{$boundary}\r\n";
-        $body .= "Content-Type: application/json; charset=UTF-8\r\n\r\n";
-        $body .= $metadata . "\r\n";
-        $body .= "--{$boundary}\r\n";
-        $body .= "Content-Type: {$mime_type}\r\n\r\n";
-        $body .= $file_content . "\r\n";
-        $body .= "--{$boundary}--";
+        $response = wp_remote_post($this->drive_api_url('/upload/drive/v3/files?uploadType=resumable'), array(
+            'headers' => array(
+                'Authorization' => 'Bearer ' . $access_token,
+                'Content-Type' => 'application/json; charset=UTF-8',
+                'X-Upload-Content-Type' => mime_content_type($file_path),
+                'X-Upload-Content-Length' => filesize($file_path)
+            ),
+            'body' => $metadata,
+            'timeout' => 30
+        ));
+        
+        if (is_wp_error($response) || wp_remote_retrieve_response_code($response) !== 200) {
+            return false;
+        }
         
-        $response = wp_remote_post('https://www.googleapis.com/upload/drive/v3/files?uploadType=multipart', array(
+        $location = wp_remote_retrieve_header($response, 'location');
+        return $location ? $location : false;
+    }
+
+    /**
+     * Send the chunk of the file starting at $offset
+     */
+    private function send_upload_chunk($handle, $session_uri, $offset, $file_size, $access_token) {
+        fseek($handle, $offset);
+        $chunk = $file_size > 0 ? fread($handle, self::$upload_chunk_size) : '';
+        
+        if ($chunk === false) {
+            return array('error' => 'Could not read file');
+        }
+        
+        $length = strlen($chunk);
+        $range = $length > 0
+            ? 'bytes ' . $offset . '-' . ($offset + $length - 1) . '/' . $file_size
+            : 'bytes */' . $file_size;
+        
+        $response = wp_remote_request($session_uri, array(
+            'method' => 'PUT',
             'headers' => array(
                 'Authorization' => 'Bearer ' . $access_token,
-                'Content-Type' => 'multipart/related; boundary=' . $boundary
+                'Content-Length' => $length,
+                'Content-Range' => $range
             ),
-            'body' => $body,
-            'timeout' => 60
+            'body' => $chunk,
+            'timeout' => 60,
+            'redirection' => 0
         ));
         
+        return $this->parse_resumable_response($response);
+    }
+
+    /**
+     * Ask Drive how much of an upload it has received
+     */
+    private function query_resumable_upload($session_uri, $file_size, $access_token) {
+        $response = wp_remote_request($session_uri, array(
+            'method' => 'PUT',
+            'headers' => array(
+                'Authorization' => 'Bearer ' . $access_token,
+                'Content-Length' => 0,
+                'Content-Range' => 'bytes */' . $file_size
+            ),
+            'body' => '',
+            'timeout' => 30,
+            'redirection' => 0
+        ));
+        
+        return $this->parse_resumable_response($response);
+    }
+
+    /**
+     * Turn a resumable upload response into the upload's state
+     *
+     * Returns array('done' => true, 'file' => ...) when Drive has the whole
+     * file, array('done' => false, 'offset' => n) when it wants more,
+     * array('unauthorized' => true) when the access token was turned down,
+     * array('error' => ...) when the upload can't continue, or false when
+     * the request should be retried.
+     */
+    private function parse_resumable_response($response) {
         if (is_wp_error($response)) {
-            return array('success' => false, 'error' => $response->get_error_message());
+            return false;
         }
         
-        $result = json_decode(wp_remote_retrieve_body($response), true);
+        $code = wp_remote_retrieve_response_code($response);
         
-        if (isset($result['id'])) {
+        if ($code === 200 || $code === 201) {
             return array(
-                'success' => true,
-                'file_id' => $result['id'],
-                'file_name' => $result['name']
+                'done' => true,
+                'file' => json_decode(wp_remote_retrieve_body($response), true)
             );
         }
         
-        return array('success' => false, 'error' => 'Upload failed');
+        if ($code === 308) {
+            // "Range: bytes=0-N" - the next byte to send is N + 1
+            $range = wp_remote_retrieve_header($response, 'range');
+            $offset = preg_match('/bytes=\d+-(\d+)/', $range, $matches) ? (int) $matches[1] + 1 : 0;
+            return array('done' => false, 'offset' => $offset);
+        }
+        
+        if ($code === 401) {
+            return array('unauthorized' => true);
+        }
+        
+        if ($code === 404 || $code === 410) {
+            return array('error' => 'Upload session expired, please try again');
+        }
+        
+        if ($code === 429 || $code >= 500) {
+            return false;
+        }
+        
+        return array('error' => 'Upload failed (HTTP ' . $code . ')');
+    }
+
+    /**
+     * Transient key for a resolved folder ID
+     */
+    private function folder_cache_key($folder_name) {
+        return 'family_media_manager_folder_' . md5($this->provider . '|' . $this->user_id . '|' . $folder_name);
     }
 
     /**
      * Get or create folder in Google Drive
+     *
+     * The folder ID is remembered, so uploads don't search Drive each time.
      */
     private function get_or_create_folder($folder_name, $access_token) {
+        $cache_key = $this->folder_cache_key($folder_name);
+        $folder_id = get_transient($cache_key);
+        
+        if ($folder_id) {
+            return $folder_id;
+        }
+        
+        $folder_id = $this->find_or_create_folder($folder_name, $access_token);
+        
+        if ($folder_id) {
+            set_transient($cache_key, $folder_id, self::$folder_cache_ttl);
+        }
+        
+        return $folder_id;
+    }
+
+    /**
+     * Look up a folder in Google Drive, creating it if it doesn't exist
+     */
+    private function find_or_create_folder($folder_name, $access_token) {
         // Search for existing folder
         $query = "name='{$folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false";
-        $response = wp_remote_get('https://www.googleapis.com/drive/v3/files?' . http_build_query(array('q' => $query)), array(
+        $response = wp_remote_get($this->drive_api_url('/drive/v3/files?' . http_build_query(array('q' => $query))), array(
             'headers' => array(
                 'Authorization' => 'Bearer ' . $access_token
             )
@@ -271,7 +629,7 @@ class Family_Media_Manager_Cloud_Storage {
             'mimeType' => 'application/vnd.google-apps.folder'
         ));
         
-        $response = wp_remote_post('https://www.googleapis.com/drive/v3/files', array(
+        $response = wp_remote_post($this->drive_api_url('/drive/v3/files'), array(
             'headers' => array(
                 'Authorization' => 'Bearer ' . $access_token,
                 'Content-Type' => 'application/json'
@@ -301,7 +659,37 @@ class Family_Media_Manager_Cloud_Storage {
         
         if ($this->provider === 'google_drive') {
             // Google Drive direct download URL
-            return "https://www.googleapis.com/drive/v3/files/{$file_id}?alt=media&access_token={$access_token}";
+            return $this->drive_api_url("/drive/v3/files/{$file_id}?alt=media&access_token={$access_token}");
+        }
+        
+        return false;
+    }
+
+    /**
+     * Delete a file from cloud storage (true if it is gone)
+     */
+    public function delete_file($file_id) {
+        $access_token = $this->get_access_token();
+        
+        if (!$access_token || !$file_id) {
+            return false;
+        }
+        
+        if ($this->provider === 'google_drive') {
+            $response = wp_remote_request($this->drive_api_url('/drive/v3/files/' . rawurlencode($file_id)), array(
+                'method' => 'DELETE',
+                'headers' => array(
+                    'Authorization' => 'Bearer ' . $access_token
+                ),
+                'timeout' => 30
+            ));
+            
+            if (is_wp_error($response)) {
+                return false;
+            }
+            
+            $code = wp_remote_retrieve_response_code($response);
+            return $code === 204 || $code === 404;
         }
         
         return false;
@@ -30,6 +30,8 @@ class Family_Media_Manager_Comments {
         ));
         
         if ($result) {
+            // Comment counts are part of cached gallery responses
+            Family_Media_Manager_Response_Cache::invalidate_media($media_id);
             return $wpdb->insert_id;
         }
         
@@ -85,7 +87,13 @@ class Family_Media_Manager_Comments {
             return false;
         }
         
-        return $wpdb->delete($table, array('id' => $comment_id));
+        $result = $wpdb->delete($table, array('id' => $comment_id));
+        
+        if ($result) {
+            Family_Media_Manager_Response_Cache::invalidate_media($comment->media_id);
+        }
+        
+        return $result;
     }
 
     /**
@@ -102,6 +110,39 @@ class Family_Media_Manager_Comments {
         ));
     }
 
+    /**
+     * Get comment counts for several media items in one query
+     *
+     * Returns array(media_id => count), with 0 for items without comments.
+     */
+    public static function get_comment_counts($media_ids) {
+        global $wpdb;
+        
+        $media_ids = array_unique(array_map('intval', $media_ids));
+        
+        if (empty($media_ids)) {
+            return array();
+        }
+        
+        $table = $wpdb->prefix . 'family_comments';
+        $placeholders = implode(',', array_fill(0, count($media_ids), '%d'));
+        
+        $rows = $wpdb->get_results($wpdb->prepare(
+            "SELECT media_id, COUNT(*) AS total 
+             FROM $table
+             WHERE media_id IN ($placeholders)
+             GROUP BY media_id",
+            $media_ids
+        ));
+        
+        $counts = array_fill_keys($media_ids, 0);
+        foreach ($rows as $row) {
+            $counts[(int) $row->media_id] = (int) $row->total;
+        }
+        
+        return $counts;
+    }
+
     /**
      * Create comments table (for activator)
      */
@@ -10,6 +10,7 @@ class Family_Media_Manager_Deactivator {
     public static function deactivate() {
         // Clear scheduled tasks if any
         wp_clear_scheduled_hook('family_media_manager_cleanup');
+        wp_clear_scheduled_hook('family_media_manager_process_uploads');
         
         // Flush rewrite rules
         flush_rewrite_rules();
@@ -27,9 +27,11 @@ class Family_Media_Manager {
         $this->plugin_name = 'family-media-manager';
 
         $this->load_dependencies();
+        $this->maybe_upgrade_database();
         $this->define_admin_hooks();
         $this->define_public_hooks();
         $this->define_api_hooks();
+        $this->define_queue_hooks();
     }
 
     /**
@@ -40,8 +42,12 @@ class Family_Media_Manager {
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-loader.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-cloud-storage.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-media-library.php';
+        require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-response-cache.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-sharing.php';
+        require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-stats.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-uploader.php';
+        require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-upload-queue.php';
+        require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-chunked-upload.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-thumbnail.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-albums.php';
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-comments.php';
@@ -54,10 +60,33 @@ class Family_Media_Manager {
         
         // API classes
         require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-api.php';
+        
+        // WP-CLI commands
+        if (defined('WP_CLI') && WP_CLI) {
+            require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-cli.php';
+            WP_CLI::add_command('family-media stats', 'Family_Media_Manager_CLI');
+            WP_CLI::add_command('family-media cache', 'Family_Media_Manager_Cache_CLI');
+        }
 
         $this->loader = new Family_Media_Manager_Loader();
     }
 
+    /**
+     * Bring the database tables up to date after the plugin is updated
+     *
+     * Activation doesn't run when plugin files are replaced in place (e.g.
+     * by fmm-easy-setup.py), so the schema version is checked on load and
+     * the activator's dbDelta calls are re-run when it is behind.
+     */
+    private function maybe_upgrade_database() {
+        if (get_option('family_media_manager_db_version') === FAMILY_MEDIA_MANAGER_DB_VERSION) {
+            return;
+        }
+
+        require_once FAMILY_MEDIA_MANAGER_PATH . 'includes/class-activator.php';
+        Family_Media_Manager_Activator::activate();
+    }
+
     /**
      * Register all hooks related to admin functionality
      */
@@ -86,6 +115,16 @@ class Family_Media_Manager {
         $plugin_api = new Family_Media_Manager_API($this->plugin_name, $this->version);
 
         $this->loader->add_action('rest_api_init', $plugin_api, 'register_routes');
+        $this->loader->add_filter('rest_post_dispatch', $plugin_api, 'add_query_count_header', 10, 3);
+        $this->loader->add_filter('rest_exposed_cors_headers', 'Family_Media_Manager_Response_Cache', 'expose_cors_headers');
+        $this->loader->add_filter('rest_allowed_cors_headers', 'Family_Media_Manager_Response_Cache', 'allow_cors_headers');
+    }
+
+    /**
+     * Register the background upload worker
+     */
+    private function define_queue_hooks() {
+        $this->loader->add_action(Family_Media_Manager_Upload_Queue::HOOK, 'Family_Media_Manager_Upload_Queue', 'process');
     }
 
     /**
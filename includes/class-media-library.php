@@ -14,10 +14,11 @@ class Family_Media_Manager_Media_Library {
         $defaults = array(
             'page'     => 1,
             'per_page' => 20,
-            'user_id'  => null,
-            'album_id' => null,
-            'order_by' => 'upload_date',
-            'order'    => 'DESC'
+            'user_id'   => null,
+            'album_id'  => null,
+            'viewer_id' => null,
+            'order_by'  => 'upload_date',
+            'order'     => 'DESC'
         );
         
         $args = wp_parse_args($args, $defaults);
@@ -25,7 +26,8 @@ class Family_Media_Manager_Media_Library {
         $table = $wpdb->prefix . 'family_media';
         $offset = ($args['page'] - 1) * $args['per_page'];
         
-        $where = array('1=1');
+        // Uploads still in the background queue aren't listed yet
+        $where = array("status = 'ready'");
         
         if ($args['user_id']) {
             $where[] = $wpdb->prepare('owner_id = %d', $args['user_id']);
@@ -35,9 +37,15 @@ class Family_Media_Manager_Media_Library {
             $where[] = $wpdb->prepare('album_id = %d', $args['album_id']);
         }
         
+        // Only what the viewer owns or has been shared, so totals and
+        // pages count the same rows that are returned
+        if ($args['viewer_id']) {
+            $where[] = Family_Media_Manager_Sharing::access_clause($args['viewer_id']);
+        }
+        
         $where_clause = implode(' AND ', $where);
         
-        $sql = "SELECT * FROM $table 
+        $sql = "SELECT * FROM $table m 
                 WHERE $where_clause 
                 ORDER BY {$args['order_by']} {$args['order']} 
                 LIMIT %d OFFSET %d";
@@ -45,7 +53,7 @@ class Family_Media_Manager_Media_Library {
         $results = $wpdb->get_results($wpdb->prepare($sql, $args['per_page'], $offset));
         
         // Get total count
-        $total = $wpdb->get_var("SELECT COUNT(*) FROM $table WHERE $where_clause");
+        $total = $wpdb->get_var("SELECT COUNT(*) FROM $table m WHERE $where_clause");
         
         return array(
             'media' => $results,
@@ -54,20 +62,148 @@ class Family_Media_Manager_Media_Library {
         );
     }
 
+    /**
+     * Get a page of media items, newest first, using a keyset cursor
+     *
+     * Instead of OFFSET (which reads and discards every earlier row), each
+     * page continues from the (upload_date, id) of the last item on the
+     * previous one, using the upload_date_id index, so page 500 costs the
+     * same as page 1. The total is only counted when asked for.
+     */
+    public static function get_media_page($args = array()) {
+        global $wpdb;
+        
+        $defaults = array(
+            'per_page'      => 20,
+            'user_id'       => null,
+            'album_id'      => null,
+            'viewer_id'     => null,
+            'cursor'        => null,
+            'include_total' => false
+        );
+        
+        $args = wp_parse_args($args, $defaults);
+        
+        $table = $wpdb->prefix . 'family_media';
+        $per_page = max(1, (int) $args['per_page']);
+        
+        // Uploads still in the background queue aren't listed yet
+        $where = array("status = 'ready'");
+        
+        if ($args['user_id']) {
+            $where[] = $wpdb->prepare('owner_id = %d', $args['user_id']);
+        }
+        
+        if ($args['album_id']) {
+            $where[] = $wpdb->prepare('album_id = %d', $args['album_id']);
+        }
+        
+        // Only what the viewer owns or has been shared, so totals and
+        // pages count the same rows that are returned
+        if ($args['viewer_id']) {
+            $where[] = Family_Media_Manager_Sharing::access_clause($args['viewer_id']);
+        }
+        
+        $filter_clause = implode(' AND ', $where);
+        
+        if ($args['cursor']) {
+            $where[] = $wpdb->prepare(
+                '(upload_date < %s OR (upload_date = %s AND id < %d))',
+                $args['cursor']['upload_date'],
+                $args['cursor']['upload_date'],
+                $args['cursor']['id']
+            );
+        }
+        
+        $where_clause = implode(' AND ', $where);
+        
+        // One extra row tells us whether there is another page
+        $results = $wpdb->get_results($wpdb->prepare(
+            "SELECT * FROM $table m 
+             WHERE $where_clause 
+             ORDER BY upload_date DESC, id DESC 
+             LIMIT %d",
+            $per_page + 1
+        ));
+        
+        $next_cursor = null;
+        if (count($results) > $per_page) {
+            $results = array_slice($results, 0, $per_page);
+            $next_cursor = self::encode_cursor(end($results));
+        }
+        
+        $page = array(
+            'media'       => $results,
+            'next_cursor' => $next_cursor
+        );
+        
+        if ($args['include_total']) {
+            $page['total'] = (int) $wpdb->get_var("SELECT COUNT(*) FROM $table m WHERE $filter_clause");
+        }
+        
+        return $page;
+    }
+
+    /**
+     * Opaque cursor pointing just after a media item
+     */
+    public static function encode_cursor($media) {
+        $json = wp_json_encode(array($media->upload_date, (int) $media->id));
+        return rtrim(strtr(base64_encode($json), '+/', '-_'), '=');
+    }
+
+    /**
+     * Decode a cursor from encode_cursor(), or return null if it is invalid
+     */
+    public static function decode_cursor($cursor) {
+        $json = base64_decode(strtr($cursor, '-_', '+/'), true);
+        $data = $json ? json_decode($json, true) : null;
+        
+        if (!is_array($data) || count($data) !== 2 || !is_string($data[0]) || !is_int($data[1])
+            || !preg_match('/^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$/', $data[0])) {
+            return null;
+        }
+        
+        return array(
+            'upload_date' => $data[0],
+            'id'          => $data[1]
+        );
+    }
+
     /**
      * Get single media item by ID
+     *
+     * Inside a transaction, pass $for_update to lock the row until it ends.
      */
-    public static function get_media_by_id($media_id) {
+    public static function get_media_by_id($media_id, $for_update = false) {
         global $wpdb;
         
         $table = $wpdb->prefix . 'family_media';
         
         return $wpdb->get_row($wpdb->prepare(
-            "SELECT * FROM $table WHERE id = %d",
+            "SELECT * FROM $table WHERE id = %d" . ($for_update ? ' FOR UPDATE' : ''),
             $media_id
         ));
     }
 
+    /**
+     * Get a user's media item by the SHA-256 of its file
+     *
+     * Each user has their own copy of a file, so one family member's
+     * upload never hands them another's item.
+     */
+    public static function get_media_by_hash($content_hash, $owner_id) {
+        global $wpdb;
+        
+        $table = $wpdb->prefix . 'family_media';
+        
+        return $wpdb->get_row($wpdb->prepare(
+            "SELECT * FROM $table WHERE content_hash = %s AND owner_id = %d",
+            $content_hash,
+            $owner_id
+        ));
+    }
+
     /**
      * Add new media item to library
      */
@@ -84,18 +220,39 @@ class Family_Media_Manager_Media_Library {
             'file_type'       => 'photo',
             'file_size'       => 0,
             'thumbnail_path'  => null,
+            'content_hash'    => null,
             'upload_date'     => current_time('mysql'),
             'taken_date'      => null,
             'album_id'        => null,
-            'caption'         => ''
+            'caption'         => '',
+            'status'          => 'ready',
+            'local_path'      => null
         );
         
         $data = wp_parse_args($data, $defaults);
         
-        $result = $wpdb->insert($table, $data);
+        // Insert and count it in one transaction; queued uploads are
+        // counted when the queue marks them ready
+        $media_id = Family_Media_Manager_Stats::transaction(function() use ($wpdb, $table, $data) {
+            if (!$wpdb->insert($table, $data)) {
+                return false;
+            }
+            
+            $media_id = $wpdb->insert_id;
+            
+            if ($data['status'] === 'ready') {
+                Family_Media_Manager_Stats::media_added((object) $data);
+            }
+            
+            return $media_id;
+        });
         
-        if ($result) {
-            return $wpdb->insert_id;
+        if ($media_id) {
+            // Nobody else can see a new item yet
+            if ($data['status'] === 'ready') {
+                Family_Media_Manager_Response_Cache::invalidate_users($data['owner_id']);
+            }
+            return $media_id;
         }
         
         return false;
@@ -109,11 +266,51 @@ class Family_Media_Manager_Media_Library {
         
         $table = $wpdb->prefix . 'family_media';
         
-        return $wpdb->update(
+        $result = $wpdb->update(
             $table,
             $data,
             array('id' => $media_id)
         );
+        
+        Family_Media_Manager_Response_Cache::invalidate_media($media_id);
+        
+        return $result;
+    }
+
+    /**
+     * Mark an item that was being uploaded as ready, and count it
+     *
+     * Done in one transaction, and only if the item is still in
+     * $from_status. The row is read again for the count, as it may have
+     * been moved to an album meanwhile. Returns false if the item was
+     * deleted (or otherwise changed) while it was being processed.
+     */
+    public static function mark_ready($media_id, $data, $from_status = 'pending') {
+        global $wpdb;
+        
+        $table = $wpdb->prefix . 'family_media';
+        
+        $marked = Family_Media_Manager_Stats::transaction(function() use ($wpdb, $table, $media_id, $data, $from_status) {
+            $updated = $wpdb->update(
+                $table,
+                array_merge($data, array('status' => 'ready')),
+                array('id' => $media_id, 'status' => $from_status)
+            );
+            
+            if (!$updated) {
+                return false;
+            }
+            
+            Family_Media_Manager_Stats::media_added(self::get_media_by_id($media_id));
+            
+            return true;
+        });
+        
+        if ($marked) {
+            Family_Media_Manager_Response_Cache::invalidate_media($media_id);
+        }
+        
+        return $marked;
     }
 
     /**
@@ -123,12 +320,39 @@ class Family_Media_Manager_Media_Library {
         global $wpdb;
         
         $table = $wpdb->prefix . 'family_media';
-        
-        // Also delete sharing permissions
         $sharing_table = $wpdb->prefix . 'family_sharing';
-        $wpdb->delete($sharing_table, array('media_id' => $media_id));
         
-        return $wpdb->delete($table, array('id' => $media_id));
+        $audience = array();
+        
+        $result = Family_Media_Manager_Stats::transaction(function() use ($wpdb, $table, $sharing_table, $media_id, &$audience) {
+            // Read under a lock, so a concurrent move or delete can't
+            // change what is uncounted
+            $media = self::get_media_by_id($media_id, true);
+            
+            if (!$media) {
+                return false;
+            }
+            
+            // Whose cached responses include it, before the shares go
+            $audience = Family_Media_Manager_Sharing::get_audience($media->id);
+            
+            // Also delete sharing permissions
+            $wpdb->delete($sharing_table, array('media_id' => $media->id));
+            
+            $result = $wpdb->delete($table, array('id' => $media->id));
+            
+            if ($result) {
+                Family_Media_Manager_Stats::media_removed($media);
+            }
+            
+            return $result;
+        });
+        
+        if ($result) {
+            Family_Media_Manager_Response_Cache::invalidate_users($audience);
+        }
+        
+        return $result;
     }
 
     /**
@@ -0,0 +1,199 @@
+<?php
+/**
+ * Cache for REST API listing responses
+ *
+ * Responses are stored per user and query in transients (the object cache
+ * when one is installed). Every entry's key includes generation numbers:
+ * a site-wide one, one for the requesting user, and one per album for
+ * album responses. A change bumps only the scopes it affects (e.g. the
+ * owner of a photo and the users it is shared with), which retires just
+ * their cached responses; old entries simply expire.
+ */
+class Family_Media_Manager_Response_Cache {
+
+    /**
+     * Option holding the current generation and when it changed
+     */
+    const STATE_OPTION = 'family_media_manager_cache_state';
+
+    /**
+     * How long a cached response is kept, in seconds
+     */
+    private static $ttl = 3600;
+
+    /**
+     * Current generation and modified time
+     *
+     * With no $scope this is the site-wide state; scopes ('user_5',
+     * 'album_12') each have their own option, not autoloaded.
+     */
+    public static function get_state($scope = null) {
+        $option = self::state_option($scope);
+        $state = get_option($option);
+
+        if (!is_array($state)) {
+            $state = array(
+                'generation' => 1,
+                'modified'   => time()
+            );
+            add_option($option, $state, '', $scope ? 'no' : 'yes');
+        }
+
+        return $state;
+    }
+
+    /**
+     * Retire cached responses
+     *
+     * With no argument every cached response is retired (thumbnail
+     * regeneration, counter rebuilds); otherwise only those of the given
+     * scopes.
+     */
+    public static function invalidate($scopes = null) {
+        $scopes = $scopes === null ? array(null) : array_unique((array) $scopes);
+
+        foreach ($scopes as $scope) {
+            $state = self::get_state($scope);
+
+            update_option(self::state_option($scope), array(
+                'generation' => $state['generation'] + 1,
+                'modified'   => time()
+            ));
+        }
+    }
+
+    /**
+     * Retire the cached responses of these users
+     */
+    public static function invalidate_users($user_ids) {
+        $scopes = array();
+        foreach (array_filter(array_map('intval', (array) $user_ids)) as $user_id) {
+            $scopes[] = 'user_' . $user_id;
+        }
+
+        if ($scopes) {
+            self::invalidate($scopes);
+        }
+    }
+
+    /**
+     * Retire the cached responses of everyone who can see these media items
+     */
+    public static function invalidate_media($media_ids) {
+        self::invalidate_users(Family_Media_Manager_Sharing::get_audience($media_ids));
+    }
+
+    /**
+     * Retire every user's cached responses for these albums
+     */
+    public static function invalidate_albums($album_ids) {
+        $scopes = array();
+        foreach (array_filter(array_map('intval', (array) $album_ids)) as $album_id) {
+            $scopes[] = 'album_' . $album_id;
+        }
+
+        if ($scopes) {
+            self::invalidate($scopes);
+        }
+    }
+
+    /**
+     * Serve a cached response, or build and cache it
+     *
+     * $build is called on a miss and returns a WP_REST_Response or
+     * WP_Error; only 200 responses are cached. The response depends on the
+     * site-wide and current user's generations plus any extra $scopes.
+     * Responses carry an ETag and Last-Modified, and a matching
+     * conditional request gets a 304 without touching the cache or the
+     * database.
+     */
+    public static function remember($request, $route, $build, $scopes = array()) {
+        $user_id = get_current_user_id();
+        $scopes = array_merge(array(null, 'user_' . $user_id), $scopes);
+
+        $generations = array();
+        $modified = 0;
+        foreach ($scopes as $scope) {
+            $state = self::get_state($scope);
+            $generations[] = $state['generation'];
+            $modified = max($modified, $state['modified']);
+        }
+
+        $params = $request->get_query_params();
+        ksort($params);
+
+        $key = md5(wp_json_encode(array(
+            $user_id,
+            $route,
+            $params,
+            $generations
+        )));
+        $etag = '"' . $key . '"';
+
+        if (self::is_not_modified($request, $etag, $modified)) {
+            $response = new WP_REST_Response(null, 304);
+        } else {
+            $data = get_transient('fmm_response_' . $key);
+
+            if ($data === false) {
+                $response = call_user_func($build);
+
+                if (is_wp_error($response) || $response->get_status() !== 200) {
+                    return $response;
+                }
+
+                set_transient('fmm_response_' . $key, $response->get_data(), self::$ttl);
+            } else {
+                $response = new WP_REST_Response($data, 200);
+            }
+        }
+
+        $response->header('ETag', $etag);
+        $response->header('Last-Modified', gmdate('D, d M Y H:i:s', $modified) . ' GMT');
+        $response->header('Cache-Control', 'private, no-cache');
+
+        return $response;
+    }
+
+    /**
+     * Let browsers on another origin read the validators
+     *
+     * Filters rest_exposed_cors_headers, for when the app isn't served from
+     * the WordPress site's origin.
+     */
+    public static function expose_cors_headers($headers) {
+        return array_values(array_unique(array_merge($headers, array('ETag', 'Last-Modified'))));
+    }
+
+    /**
+     * Let browsers on another origin send conditional requests
+     *
+     * Filters rest_allowed_cors_headers.
+     */
+    public static function allow_cors_headers($headers) {
+        return array_values(array_unique(array_merge($headers, array('If-None-Match', 'If-Modified-Since'))));
+    }
+
+    /**
+     * Option name holding a scope's state
+     */
+    private static function state_option($scope) {
+        return $scope ? self::STATE_OPTION . '_' . $scope : self::STATE_OPTION;
+    }
+
+    /**
+     * Check the request's If-None-Match / If-Modified-Since headers
+     */
+    private static function is_not_modified($request, $etag, $modified) {
+        $if_none_match = $request->get_header('if_none_match');
+
+        if ($if_none_match) {
+            $tags = array_map('trim', explode(',', $if_none_match));
+            return in_array($etag, $tags, true) || in_array('W/' . $etag, $tags, true);
+        }
+
+        $if_modified_since = $request->get_header('if_modified_since');
+
+        return $if_modified_since && strtotime($if_modified_since) >= $modified;
+    }
+}
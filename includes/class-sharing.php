@@ -4,6 +4,11 @@
  */
 class Family_Media_Manager_Sharing {
 
+    /**
+     * Rows per multi-row INSERT, to stay well under max_allowed_packet
+     */
+    private static $insert_batch_size = 500;
+
     /**
      * Share media with a user
      */
@@ -30,6 +35,10 @@ class Family_Media_Manager_Sharing {
             'shared_date'          => current_time('mysql')
         ));
         
+        if ($result) {
+            Family_Media_Manager_Response_Cache::invalidate_media($media_id);
+        }
+        
         return $result !== false;
     }
 
@@ -37,15 +46,79 @@ class Family_Media_Manager_Sharing {
      * Share media with multiple users
      */
     public static function share_with_multiple($media_id, $user_ids, $can_download = true) {
-        $results = array();
+        global $wpdb;
+        
+        $table = $wpdb->prefix . 'family_sharing';
+        $user_ids = array_unique(array_map('intval', $user_ids));
+        
+        if (empty($user_ids)) {
+            return array();
+        }
+        
+        $placeholders = implode(',', array_fill(0, count($user_ids), '%d'));
+        $existing = $wpdb->get_col($wpdb->prepare(
+            "SELECT shared_with_user_id FROM $table 
+             WHERE media_id = %d AND shared_with_user_id IN ($placeholders)",
+            array_merge(array($media_id), $user_ids)
+        ));
         
+        self::share_media_bulk(array($media_id), $user_ids, $can_download);
+        
+        $results = array();
         foreach ($user_ids as $user_id) {
-            $results[$user_id] = self::share_media($media_id, $user_id, $can_download);
+            $results[$user_id] = !in_array($user_id, array_map('intval', $existing), true);
         }
         
         return $results;
     }
 
+    /**
+     * Share every media item with every user
+     *
+     * Uses multi-row INSERT IGNORE statements, so existing shares are left
+     * as they are. Returns the number of new shares.
+     */
+    public static function share_media_bulk($media_ids, $user_ids, $can_download = true) {
+        global $wpdb;
+        
+        $table = $wpdb->prefix . 'family_sharing';
+        $media_ids = array_unique(array_map('intval', $media_ids));
+        $user_ids = array_unique(array_map('intval', $user_ids));
+        $shared_date = current_time('mysql');
+        
+        $rows = array();
+        foreach ($media_ids as $media_id) {
+            foreach ($user_ids as $user_id) {
+                $rows[] = $wpdb->prepare(
+                    '(%d, %d, %d, %s)',
+                    $media_id,
+                    $user_id,
+                    $can_download ? 1 : 0,
+                    $shared_date
+                );
+            }
+        }
+        
+        $inserted = 0;
+        
+        foreach (array_chunk($rows, self::$insert_batch_size) as $batch) {
+            $result = $wpdb->query(
+                "INSERT IGNORE INTO $table (media_id, shared_with_user_id, can_download, shared_date) 
+                 VALUES " . implode(', ', $batch)
+            );
+            
+            if ($result !== false) {
+                $inserted += $result;
+            }
+        }
+        
+        if ($inserted) {
+            Family_Media_Manager_Response_Cache::invalidate_media($media_ids);
+        }
+        
+        return $inserted;
+    }
+
     /**
      * Unshare media with a user
      */
@@ -54,10 +127,19 @@ class Family_Media_Manager_Sharing {
         
         $table = $wpdb->prefix . 'family_sharing';
         
-        return $wpdb->delete($table, array(
+        $result = $wpdb->delete($table, array(
             'media_id'            => $media_id,
             'shared_with_user_id' => $user_id
         ));
+        
+        if ($result) {
+            // The user no longer sees it, but their cached responses still do
+            Family_Media_Manager_Response_Cache::invalidate_users(
+                array_merge(self::get_audience($media_id), array($user_id))
+            );
+        }
+        
+        return $result;
     }
 
     /**
@@ -74,6 +156,33 @@ class Family_Media_Manager_Sharing {
         ));
     }
 
+    /**
+     * Users who can see any of the given media items: their owners and
+     * everyone they are shared with
+     */
+    public static function get_audience($media_ids) {
+        global $wpdb;
+        
+        $media_ids = array_unique(array_map('intval', (array) $media_ids));
+        
+        if (empty($media_ids)) {
+            return array();
+        }
+        
+        $media_table = $wpdb->prefix . 'family_media';
+        $table = $wpdb->prefix . 'family_sharing';
+        $placeholders = implode(',', array_fill(0, count($media_ids), '%d'));
+        
+        $user_ids = $wpdb->get_col($wpdb->prepare(
+            "SELECT owner_id FROM $media_table WHERE id IN ($placeholders)
+             UNION
+             SELECT shared_with_user_id FROM $table WHERE media_id IN ($placeholders)",
+            array_merge($media_ids, $media_ids)
+        ));
+        
+        return array_map('intval', $user_ids);
+    }
+
     /**
      * Check if media is shared with user
      */
@@ -110,6 +219,57 @@ class Family_Media_Manager_Sharing {
         return self::is_shared_with($media_id, $user_id);
     }
 
+    /**
+     * Number of users each of the given media items is shared with, in one
+     * query. Returns array(media_id => count), with 0 for unshared items.
+     */
+    public static function get_share_counts($media_ids) {
+        global $wpdb;
+        
+        $media_ids = array_unique(array_map('intval', $media_ids));
+        
+        if (empty($media_ids)) {
+            return array();
+        }
+        
+        $table = $wpdb->prefix . 'family_sharing';
+        $placeholders = implode(',', array_fill(0, count($media_ids), '%d'));
+        
+        $rows = $wpdb->get_results($wpdb->prepare(
+            "SELECT media_id, COUNT(*) AS total 
+             FROM $table
+             WHERE media_id IN ($placeholders)
+             GROUP BY media_id",
+            $media_ids
+        ));
+        
+        $counts = array_fill_keys($media_ids, 0);
+        foreach ($rows as $row) {
+            $counts[(int) $row->media_id] = (int) $row->total;
+        }
+        
+        return $counts;
+    }
+
+    /**
+     * SQL condition matching media a user can access (owner or shared),
+     * for a query that names the media table $alias
+     */
+    public static function access_clause($user_id, $alias = 'm') {
+        global $wpdb;
+        
+        $sharing_table = $wpdb->prefix . 'family_sharing';
+        
+        return $wpdb->prepare(
+            "($alias.owner_id = %d OR EXISTS (
+                SELECT 1 FROM $sharing_table s
+                WHERE s.media_id = $alias.id AND s.shared_with_user_id = %d
+            ))",
+            $user_id,
+            $user_id
+        );
+    }
+
     /**
      * Share entire album with users
      */
@@ -124,13 +284,7 @@ class Family_Media_Manager_Sharing {
             $album_id
         ));
         
-        $results = array();
-        
-        foreach ($media_items as $media_id) {
-            foreach ($user_ids as $user_id) {
-                self::share_media($media_id, $user_id, $can_download);
-            }
-        }
+        self::share_media_bulk($media_items, $user_ids, $can_download);
         
         return true;
     }
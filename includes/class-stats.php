@@ -0,0 +1,286 @@
+<?php
+/**
+ * Gallery statistics
+ *
+ * Album photo counts and last photo dates are stored on the album rows, and
+ * site-wide media totals in the family_stats table. The media library, album
+ * and upload queue classes update them in the same transaction as the change
+ * itself, so listing albums or opening the dashboard never has to count
+ * media. Only "ready" items are counted: a queued upload is counted when the
+ * queue marks it ready, and one that fails never is. rebuild() and verify()
+ * recount everything if the counters ever drift.
+ */
+class Family_Media_Manager_Stats {
+
+    /**
+     * Totals kept in the family_stats table
+     */
+    private static $totals = array('media', 'photos', 'videos');
+
+    /**
+     * Run $callback inside a database transaction
+     *
+     * The transaction is committed if $callback returns a truthy value and
+     * rolled back otherwise. Returns the callback's value.
+     */
+    public static function transaction($callback) {
+        global $wpdb;
+
+        $wpdb->query('START TRANSACTION');
+
+        $result = call_user_func($callback);
+
+        $wpdb->query($result ? 'COMMIT' : 'ROLLBACK');
+
+        return $result;
+    }
+
+    /**
+     * Count a media item that has become ready
+     */
+    public static function media_added($media) {
+        self::adjust_totals($media->file_type, 1);
+
+        if ($media->album_id) {
+            self::album_added($media->album_id, $media->upload_date);
+        }
+    }
+
+    /**
+     * Uncount a deleted media item (if it was counted)
+     */
+    public static function media_removed($media) {
+        if ($media->status !== 'ready') {
+            return;
+        }
+
+        self::adjust_totals($media->file_type, -1);
+
+        if ($media->album_id) {
+            self::album_removed($media->album_id, $media->upload_date);
+        }
+    }
+
+    /**
+     * Move a media item's count from one album to another
+     */
+    public static function media_moved($media, $new_album_id) {
+        if ($media->status !== 'ready' || $media->album_id == $new_album_id) {
+            return;
+        }
+
+        if ($media->album_id) {
+            self::album_removed($media->album_id, $media->upload_date);
+        }
+
+        if ($new_album_id) {
+            self::album_added($new_album_id, $media->upload_date);
+        }
+    }
+
+    /**
+     * Site-wide totals: array('media' => n, 'photos' => n, 'videos' => n)
+     */
+    public static function get_totals() {
+        global $wpdb;
+
+        $table = $wpdb->prefix . 'family_stats';
+        $rows = $wpdb->get_results("SELECT name, value FROM $table", OBJECT_K);
+
+        $totals = array();
+        foreach (self::$totals as $name) {
+            $totals[$name] = isset($rows[$name]) ? (int) $rows[$name]->value : 0;
+        }
+
+        return $totals;
+    }
+
+    /**
+     * Recount every counter from the media table
+     *
+     * Returns the drift that was corrected, in the same shape as verify().
+     */
+    public static function rebuild() {
+        global $wpdb;
+
+        $drift = self::verify();
+
+        $albums_table = $wpdb->prefix . 'family_albums';
+        $media_table = $wpdb->prefix . 'family_media';
+        $stats_table = $wpdb->prefix . 'family_stats';
+
+        self::transaction(function() use ($wpdb, $albums_table, $media_table, $stats_table) {
+            $wpdb->query(
+                "UPDATE $albums_table a
+                 LEFT JOIN (
+                    SELECT album_id, COUNT(*) AS photo_count, MAX(upload_date) AS last_photo_date
+                    FROM $media_table
+                    WHERE album_id IS NOT NULL AND status = 'ready'
+                    GROUP BY album_id
+                 ) m ON m.album_id = a.id
+                 SET a.photo_count = COALESCE(m.photo_count, 0),
+                     a.last_photo_date = m.last_photo_date"
+            );
+
+            foreach (self::count_totals() as $name => $value) {
+                $wpdb->query($wpdb->prepare(
+                    "INSERT INTO $stats_table (name, value) VALUES (%s, %d)
+                     ON DUPLICATE KEY UPDATE value = VALUES(value)",
+                    $name,
+                    $value
+                ));
+            }
+
+            return true;
+        });
+
+        return $drift;
+    }
+
+    /**
+     * Compare the stored counters with a fresh count
+     *
+     * Returns a list of array('counter' => ..., 'stored' => ..., 'actual' => ...)
+     * for every counter that is wrong; empty when all is well.
+     */
+    public static function verify() {
+        global $wpdb;
+
+        $albums_table = $wpdb->prefix . 'family_albums';
+        $media_table = $wpdb->prefix . 'family_media';
+        $drift = array();
+
+        $stored = self::get_totals();
+        foreach (self::count_totals() as $name => $actual) {
+            if ($stored[$name] !== $actual) {
+                $drift[] = array(
+                    'counter' => $name,
+                    'stored'  => $stored[$name],
+                    'actual'  => $actual
+                );
+            }
+        }
+
+        $albums = $wpdb->get_results(
+            "SELECT a.id, a.photo_count, a.last_photo_date,
+                    COUNT(m.id) AS actual_count, MAX(m.upload_date) AS actual_last_photo_date
+             FROM $albums_table a
+             LEFT JOIN $media_table m ON m.album_id = a.id AND m.status = 'ready'
+             GROUP BY a.id
+             HAVING a.photo_count <> actual_count
+                 OR NOT (a.last_photo_date <=> actual_last_photo_date)"
+        );
+
+        foreach ($albums as $album) {
+            $drift[] = array(
+                'counter' => "album {$album->id}",
+                'stored'  => "{$album->photo_count} / {$album->last_photo_date}",
+                'actual'  => "{$album->actual_count} / {$album->actual_last_photo_date}"
+            );
+        }
+
+        return $drift;
+    }
+
+    /**
+     * Count ready media by type
+     */
+    private static function count_totals() {
+        global $wpdb;
+
+        $media_table = $wpdb->prefix . 'family_media';
+        $counts = $wpdb->get_results(
+            "SELECT file_type, COUNT(*) AS total FROM $media_table WHERE status = 'ready' GROUP BY file_type",
+            OBJECT_K
+        );
+
+        $photos = isset($counts['photo']) ? (int) $counts['photo']->total : 0;
+        $videos = isset($counts['video']) ? (int) $counts['video']->total : 0;
+        $media = 0;
+        foreach ($counts as $count) {
+            $media += (int) $count->total;
+        }
+
+        return array(
+            'media'  => $media,
+            'photos' => $photos,
+            'videos' => $videos
+        );
+    }
+
+    /**
+     * Add $delta to the media total and the total for $file_type
+     */
+    private static function adjust_totals($file_type, $delta) {
+        global $wpdb;
+
+        $table = $wpdb->prefix . 'family_stats';
+        $names = array('media');
+
+        if ($file_type === 'photo') {
+            $names[] = 'photos';
+        } elseif ($file_type === 'video') {
+            $names[] = 'videos';
+        }
+
+        foreach ($names as $name) {
+            $wpdb->query($wpdb->prepare(
+                "INSERT INTO $table (name, value) VALUES (%s, GREATEST(%d, 0))
+                 ON DUPLICATE KEY UPDATE value = GREATEST(value + %d, 0)",
+                $name,
+                $delta,
+                $delta
+            ));
+        }
+    }
+
+    /**
+     * Count a media item into an album
+     */
+    private static function album_added($album_id, $upload_date) {
+        global $wpdb;
+
+        $table = $wpdb->prefix . 'family_albums';
+
+        $wpdb->query($wpdb->prepare(
+            "UPDATE $table
+             SET photo_count = photo_count + 1,
+                 last_photo_date = GREATEST(COALESCE(last_photo_date, %s), %s)
+             WHERE id = %d",
+            $upload_date,
+            $upload_date,
+            $album_id
+        ));
+    }
+
+    /**
+     * Count a media item out of an album
+     *
+     * Only when the item was the album's newest does the last photo date
+     * need looking up again (via the album_upload_date index).
+     */
+    private static function album_removed($album_id, $upload_date) {
+        global $wpdb;
+
+        $table = $wpdb->prefix . 'family_albums';
+        $media_table = $wpdb->prefix . 'family_media';
+
+        $wpdb->query($wpdb->prepare(
+            "UPDATE $table
+             SET photo_count = GREATEST(CAST(photo_count AS SIGNED) - 1, 0)
+             WHERE id = %d",
+            $album_id
+        ));
+
+        $wpdb->query($wpdb->prepare(
+            "UPDATE $table
+             SET last_photo_date = (
+                SELECT MAX(upload_date) FROM $media_table WHERE album_id = %d AND status = 'ready'
+             )
+             WHERE id = %d AND (last_photo_date IS NULL OR last_photo_date <= %s)",
+            $album_id,
+            $album_id,
+            $upload_date
+        ));
+    }
+}
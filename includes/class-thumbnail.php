@@ -4,30 +4,257 @@
  */
 class Family_Media_Manager_Thumbnail {
 
+    /**
+     * FFmpeg path, looked up once per request ('' = not available)
+     */
+    private static $ffmpeg_path = null;
+
+    /**
+     * URL of the thumbnail folder, looked up once per request
+     */
+    private static $base_url = null;
+
+    /**
+     * Widths of the responsive variants, as multiples of the thumbnail size
+     */
+    private static $variant_scales = array(0.5, 1, 1.5, 2);
+
+    /**
+     * Formats each variant is saved in (WebP only if the server supports it)
+     */
+    private static $variant_formats = array(
+        'image/webp' => 'webp',
+        'image/jpeg' => 'jpg'
+    );
+
     /**
      * Generate thumbnail for image or video
+     *
+     * Thumbnails are named after the SHA-256 of the source file, so
+     * duplicate uploads share one thumbnail and thumbnails made ahead of
+     * time by fmm-thumbnails.py are picked up without any work here.
      */
-    public static function generate($file_path, $mime_type) {
-        $thumbnail_size = get_option('family_media_manager_thumbnail_size', 300);
+    public static function generate($file_path, $mime_type, $hash = null) {
+        $thumbnail_size = (int) get_option('family_media_manager_thumbnail_size', 300);
         
         // Create thumbnails directory if it doesn't exist
-        $upload_dir = wp_upload_dir();
-        $thumbnail_dir = $upload_dir['basedir'] . '/family-gallery';
+        $thumbnail_dir = self::get_thumbnail_dir();
         
         if (!file_exists($thumbnail_dir)) {
             wp_mkdir_p($thumbnail_dir);
         }
 
-        $filename = uniqid('thumb_') . '.jpg';
-        $thumbnail_path = $thumbnail_dir . '/' . $filename;
+        if (!$hash) {
+            $hash = hash_file('sha256', $file_path);
+        }
+        if (!$hash) {
+            return null;
+        }
+
+        $thumbnail_path = $thumbnail_dir . '/' . $hash . '.jpg';
+
+        if (self::is_current($thumbnail_path, $thumbnail_size)) {
+            return $thumbnail_path;
+        }
+
+        // Replacing one changes URLs (?v=, srcset) in other items' cached responses
+        $regenerating = file_exists($thumbnail_path);
 
         if (strpos($mime_type, 'image') !== false) {
-            return self::generate_image_thumbnail($file_path, $thumbnail_path, $thumbnail_size);
+            $result = self::generate_image_thumbnail($file_path, $thumbnail_path, $thumbnail_size);
+            $variant_source = $file_path;
         } elseif (strpos($mime_type, 'video') !== false) {
-            return self::generate_video_thumbnail($file_path, $thumbnail_path, $thumbnail_size);
+            $result = self::generate_video_thumbnail($file_path, $thumbnail_path, $thumbnail_size);
+            $variant_source = $thumbnail_path;
+        } else {
+            return null;
         }
 
-        return null;
+        if ($result) {
+            self::generate_variants($variant_source, $thumbnail_path, $thumbnail_size);
+            
+            if ($regenerating) {
+                Family_Media_Manager_Response_Cache::invalidate();
+            }
+        }
+
+        return $result;
+    }
+
+    /**
+     * Folder the thumbnails are stored in
+     */
+    public static function get_thumbnail_dir() {
+        $upload_dir = wp_upload_dir();
+        return $upload_dir['basedir'] . '/family-gallery';
+    }
+
+    /**
+     * URL of the thumbnail folder, with a trailing slash
+     */
+    public static function get_base_url() {
+        if (self::$base_url === null) {
+            self::$base_url = wp_upload_dir()['baseurl'] . '/family-gallery/';
+        }
+
+        return self::$base_url;
+    }
+
+    /**
+     * Public URL of a thumbnail
+     *
+     * The file name comes from the source file's hash, and ?v= changes
+     * whenever the thumbnail is regenerated (e.g. at a new size), so the
+     * URL always points at the same bytes and can be cached forever.
+     * Variants need no ?v= as their names include the width.
+     */
+    public static function get_thumbnail_url($thumbnail_path) {
+        if (!$thumbnail_path) {
+            return '';
+        }
+
+        $url = self::get_base_url() . basename($thumbnail_path);
+        $modified = @filemtime($thumbnail_path);
+
+        return $modified ? $url . '?v=' . base_convert($modified, 10, 36) : $url;
+    }
+
+    /**
+     * Check whether an existing thumbnail and its variants were made at the current size
+     */
+    private static function is_current($thumbnail_path, $size) {
+        if (!file_exists($thumbnail_path)) {
+            return false;
+        }
+
+        $dimensions = @getimagesize($thumbnail_path);
+        if (!$dimensions || $dimensions[0] != $size || $dimensions[1] != $size) {
+            return false;
+        }
+
+        $index = self::read_index($thumbnail_path);
+        return $index && isset($index['size']) && (int) $index['size'] === $size;
+    }
+
+    /**
+     * Save the thumbnail at several widths and formats for srcset
+     *
+     * The variants sit next to the thumbnail as <hash>-<width>.<ext> and
+     * are listed in a <hash>.json sidecar (the same format fmm-thumbnails.py
+     * writes). Widths the source is too small for are skipped.
+     */
+    private static function generate_variants($source_path, $thumbnail_path, $size) {
+        $image = wp_get_image_editor($source_path);
+
+        if (is_wp_error($image)) {
+            return false;
+        }
+
+        // One centred square crop of the source, shared by every width
+        $source_size = $image->get_size();
+        $side = min($source_size['width'], $source_size['height']);
+        $crop_x = (int) floor(($source_size['width'] - $side) / 2);
+        $crop_y = (int) floor(($source_size['height'] - $side) / 2);
+
+        $base = substr($thumbnail_path, 0, -strlen('.jpg'));
+        $variants = array();
+        $widths = array();
+
+        foreach (self::$variant_scales as $scale) {
+            $width = (int) round($size * $scale);
+
+            // Never scale up past the source
+            if ($width <= $side) {
+                $widths[] = $width;
+            }
+        }
+
+        // Each width is resampled from the original, not from the previous
+        // variant, so every one gets a single pass of scaling
+        foreach ($widths as $i => $width) {
+            if ($i > 0) {
+                $image = wp_get_image_editor($source_path);
+
+                if (is_wp_error($image)) {
+                    break;
+                }
+            }
+
+            if (is_wp_error($image->crop($crop_x, $crop_y, $side, $side, $width, $width))) {
+                continue;
+            }
+
+            foreach (self::$variant_formats as $mime => $extension) {
+                if (!wp_image_editor_supports(array('mime_type' => $mime))) {
+                    continue;
+                }
+
+                $variant_path = $base . '-' . $width . '.' . $extension;
+                $result = $image->save($variant_path, $mime);
+
+                if (!is_wp_error($result)) {
+                    $variants[] = array(
+                        'file'  => basename($variant_path),
+                        'width' => $width,
+                        'type'  => $mime
+                    );
+                }
+            }
+        }
+
+        usort($variants, function($a, $b) {
+            return $a['width'] - $b['width'];
+        });
+
+        // Remove variants from an earlier size that this set doesn't have
+        $previous = self::read_index($thumbnail_path);
+        if ($previous && !empty($previous['variants'])) {
+            $current = wp_list_pluck($variants, 'file');
+            foreach ($previous['variants'] as $variant) {
+                if (!in_array($variant['file'], $current, true)) {
+                    @unlink(dirname($thumbnail_path) . '/' . basename($variant['file']));
+                }
+            }
+        }
+
+        return false !== file_put_contents($base . '.json', wp_json_encode(array(
+            'size'     => $size,
+            'variants' => $variants
+        )));
+    }
+
+    /**
+     * Read a thumbnail's sidecar index, or null if it has none
+     */
+    public static function read_index($thumbnail_path) {
+        $index_path = substr($thumbnail_path, 0, -strlen('.jpg')) . '.json';
+
+        if (!file_exists($index_path)) {
+            return null;
+        }
+
+        $index = json_decode(file_get_contents($index_path), true);
+        return is_array($index) ? $index : null;
+    }
+
+    /**
+     * Responsive variants of a thumbnail, grouped by format
+     *
+     * Returns array('image/webp' => array(width => filename, ...), ...).
+     */
+    public static function get_variants($thumbnail_path) {
+        $index = $thumbnail_path ? self::read_index($thumbnail_path) : null;
+        $variants = array();
+
+        if (!$index || empty($index['variants'])) {
+            return $variants;
+        }
+
+        foreach ($index['variants'] as $variant) {
+            $variants[$variant['type']][(int) $variant['width']] = $variant['file'];
+        }
+
+        return $variants;
     }
 
     /**
@@ -64,7 +291,7 @@ class Family_Media_Manager_Thumbnail {
         }
 
         // Try to use FFmpeg to extract frame
-        $ffmpeg_path = exec('which ffmpeg');
+        $ffmpeg_path = self::get_ffmpeg_path();
         
         if (empty($ffmpeg_path)) {
             return self::create_default_video_thumbnail($dest_path, $size);
@@ -90,6 +317,24 @@ class Family_Media_Manager_Thumbnail {
         return self::create_default_video_thumbnail($dest_path, $size);
     }
 
+    /**
+     * Find FFmpeg, remembering the answer for a day
+     */
+    private static function get_ffmpeg_path() {
+        if (self::$ffmpeg_path === null) {
+            $cached = get_transient('family_media_manager_ffmpeg_path');
+
+            if ($cached === false) {
+                $cached = (string) exec('which ffmpeg');
+                set_transient('family_media_manager_ffmpeg_path', $cached, DAY_IN_SECONDS);
+            }
+
+            self::$ffmpeg_path = $cached;
+        }
+
+        return self::$ffmpeg_path;
+    }
+
     /**
      * Create default video thumbnail (play icon)
      */
@@ -124,11 +369,35 @@ class Family_Media_Manager_Thumbnail {
 
     /**
      * Delete thumbnail file
+     *
+     * Thumbnails are shared between duplicate uploads, so the file is only
+     * removed once no media item refers to it any more. Call this after
+     * the media item itself has been deleted.
      */
     public static function delete($thumbnail_path) {
-        if ($thumbnail_path && file_exists($thumbnail_path)) {
-            return @unlink($thumbnail_path);
+        global $wpdb;
+
+        if (!$thumbnail_path || !file_exists($thumbnail_path)) {
+            return false;
         }
-        return false;
+
+        $table = $wpdb->prefix . 'family_media';
+        $references = (int) $wpdb->get_var($wpdb->prepare(
+            "SELECT COUNT(*) FROM $table WHERE thumbnail_path = %s",
+            $thumbnail_path
+        ));
+
+        if ($references > 0) {
+            return false;
+        }
+
+        foreach (self::get_variants($thumbnail_path) as $files) {
+            foreach ($files as $file) {
+                @unlink(dirname($thumbnail_path) . '/' . $file);
+            }
+        }
+        @unlink(substr($thumbnail_path, 0, -strlen('.jpg')) . '.json');
+
+        return @unlink($thumbnail_path);
     }
 }
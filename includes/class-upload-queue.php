@@ -0,0 +1,239 @@
+<?php
+/**
+ * Background upload queue
+ *
+ * Uploads are saved to a private folder and recorded as "pending" so the
+ * REST request can answer straight away. A WP-Cron worker then sends them
+ * to cloud storage, builds thumbnails and marks them "ready", retrying
+ * failures a few times before marking them "failed".
+ */
+class Family_Media_Manager_Upload_Queue {
+
+    /**
+     * Cron hook that runs the worker
+     */
+    const HOOK = 'family_media_manager_process_uploads';
+
+    /**
+     * How many times an item is tried before it is marked failed
+     */
+    private static $max_attempts = 5;
+
+    /**
+     * Seconds a single worker run may spend before handing over to the next
+     */
+    private static $time_limit = 50;
+
+    /**
+     * Folder queued files wait in
+     */
+    public static function get_queue_dir() {
+        $upload_dir = wp_upload_dir();
+        $queue_dir = $upload_dir['basedir'] . '/family-gallery-queue';
+
+        if (!file_exists($queue_dir)) {
+            wp_mkdir_p($queue_dir);
+
+            // Originals must not be reachable from the web
+            file_put_contents($queue_dir . '/.htaccess', "Require all denied\nDeny from all\n");
+            file_put_contents($queue_dir . '/index.php', "<?php\n// Silence is golden.\n");
+        }
+
+        return $queue_dir;
+    }
+
+    /**
+     * Store an upload and record it as pending
+     */
+    public static function enqueue($file, $user_id, $content_hash, $caption = '', $album_id = null) {
+        $extension = strtolower(pathinfo($file['name'], PATHINFO_EXTENSION));
+        $local_path = self::get_queue_dir() . '/' . ($content_hash ?: wp_generate_uuid4()) . ($extension ? '.' . $extension : '');
+
+        $moved = is_uploaded_file($file['tmp_name'])
+            ? move_uploaded_file($file['tmp_name'], $local_path)
+            : rename($file['tmp_name'], $local_path);
+
+        if (!$moved) {
+            return array(
+                'success' => false,
+                'error'   => 'Could not store upload for processing'
+            );
+        }
+
+        $media_id = Family_Media_Manager_Media_Library::add_media(array(
+            'owner_id'       => $user_id,
+            'cloud_provider' => 'google_drive',
+            'cloud_file_id'  => '',
+            'filename'       => $file['name'],
+            'file_type'      => strpos($file['type'], 'image') !== false ? 'photo' : 'video',
+            'file_size'      => $file['size'],
+            'content_hash'   => $content_hash ?: null,
+            'album_id'       => $album_id,
+            'caption'        => sanitize_text_field($caption),
+            'status'         => 'pending',
+            'local_path'     => $local_path
+        ));
+
+        if (!$media_id) {
+            @unlink($local_path);
+
+            // Another request from the same user stored this file first
+            $existing = $content_hash ? Family_Media_Manager_Media_Library::get_media_by_hash($content_hash, $user_id) : null;
+
+            if ($existing) {
+                return Family_Media_Manager_Uploader::duplicate_result($existing, $caption, $album_id);
+            }
+
+            return array(
+                'success' => false,
+                'error'   => 'Failed to save media to library'
+            );
+        }
+
+        self::schedule();
+
+        return array(
+            'success'       => true,
+            'media_id'      => $media_id,
+            'status'        => 'pending',
+            'thumbnail_url' => ''
+        );
+    }
+
+    /**
+     * Make sure a worker run is coming up
+     */
+    public static function schedule($delay = 0) {
+        if (!wp_next_scheduled(self::HOOK)) {
+            wp_schedule_single_event(time() + $delay, self::HOOK);
+        }
+    }
+
+    /**
+     * Worker: process pending uploads until the queue is empty or time is up
+     */
+    public static function process() {
+        global $wpdb;
+
+        // One worker at a time
+        if (!$wpdb->get_var("SELECT GET_LOCK('fmm_upload_queue', 0)")) {
+            return;
+        }
+
+        $table = $wpdb->prefix . 'family_media';
+        $started = time();
+        $tried = array();
+        $failed = false;
+
+        while (time() - $started < self::$time_limit) {
+            $exclude = $tried ? 'AND id NOT IN (' . implode(',', array_map('intval', $tried)) . ')' : '';
+            $media = $wpdb->get_row(
+                "SELECT * FROM $table WHERE status = 'pending' $exclude ORDER BY id ASC LIMIT 1"
+            );
+
+            if (!$media) {
+                break;
+            }
+
+            $tried[] = $media->id;
+
+            if (!self::process_item($media)) {
+                $failed = true;
+            }
+        }
+
+        $remaining = $wpdb->get_var("SELECT COUNT(*) FROM $table WHERE status = 'pending'");
+
+        $wpdb->query("SELECT RELEASE_LOCK('fmm_upload_queue')");
+
+        // Items that just failed get a minute before they are tried again
+        if ($remaining) {
+            self::schedule($failed ? MINUTE_IN_SECONDS : 0);
+        }
+    }
+
+    /**
+     * Send one queued item to cloud storage and build its thumbnail
+     */
+    private static function process_item($media) {
+        if (!$media->local_path || !file_exists($media->local_path)) {
+            Family_Media_Manager_Media_Library::update_media($media->id, array(
+                'status'     => 'failed',
+                'last_error' => 'Queued file is missing'
+            ));
+            return false;
+        }
+
+        $finfo = finfo_open(FILEINFO_MIME_TYPE);
+        $mime_type = finfo_file($finfo, $media->local_path);
+        finfo_close($finfo);
+
+        $result = Family_Media_Manager_Uploader::process_file(
+            $media->local_path,
+            $media->filename,
+            $mime_type,
+            $media->owner_id,
+            $media->content_hash
+        );
+
+        if (!$result['success']) {
+            $attempts = $media->attempts + 1;
+
+            Family_Media_Manager_Media_Library::update_media($media->id, array(
+                'status'     => $attempts >= self::$max_attempts ? 'failed' : 'pending',
+                'attempts'   => $attempts,
+                'last_error' => substr($result['error'], 0, 255)
+            ));
+            return false;
+        }
+
+        $marked = Family_Media_Manager_Media_Library::mark_ready($media->id, array(
+            'cloud_file_id'  => $result['cloud_file_id'],
+            'thumbnail_path' => $result['thumbnail_path'],
+            'taken_date'     => $result['taken_date'],
+            'local_path'     => null,
+            'attempts'       => $media->attempts + 1,
+            'last_error'     => null
+        ));
+
+        // Deleted while it was being uploaded: don't leave its copy on Drive
+        if (!$marked) {
+            Family_Media_Manager_Uploader::discard_processed($media->owner_id, $result);
+        }
+
+        @unlink($media->local_path);
+
+        return true;
+    }
+
+    /**
+     * Put failed items back in the queue
+     */
+    public static function retry_failed($media_id = null) {
+        global $wpdb;
+
+        $table = $wpdb->prefix . 'family_media';
+        $where = $media_id ? $wpdb->prepare(' AND id = %d', $media_id) : '';
+
+        $count = $wpdb->query("UPDATE $table SET status = 'pending', attempts = 0 WHERE status = 'failed'$where");
+
+        // Pending items aren't listed anywhere, so no cached response changes
+        if ($count) {
+            self::schedule();
+        }
+
+        return $count;
+    }
+
+    /**
+     * Processing status of a media item
+     */
+    public static function get_status($media) {
+        return array(
+            'media_id' => (int) $media->id,
+            'status'   => $media->status,
+            'attempts' => (int) $media->attempts,
+            'error'    => $media->last_error
+        );
+    }
+}
@@ -25,6 +25,12 @@ class Family_Media_Manager_Uploader {
      */
     private static $max_file_size = 104857600;
 
+    /**
+     * Seconds after which a direct upload that never finished (the request
+     * died mid-transfer) no longer blocks uploading the file again
+     */
+    private static $stale_upload_age = 3600;
+
     /**
      * Handle file upload
      */
@@ -40,7 +46,25 @@ class Family_Media_Manager_Uploader {
 
         $user_id = get_current_user_id();
         
-        // Upload to cloud storage
+        // Skip Drive and thumbnail work for a file this user already has
+        $content_hash = hash_file('sha256', $file['tmp_name']);
+        $existing = $content_hash ? Family_Media_Manager_Media_Library::get_media_by_hash($content_hash, $user_id) : null;
+        
+        // A copy that failed (or died mid-upload) is replaced by this one
+        if ($existing && self::is_abandoned($existing)) {
+            Family_Media_Manager_Media_Library::delete_media($existing->id);
+            
+            if ($existing->local_path) {
+                @unlink($existing->local_path);
+            }
+            
+            $existing = null;
+        }
+        
+        if ($existing) {
+            return self::duplicate_result($existing, $caption, $album_id);
+        }
+        
         $cloud = new Family_Media_Manager_Cloud_Storage($user_id);
         
         if (!$cloud->is_connected()) {
@@ -50,7 +74,85 @@ class Family_Media_Manager_Uploader {
             );
         }
 
-        $upload_result = $cloud->upload_file($file['tmp_name'], $file['name']);
+        // Hand the Drive transfer and thumbnails to the background queue
+        if (get_option('family_media_manager_async_uploads', 0)) {
+            return Family_Media_Manager_Upload_Queue::enqueue($file, $user_id, $content_hash, $caption, $album_id);
+        }
+
+        // Claim the row before sending anything to Drive, so a second
+        // request with the same file finds it instead of uploading a copy
+        $media_id = Family_Media_Manager_Media_Library::add_media(array(
+            'owner_id'       => $user_id,
+            'cloud_provider' => 'google_drive',
+            'cloud_file_id'  => '',
+            'filename'       => $file['name'],
+            'file_type'      => strpos($file['type'], 'image') !== false ? 'photo' : 'video',
+            'file_size'      => $file['size'],
+            'content_hash'   => $content_hash ?: null,
+            'album_id'       => $album_id,
+            'caption'        => sanitize_text_field($caption),
+            'status'         => 'uploading'
+        ));
+
+        if (!$media_id) {
+            $existing = $content_hash ? Family_Media_Manager_Media_Library::get_media_by_hash($content_hash, $user_id) : null;
+            
+            if ($existing) {
+                return self::duplicate_result($existing, $caption, $album_id);
+            }
+            
+            return array(
+                'success' => false,
+                'error'   => 'Failed to save media to library'
+            );
+        }
+
+        $processed = self::process_file($file['tmp_name'], $file['name'], $file['type'], $user_id, $content_hash);
+        
+        if (!$processed['success']) {
+            Family_Media_Manager_Media_Library::delete_media($media_id);
+            return $processed;
+        }
+
+        $marked = Family_Media_Manager_Media_Library::mark_ready($media_id, array(
+            'cloud_file_id'  => $processed['cloud_file_id'],
+            'file_type'      => $processed['file_type'],
+            'thumbnail_path' => $processed['thumbnail_path'],
+            'taken_date'     => $processed['taken_date']
+        ), 'uploading');
+
+        if (!$marked) {
+            self::discard_processed($user_id, $processed);
+            
+            return array(
+                'success' => false,
+                'error'   => 'The upload was deleted while it was being processed'
+            );
+        }
+
+        return array(
+            'success'       => true,
+            'media_id'      => $media_id,
+            'status'        => 'ready',
+            'thumbnail_url' => Family_Media_Manager_Thumbnail::get_thumbnail_url($processed['thumbnail_path'])
+        );
+    }
+
+    /**
+     * Send a file to cloud storage and build its thumbnail and metadata
+     *
+     * Shared by direct uploads and the background upload queue. Returns
+     * the columns to store for the media item.
+     */
+    public static function process_file($file_path, $filename, $mime_type, $user_id, $content_hash = null) {
+        // Hashed once here for both the Drive session and the thumbnail name
+        if (!$content_hash) {
+            $content_hash = hash_file('sha256', $file_path);
+        }
+        
+        // Upload to cloud storage
+        $cloud = new Family_Media_Manager_Cloud_Storage($user_id);
+        $upload_result = $cloud->upload_file($file_path, $filename, $content_hash);
         
         if (!$upload_result['success']) {
             return array(
@@ -60,48 +162,89 @@ class Family_Media_Manager_Uploader {
         }
 
         // Generate thumbnail
-        $thumbnail = Family_Media_Manager_Thumbnail::generate($file['tmp_name'], $file['type']);
+        $thumbnail = Family_Media_Manager_Thumbnail::generate($file_path, $mime_type, $content_hash);
 
         // Determine file type
-        $file_type = strpos($file['type'], 'image') !== false ? 'photo' : 'video';
+        $file_type = strpos($mime_type, 'image') !== false ? 'photo' : 'video';
 
         // Extract EXIF date if available
         $taken_date = null;
         if ($file_type === 'photo' && function_exists('exif_read_data')) {
-            $exif = @exif_read_data($file['tmp_name']);
+            $exif = @exif_read_data($file_path);
             if ($exif && isset($exif['DateTimeOriginal'])) {
                 $taken_date = date('Y-m-d H:i:s', strtotime($exif['DateTimeOriginal']));
             }
         }
 
-        // Add to media library
-        $media_id = Family_Media_Manager_Media_Library::add_media(array(
-            'owner_id'       => $user_id,
-            'cloud_provider' => 'google_drive',
+        return array(
+            'success'        => true,
             'cloud_file_id'  => $upload_result['file_id'],
-            'filename'       => $file['name'],
-            'file_type'      => $file_type,
-            'file_size'      => $file['size'],
             'thumbnail_path' => $thumbnail,
-            'taken_date'     => $taken_date,
-            'album_id'       => $album_id,
-            'caption'        => sanitize_text_field($caption)
-        ));
+            'file_type'      => $file_type,
+            'taken_date'     => $taken_date
+        );
+    }
 
-        if (!$media_id) {
-            return array(
-                'success' => false,
-                'error'   => 'Failed to save media to library'
-            );
+    /**
+     * Remove what process_file() made for an item that was deleted while
+     * it was being processed: the cloud copy and the thumbnail (unless
+     * another item uses it)
+     */
+    public static function discard_processed($user_id, $processed) {
+        $cloud = new Family_Media_Manager_Cloud_Storage($user_id);
+        $cloud->delete_file($processed['cloud_file_id']);
+        
+        if ($processed['thumbnail_path']) {
+            Family_Media_Manager_Thumbnail::delete($processed['thumbnail_path']);
+        }
+    }
+
+    /**
+     * Is this earlier copy of an upload one that will never finish?
+     */
+    private static function is_abandoned($media) {
+        if ($media->status === 'failed') {
+            return true;
+        }
+
+        return $media->status === 'uploading' &&
+            strtotime($media->upload_date) < current_time('timestamp') - self::$stale_upload_age;
+    }
+
+    /**
+     * Result for an upload of a file the uploader already has
+     *
+     * The existing item is returned instead of storing a second copy. A
+     * caption or album sent with the upload is applied to it: the caption
+     * if the item has none yet, and the album by moving the item there.
+     */
+    public static function duplicate_result($media, $caption = '', $album_id = null) {
+        $caption = sanitize_text_field($caption);
+
+        if ($caption !== '' && (string) $media->caption === '') {
+            Family_Media_Manager_Media_Library::update_media($media->id, array('caption' => $caption));
+        }
+
+        if ($album_id && $media->album_id != $album_id) {
+            Family_Media_Manager_Albums::add_media_to_album($media->id, $album_id);
         }
 
         return array(
             'success'       => true,
-            'media_id'      => $media_id,
-            'thumbnail_url' => $thumbnail ? wp_get_upload_dir()['baseurl'] . '/family-gallery/' . basename($thumbnail) : ''
+            'media_id'      => (int) $media->id,
+            'duplicate'     => true,
+            'status'        => $media->status,
+            'thumbnail_url' => Family_Media_Manager_Thumbnail::get_thumbnail_url($media->thumbnail_path)
         );
     }
 
+    /**
+     * Maximum file size in bytes
+     */
+    public static function get_max_file_size() {
+        return self::$max_file_size;
+    }
+
     /**
      * Validate uploaded file
      */
@@ -139,22 +282,43 @@ class Family_Media_Manager_Uploader {
 
     /**
      * Handle base64 encoded file upload (for PWA/API)
+     *
+     * Kept for older clients; large files should use the chunked binary
+     * upload (Family_Media_Manager_Chunked_Upload) instead.
      */
     public static function handle_base64_upload($base64_data, $filename, $caption = '', $album_id = null) {
-        // Decode base64
-        $file_data = base64_decode($base64_data);
+        // Line breaks would shift the slices below off 4-character boundaries
+        if (strpbrk($base64_data, " \r\n\t") !== false) {
+            $base64_data = preg_replace('/\s+/', '', $base64_data);
+        }
+
+        // Decode straight into a temporary file, 1MB of input at a time,
+        // rather than holding a second decoded copy in memory
+        $tmp_file = wp_tempnam($filename);
+        $handle = fopen($tmp_file, 'wb');
+        $valid = true;
+        
+        for ($offset = 0; $offset < strlen($base64_data); $offset += 1048576) {
+            $chunk = base64_decode(substr($base64_data, $offset, 1048576), true);
+            
+            if ($chunk === false) {
+                $valid = false;
+                break;
+            }
+            
+            fwrite($handle, $chunk);
+        }
+        fclose($handle);
         
-        if ($file_data === false) {
+        if (!$valid) {
+            @unlink($tmp_file);
+            
             return array(
                 'success' => false,
                 'error'   => 'Invalid base64 data'
             );
         }
 
-        // Create temporary file
-        $tmp_file = wp_tempnam($filename);
-        file_put_contents($tmp_file, $file_data);
-
         // Create file array similar to $_FILES
         $file = array(
             'name'     => $filename,
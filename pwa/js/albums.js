@@ -132,6 +132,8 @@ const Albums = {
             
             // Update gallery with album photos
             Gallery.photos = album.photos;
+            Gallery.nextCursor = null;
+            Gallery.hasMore = false;
             Gallery.renderGallery();
             
             App.showScreen('gallery');
@@ -116,6 +116,10 @@ const Auth = {
     logout() {
         localStorage.removeItem(this.TOKEN_KEY);
         localStorage.removeItem(this.USER_KEY);
+        
+        // Queued photos wait for the next login
+        Outbox.setAuth(null).catch(error => console.warn('[Auth] Outbox unavailable:', error));
+        
         App.showToast('Logged out successfully');
     },
     
@@ -138,6 +142,11 @@ const Auth = {
      */
     setToken(token) {
         localStorage.setItem(this.TOKEN_KEY, token);
+        
+        // Photos queued before (or parked by a rejected login) can go now
+        Outbox.setAuth(this.getAuthHeader())
+            .then(() => Upload.flushOutbox())
+            .catch(error => console.warn('[Auth] Outbox unavailable:', error));
     },
     
     /**
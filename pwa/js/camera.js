@@ -111,37 +111,27 @@ const Camera = {
     /**
      * Capture photo from camera
      */
-    capture() {
+    async capture() {
         const videoElement = document.getElementById('camera-preview');
         
-        // Create canvas to capture frame
-        const canvas = document.createElement('canvas');
-        canvas.width = videoElement.videoWidth;
-        canvas.height = videoElement.videoHeight;
+        // Scaled and encoded for the upload profile, off the main thread
+        const blob = await Resize.captureFrame(videoElement);
         
-        // Draw current video frame to canvas
-        const ctx = canvas.getContext('2d');
-        ctx.drawImage(videoElement, 0, 0);
+        if (!blob) {
+            App.showToast('Failed to capture photo', 'error');
+            return;
+        }
         
-        // Convert canvas to blob
-        canvas.toBlob((blob) => {
-            if (!blob) {
-                App.showToast('Failed to capture photo', 'error');
-                return;
-            }
-            
-            // Store captured photo
-            this.capturedPhoto = blob;
-            
-            // Stop camera
-            this.stop();
-            
-            // Show preview
-            this.showPreview(blob);
-            
-            console.log('[Camera] Photo captured');
-            
-        }, 'image/jpeg', 0.92); // 92% quality
+        // Store captured photo
+        this.capturedPhoto = blob;
+        
+        // Stop camera
+        this.stop();
+        
+        // Show preview
+        this.showPreview(blob);
+        
+        console.log('[Camera] Photo captured');
     },
     
     /**
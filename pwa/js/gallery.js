@@ -5,7 +5,7 @@
 
 const Gallery = {
     photos: [],
-    currentPage: 1,
+    nextCursor: null,
     photosPerPage: 20,
     hasMore: false,
     isLoading: false,
@@ -39,20 +39,48 @@ const Gallery = {
         
         // Swipe gestures for photo viewer
         this.setupSwipeGestures();
+        
+        // Infinite scroll
+        this.setupInfiniteScroll();
+    },
+    
+    /**
+     * Load the next page when the load more section scrolls into view
+     */
+    setupInfiniteScroll() {
+        const loadMoreSection = document.getElementById('load-more-section');
+        
+        if (!loadMoreSection || !('IntersectionObserver' in window)) {
+            return;
+        }
+        
+        const observer = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting) && this.hasMore) {
+                this.loadMorePhotos();
+            }
+        }, { rootMargin: '400px 0px' });
+        
+        observer.observe(loadMoreSection);
     },
     
     /**
      * Load photos from API
+     * Without a cursor this loads the first page, otherwise the page after it
      */
-    async loadPhotos(page = 1) {
+    async loadPhotos(cursor = null) {
         if (this.isLoading) return;
         
         this.isLoading = true;
-        this.currentPage = page;
+        const firstPage = !cursor;
         
         try {
+            const params = new URLSearchParams({
+                cursor: cursor || '',
+                per_page: this.photosPerPage
+            });
+            
             const response = await fetch(
-                `${App.API_BASE}/gallery?page=${page}&per_page=${this.photosPerPage}`,
+                `${App.API_BASE}/gallery?${params}`,
                 {
                     headers: {
                         ...Auth.getAuthHeader()
@@ -67,16 +95,18 @@ const Gallery = {
             const data = await response.json();
             
             // Store photos
-            if (page === 1) {
+            if (firstPage) {
                 this.photos = data.photos || [];
             } else {
                 this.photos = [...this.photos, ...(data.photos || [])];
             }
             
-            this.hasMore = data.pages > page;
+            this.nextCursor = data.next_cursor || null;
+            this.hasMore = Boolean(this.nextCursor);
             
             // Update UI
-            this.renderGallery();
+            this.renderGallery(firstPage);
+            this.schedulePrefetch();
             
             console.log('[Gallery] Loaded', data.photos?.length || 0, 'photos');
             
@@ -88,10 +118,89 @@ const Gallery = {
         }
     },
     
+    /**
+     * Once the device is idle, fetch the next page and have the service
+     * worker cache its thumbnails (skipped on metered or slow connections)
+     */
+    schedulePrefetch() {
+        const connection = navigator.connection;
+        
+        if (!this.nextCursor || !navigator.serviceWorker?.controller) {
+            return;
+        }
+        
+        if (connection && (connection.saveData || connection.type === 'cellular' ||
+                /2g/.test(connection.effectiveType || ''))) {
+            return;
+        }
+        
+        const cursor = this.nextCursor;
+        const whenIdle = window.requestIdleCallback || ((callback) => setTimeout(callback, 2000));
+        
+        whenIdle(() => this.prefetchPage(cursor), { timeout: 10000 });
+    },
+    
+    /**
+     * Fetch a page ahead of time and pass its thumbnails to the service worker
+     */
+    async prefetchPage(cursor) {
+        // Skip if the gallery has moved on since this was scheduled
+        if (cursor !== this.nextCursor || this.isLoading) {
+            return;
+        }
+        
+        try {
+            // Same parameters as loadPhotos(), so the cached response is reused
+            const params = new URLSearchParams({
+                cursor: cursor,
+                per_page: this.photosPerPage
+            });
+            
+            const response = await fetch(`${App.API_BASE}/gallery?${params}`, {
+                headers: {
+                    ...Auth.getAuthHeader()
+                }
+            });
+            
+            if (!response.ok) {
+                return;
+            }
+            
+            const data = await response.json();
+            const urls = (data.photos || []).map(photo => this.pickThumbnailUrl(photo)).filter(Boolean);
+            
+            navigator.serviceWorker.controller?.postMessage({ type: 'prefetch-images', urls });
+        } catch (error) {
+            console.warn('[Gallery] Prefetch failed:', error);
+        }
+    },
+    
+    /**
+     * The thumbnail URL this screen's <picture> would pick for a photo
+     */
+    pickThumbnailUrl(photo) {
+        const srcset = photo.thumbnail_srcset?.['image/webp'] || photo.thumbnail_srcset?.['image/jpeg'];
+        
+        if (!srcset) {
+            return photo.thumbnail_url;
+        }
+        
+        // Matches the sizes attribute in createResponsiveImage()
+        const slotWidth = window.innerWidth >= 768 ? 240 : window.innerWidth / 2;
+        const wanted = slotWidth * (window.devicePixelRatio || 1);
+        
+        const candidates = srcset.split(', ').map((candidate) => {
+            const [url, width] = candidate.split(' ');
+            return { url, width: parseInt(width, 10) };
+        }).sort((a, b) => a.width - b.width);
+        
+        return (candidates.find(candidate => candidate.width >= wanted) || candidates[candidates.length - 1]).url;
+    },
+    
     /**
      * Render gallery grid
      */
-    renderGallery() {
+    renderGallery(firstPage = true) {
         const grid = document.getElementById('gallery-grid');
         const emptyState = document.getElementById('empty-state');
         const loadMoreSection = document.getElementById('load-more-section');
@@ -106,7 +215,7 @@ const Gallery = {
         emptyState.style.display = 'none';
         
         // Clear grid if first page
-        if (this.currentPage === 1) {
+        if (firstPage) {
             grid.innerHTML = '';
         }
         
@@ -143,11 +252,44 @@ const Gallery = {
             this.viewPhoto(index);
         });
         
-        item.appendChild(img);
+        item.appendChild(this.createResponsiveImage(img, photo.thumbnail_srcset));
         
         return item;
     },
     
+    /**
+     * Let the browser pick the smallest thumbnail variant for the tile size
+     * and screen density, preferring WebP when it's supported
+     */
+    createResponsiveImage(img, srcset) {
+        if (!srcset || Object.keys(srcset).length === 0) {
+            return img;
+        }
+        
+        // Tiles are about half the screen wide on phones (see .gallery-grid)
+        const sizes = '(min-width: 768px) 240px, 50vw';
+        
+        img.sizes = sizes;
+        if (srcset['image/jpeg']) {
+            img.srcset = srcset['image/jpeg'];
+        }
+        
+        if (!srcset['image/webp']) {
+            return img;
+        }
+        
+        const picture = document.createElement('picture');
+        const source = document.createElement('source');
+        source.type = 'image/webp';
+        source.srcset = srcset['image/webp'];
+        source.sizes = sizes;
+        
+        picture.appendChild(source);
+        picture.appendChild(img);
+        
+        return picture;
+    },
+    
     /**
      * View photo in fullscreen viewer
      */
@@ -214,7 +356,9 @@ const Gallery = {
      * Load more photos (pagination)
      */
     loadMorePhotos() {
-        this.loadPhotos(this.currentPage + 1);
+        if (this.nextCursor) {
+            this.loadPhotos(this.nextCursor);
+        }
     },
     
     /**
@@ -222,8 +366,8 @@ const Gallery = {
      */
     refreshGallery() {
         this.photos = [];
-        this.currentPage = 1;
-        this.loadPhotos(1);
+        this.nextCursor = null;
+        this.loadPhotos();
         App.showToast('Gallery refreshed');
     },
     
@@ -0,0 +1,321 @@
+/**
+ * Outbox Module
+ * Keeps photos taken offline in IndexedDB until they can be uploaded.
+ * Loaded by the page and by the service worker (which flushes it from
+ * Background Sync), so it only uses APIs available in both.
+ *
+ * Queued photos don't carry credentials. The page keeps one copy of the
+ * signed-in user's Authorization header in the auth store (the service
+ * worker can't read localStorage), and each upload uses whatever is there
+ * when it is sent.
+ */
+
+const Outbox = {
+    DB_NAME: 'family-gallery-outbox',
+    STORE: 'uploads',
+    AUTH_STORE: 'auth',
+    CHANNEL: 'family-gallery-outbox',
+
+    // Held while flushing, so the page and the service worker never send
+    // the same photo at once
+    LOCK: 'family-gallery-outbox-flush',
+
+    // Uploads sent at the same time while flushing
+    concurrency: 2,
+
+    // Retry delay doubles from baseDelay up to maxDelay (milliseconds)
+    baseDelay: 5000,
+    maxDelay: 3600000,
+
+    // Rejected logins in a row before a photo waits for the user to sign in again
+    maxAuthFailures: 3,
+
+    isFlushing: false,
+
+    /**
+     * Open the outbox database
+     */
+    open() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(this.DB_NAME, 2);
+
+            request.onupgradeneeded = (event) => {
+                const db = request.result;
+
+                if (event.oldVersion < 1) {
+                    // Keyed by content hash, so the same photo is only queued once
+                    db.createObjectStore(this.STORE, { keyPath: 'hash' });
+                }
+
+                if (event.oldVersion < 2) {
+                    db.createObjectStore(this.AUTH_STORE);
+
+                    // Version 1 stored a copy of the login with every photo
+                    request.transaction.objectStore(this.STORE).openCursor().onsuccess = (cursorEvent) => {
+                        const cursor = cursorEvent.target.result;
+
+                        if (cursor) {
+                            const { headers, ...item } = cursor.value;
+                            cursor.update(item);
+                            cursor.continue();
+                        }
+                    };
+                }
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    },
+
+    /**
+     * Run fn(store) in a transaction and resolve with the value of the
+     * IDBRequest it returns (if any) once the transaction completes
+     */
+    async transaction(mode, fn, storeName = this.STORE) {
+        const db = await this.open();
+
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(storeName, mode);
+            const request = fn(tx.objectStore(storeName));
+
+            tx.oncomplete = () => {
+                db.close();
+                resolve(request ? request.result : undefined);
+            };
+            tx.onerror = () => {
+                db.close();
+                reject(tx.error);
+            };
+        });
+    },
+
+    /**
+     * SHA-256 of a blob as hex
+     */
+    async hash(blob) {
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest))
+            .map(byte => byte.toString(16).padStart(2, '0'))
+            .join('');
+    },
+
+    /**
+     * Remember the signed-in user's Authorization header for uploads, or
+     * forget it (pass nothing) on logout. A new login gives photos that
+     * were waiting for one another go.
+     */
+    async setAuth(headers) {
+        if (!headers || !headers.Authorization) {
+            await this.transaction('readwrite', store => store.delete('current'), this.AUTH_STORE);
+            return;
+        }
+
+        const current = await this.getAuth();
+
+        if (current && current.Authorization === headers.Authorization) {
+            return;
+        }
+
+        await this.transaction('readwrite', store => store.put(headers, 'current'), this.AUTH_STORE);
+
+        const items = await this.transaction('readonly', store => store.getAll());
+        const parked = items.filter(item => item.parked);
+
+        if (parked.length) {
+            await this.transaction('readwrite', (store) => {
+                parked.forEach(item => store.put({ ...item, parked: false, authFailures: 0, nextAttempt: 0 }));
+            });
+            this.notify();
+        }
+    },
+
+    /**
+     * Authorization header to upload with, or null when signed out
+     */
+    async getAuth() {
+        return (await this.transaction('readonly', store => store.get('current'), this.AUTH_STORE)) || null;
+    },
+
+    /**
+     * Queue a photo. The blob is stored as-is (IndexedDB keeps binary data
+     * natively, no base64), together with where to upload it.
+     * Resolves with false if the same photo is already queued.
+     */
+    async add(blob, { url, filename, caption = '' }) {
+        const hash = await this.hash(blob);
+        const existing = await this.transaction('readonly', store => store.get(hash));
+
+        if (existing) {
+            return false;
+        }
+
+        await this.transaction('readwrite', store => store.put({
+            hash,
+            blob,
+            url,
+            filename: filename || `photo_${Date.now()}.jpg`,
+            caption,
+            attempts: 0,
+            nextAttempt: 0,
+            queued: Date.now()
+        }));
+
+        this.notify();
+        return true;
+    },
+
+    /**
+     * Number of photos waiting
+     */
+    count() {
+        return this.transaction('readonly', store => store.count());
+    },
+
+    /**
+     * Queue depth, and how many photos wait for the user to sign in again
+     */
+    async status() {
+        const items = await this.transaction('readonly', store => store.getAll());
+        const signedIn = Boolean(await this.getAuth());
+
+        return {
+            depth: items.length,
+            parked: signedIn ? items.filter(item => item.parked).length : items.length
+        };
+    },
+
+    /**
+     * Tell every page (and the service worker) how many photos are waiting
+     */
+    async notify() {
+        if (typeof BroadcastChannel === 'undefined') {
+            return;
+        }
+
+        const channel = new BroadcastChannel(this.CHANNEL);
+        channel.postMessage(await this.status());
+        channel.close();
+    },
+
+    /**
+     * Upload one queued photo with the current login. Resolves with
+     * 'sent', 'rejected' (refused for good, don't keep it), 'unauthorized'
+     * or 'retry'.
+     */
+    async send(item, auth) {
+        const formData = new FormData();
+        formData.append('photo', item.blob, item.filename);
+
+        if (item.caption) {
+            formData.append('caption', item.caption);
+        }
+
+        const response = await fetch(item.url, {
+            method: 'POST',
+            headers: auth,
+            body: formData
+        });
+
+        if (response.ok) {
+            return 'sent';
+        }
+
+        if (response.status === 401 || response.status === 403) {
+            return 'unauthorized';
+        }
+
+        // Bad requests won't get better by retrying; timeouts and server errors might
+        if (response.status >= 400 && response.status < 500 && ![408, 429].includes(response.status)) {
+            console.warn('[Outbox] Upload rejected with status', response.status, item.filename);
+            return 'rejected';
+        }
+
+        return 'retry';
+    },
+
+    /**
+     * Upload every photo that is due, a few at a time. Failures are kept
+     * and retried later with exponential backoff; photos whose login keeps
+     * being refused are parked until the user signs in again.
+     * Resolves with { uploaded, failed, remaining, parked }.
+     */
+    async flush() {
+        const skipped = async () => ({ uploaded: 0, failed: 0, remaining: await this.count(), parked: 0 });
+
+        if (typeof navigator !== 'undefined' && navigator.locks) {
+            // Someone else (a tab or the service worker) is already flushing
+            const result = await navigator.locks.request(this.LOCK, { ifAvailable: true }, (lock) => {
+                return lock ? this.flushDue() : null;
+            });
+            return result || skipped();
+        }
+
+        if (this.isFlushing) {
+            return skipped();
+        }
+
+        this.isFlushing = true;
+
+        try {
+            return await this.flushDue();
+        } finally {
+            this.isFlushing = false;
+        }
+    },
+
+    /**
+     * The work of flush(), once this context holds the flush
+     */
+    async flushDue() {
+        const auth = await this.getAuth();
+
+        if (!auth) {
+            // Signed out: everything waits for the next login
+            const depth = await this.count();
+            return { uploaded: 0, failed: 0, remaining: depth, parked: depth };
+        }
+
+        const now = Date.now();
+        const items = await this.transaction('readonly', store => store.getAll());
+        const due = items.filter(item => !item.parked && item.nextAttempt <= now);
+        let uploaded = 0;
+        let failed = 0;
+
+        const worker = async () => {
+            while (due.length) {
+                const item = due.shift();
+                let outcome = 'retry';
+
+                try {
+                    outcome = await this.send(item, auth);
+                } catch (error) {
+                    // Still offline or the connection dropped
+                }
+
+                if (outcome === 'sent' || outcome === 'rejected') {
+                    uploaded += outcome === 'sent' ? 1 : 0;
+                    await this.transaction('readwrite', store => store.delete(item.hash));
+                } else {
+                    failed++;
+                    item.attempts++;
+                    item.authFailures = outcome === 'unauthorized' ? (item.authFailures || 0) + 1 : 0;
+                    item.parked = item.authFailures >= this.maxAuthFailures;
+
+                    const delay = Math.min(this.baseDelay * 2 ** (item.attempts - 1), this.maxDelay);
+                    item.nextAttempt = Date.now() + delay * (0.5 + Math.random() / 2);
+                    await this.transaction('readwrite', store => store.put(item));
+                }
+
+                this.notify();
+            }
+        };
+
+        await Promise.all(Array.from({ length: this.concurrency }, worker));
+
+        const { depth, parked } = await this.status();
+        return { uploaded, failed, remaining: depth, parked };
+    }
+};
+
+// Export (window in the page, self in the service worker)
+self.Outbox = Outbox;
@@ -0,0 +1,195 @@
+/**
+ * Resize Worker
+ * Scales photos down and re-encodes them as JPEG with OffscreenCanvas, so
+ * the page stays responsive while a 12MP photo is being shrunk.
+ *
+ * Message in:  { id, source (Blob or ImageBitmap), maxEdge, quality, capturedAt }
+ * Message out: { id, blob } or { id, error }
+ */
+
+const JPEG_SOI = 0xFFD8;
+const JPEG_APP0 = 0xFFE0;
+const JPEG_APP1 = 0xFFE1;
+const JPEG_SOS = 0xFFDA;
+const EXIF_HEADER = [0x45, 0x78, 0x69, 0x66, 0x00, 0x00]; // "Exif\0\0"
+const TAG_ORIENTATION = 0x0112;
+
+self.addEventListener('message', async (event) => {
+    const { id } = event.data;
+
+    try {
+        const blob = await resize(event.data);
+        self.postMessage({ id, blob });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+});
+
+/**
+ * Decode, scale and re-encode one photo
+ */
+async function resize({ source, maxEdge, quality, capturedAt }) {
+    let exif = null;
+    let bitmap = source;
+
+    if (source instanceof Blob) {
+        if (source.type !== 'image/jpeg') {
+            throw new Error(`Not resizing ${source.type || 'unknown type'}`);
+        }
+
+        exif = findExif(new Uint8Array(await source.arrayBuffer()));
+
+        // Pixels come out upright, so the EXIF orientation is reset below
+        bitmap = await createImageBitmap(source, { imageOrientation: 'from-image' });
+    }
+
+    const scale = maxEdge ? Math.min(1, maxEdge / Math.max(bitmap.width, bitmap.height)) : 1;
+    const width = Math.round(bitmap.width * scale);
+    const height = Math.round(bitmap.height * scale);
+
+    if (scale < 1) {
+        const scaled = await createImageBitmap(bitmap, {
+            resizeWidth: width,
+            resizeHeight: height,
+            resizeQuality: 'high'
+        });
+        bitmap.close();
+        bitmap = scaled;
+    }
+
+    const canvas = new OffscreenCanvas(width, height);
+    canvas.getContext('2d').drawImage(bitmap, 0, 0);
+    bitmap.close();
+
+    const encoded = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+
+    // Canvas output has no metadata; carry over the original's (for the
+    // capture date the server reads), or record when a camera frame was taken
+    if (exif) {
+        resetOrientation(exif);
+    } else if (capturedAt) {
+        exif = buildExif(new Date(capturedAt));
+    }
+
+    if (!exif) {
+        return encoded;
+    }
+
+    return insertSegment(new Uint8Array(await encoded.arrayBuffer()), exif);
+}
+
+/**
+ * Copy of the APP1 Exif segment of a JPEG (marker included), or null
+ */
+function findExif(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+
+    if (bytes.length < 4 || view.getUint16(0) !== JPEG_SOI) {
+        return null;
+    }
+
+    let offset = 2;
+    while (offset + 4 <= bytes.length) {
+        const marker = view.getUint16(offset);
+        const length = view.getUint16(offset + 2);
+
+        if (marker === JPEG_SOS || (marker & 0xFF00) !== 0xFF00) {
+            break;
+        }
+
+        if (marker === JPEG_APP1 && EXIF_HEADER.every((byte, i) => bytes[offset + 4 + i] === byte)) {
+            return bytes.slice(offset, offset + 2 + length);
+        }
+
+        offset += 2 + length;
+    }
+
+    return null;
+}
+
+/**
+ * Set the Orientation tag of an APP1 Exif segment to 1 (upright), in place
+ */
+function resetOrientation(segment) {
+    const view = new DataView(segment.buffer, segment.byteOffset, segment.byteLength);
+    const tiff = 10;
+
+    if (segment.length < tiff + 8) {
+        return;
+    }
+
+    const little = view.getUint16(tiff) === 0x4949; // "II"
+    const ifd = tiff + view.getUint32(tiff + 4, little);
+
+    if (ifd + 2 > segment.length) {
+        return;
+    }
+
+    const entries = view.getUint16(ifd, little);
+    for (let i = 0; i < entries; i++) {
+        const entry = ifd + 2 + i * 12;
+
+        if (entry + 12 > segment.length) {
+            return;
+        }
+
+        if (view.getUint16(entry, little) === TAG_ORIENTATION) {
+            view.setUint16(entry + 8, 1, little);
+            return;
+        }
+    }
+}
+
+/**
+ * Minimal APP1 Exif segment holding only DateTimeOriginal (local time)
+ */
+function buildExif(date) {
+    const pad = (n) => String(n).padStart(2, '0');
+    const stamp = `${date.getFullYear()}:${pad(date.getMonth() + 1)}:${pad(date.getDate())} ` +
+        `${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}\0`;
+
+    // Big-endian TIFF: header, IFD0 pointing at the Exif IFD, Exif IFD with
+    // DateTimeOriginal, then the 20-byte date string
+    const tiff = new DataView(new ArrayBuffer(64));
+    tiff.setUint16(0, 0x4D4D);           // "MM"
+    tiff.setUint16(2, 42);
+    tiff.setUint32(4, 8);                // IFD0
+    tiff.setUint16(8, 1);
+    tiff.setUint16(10, 0x8769);          // ExifIFDPointer
+    tiff.setUint16(12, 4);               // LONG
+    tiff.setUint32(14, 1);
+    tiff.setUint32(18, 26);
+    tiff.setUint32(22, 0);
+    tiff.setUint16(26, 1);               // Exif IFD
+    tiff.setUint16(28, 0x9003);          // DateTimeOriginal
+    tiff.setUint16(30, 2);               // ASCII
+    tiff.setUint32(32, stamp.length);
+    tiff.setUint32(36, 44);
+    tiff.setUint32(40, 0);
+    for (let i = 0; i < stamp.length; i++) {
+        tiff.setUint8(44 + i, stamp.charCodeAt(i));
+    }
+
+    const segment = new Uint8Array(4 + EXIF_HEADER.length + tiff.byteLength);
+    const view = new DataView(segment.buffer);
+    view.setUint16(0, JPEG_APP1);
+    view.setUint16(2, segment.length - 2);
+    segment.set(EXIF_HEADER, 4);
+    segment.set(new Uint8Array(tiff.buffer), 4 + EXIF_HEADER.length);
+
+    return segment;
+}
+
+/**
+ * New JPEG blob with an APP segment placed after SOI (and JFIF APP0, if any)
+ */
+function insertSegment(jpeg, segment) {
+    const view = new DataView(jpeg.buffer, jpeg.byteOffset, jpeg.byteLength);
+    let offset = 2;
+
+    if (view.getUint16(offset) === JPEG_APP0) {
+        offset += 2 + view.getUint16(offset + 2);
+    }
+
+    return new Blob([jpeg.subarray(0, offset), segment, jpeg.subarray(offset)], { type: 'image/jpeg' });
+}
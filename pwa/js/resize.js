@@ -0,0 +1,185 @@
+/**
+ * Resize Module
+ * Shrinks photos to the chosen upload profile before they are sent, using
+ * a Web Worker so the page doesn't freeze while encoding
+ */
+
+const Resize = {
+    STORAGE_KEY: 'family_gallery_upload_profile',
+
+    // maxEdge is the longest side in pixels (null keeps the full size)
+    PROFILES: {
+        'original': { label: 'Original', maxEdge: null, quality: 0.92 },
+        'high': { label: 'High (2560px)', maxEdge: 2560, quality: 0.85 },
+        'data-saver': { label: 'Data saver (1280px)', maxEdge: 1280, quality: 0.7 }
+    },
+    DEFAULT_PROFILE: 'high',
+
+    // Only JPEGs are shrunk: re-encoding a PNG or GIF as JPEG would lose its
+    // transparency or animation
+    RESIZABLE_TYPES: ['image/jpeg'],
+
+    worker: null,
+    nextId: 1,
+    pending: new Map(),
+
+    // Blobs this module produced, so they aren't re-encoded twice
+    processed: new WeakSet(),
+
+    /**
+     * Initialize resize module
+     */
+    init() {
+        const select = document.getElementById('upload-profile');
+
+        if (!select) return;
+
+        Object.entries(this.PROFILES).forEach(([name, profile]) => {
+            select.add(new Option(profile.label, name));
+        });
+        select.value = this.getProfileName();
+
+        select.addEventListener('change', () => {
+            localStorage.setItem(this.STORAGE_KEY, select.value);
+            App.showToast(`Uploads: ${this.PROFILES[select.value].label}`, 'info');
+        });
+    },
+
+    /**
+     * Name of the chosen profile
+     */
+    getProfileName() {
+        const name = localStorage.getItem(this.STORAGE_KEY);
+        return this.PROFILES[name] ? name : this.DEFAULT_PROFILE;
+    },
+
+    /**
+     * Settings of the chosen profile
+     */
+    getProfile() {
+        return this.PROFILES[this.getProfileName()];
+    },
+
+    /**
+     * Whether the browser can resize off the main thread
+     */
+    isSupported() {
+        return typeof Worker !== 'undefined' &&
+            typeof OffscreenCanvas !== 'undefined' &&
+            typeof createImageBitmap !== 'undefined';
+    },
+
+    /**
+     * Start the worker on first use
+     */
+    getWorker() {
+        if (this.worker) {
+            return this.worker;
+        }
+
+        // The installer renames scripts, so the page says where the worker is
+        const meta = document.querySelector('meta[name="resize-worker"]');
+        this.worker = new Worker(meta ? meta.content : 'js/resize-worker.js');
+
+        this.worker.addEventListener('message', (event) => {
+            const { id, blob, error } = event.data;
+            const request = this.pending.get(id);
+
+            if (!request) return;
+
+            this.pending.delete(id);
+            error ? request.reject(new Error(error)) : request.resolve(blob);
+        });
+
+        this.worker.addEventListener('error', (event) => {
+            this.pending.forEach(request => request.reject(new Error(event.message || 'Resize worker failed')));
+            this.pending.clear();
+            this.worker = null;
+        });
+
+        return this.worker;
+    },
+
+    /**
+     * Send a job to the worker. ImageBitmaps are transferred, not copied.
+     */
+    run(job) {
+        return new Promise((resolve, reject) => {
+            const id = this.nextId++;
+            this.pending.set(id, { resolve, reject });
+
+            const transfer = job.source instanceof Blob ? [] : [job.source];
+            this.getWorker().postMessage({ id, ...job }, transfer);
+        }).then(blob => {
+            this.processed.add(blob);
+            return blob;
+        });
+    },
+
+    /**
+     * Shrink a JPEG photo (from the camera or picked from the phone's
+     * gallery) to the upload profile. Anything that can't or needn't be
+     * shrunk is returned unchanged.
+     */
+    async prepare(blob) {
+        const profile = this.getProfile();
+
+        if (!profile.maxEdge || this.processed.has(blob) ||
+            !this.RESIZABLE_TYPES.includes(blob.type) || !this.isSupported()) {
+            return blob;
+        }
+
+        try {
+            const resized = await this.run({
+                source: blob,
+                maxEdge: profile.maxEdge,
+                quality: profile.quality
+            });
+
+            // A small photo can come out bigger after re-encoding
+            return resized.size < blob.size ? resized : blob;
+        } catch (error) {
+            console.warn('[Resize] Sending original photo:', error);
+            return blob;
+        }
+    },
+
+    /**
+     * Encode the current camera frame at the upload profile's size,
+     * stamped with the time it was taken
+     */
+    async captureFrame(videoElement) {
+        const profile = this.getProfile();
+
+        if (this.isSupported()) {
+            try {
+                return await this.run({
+                    source: await createImageBitmap(videoElement),
+                    maxEdge: profile.maxEdge,
+                    quality: profile.quality,
+                    capturedAt: Date.now()
+                });
+            } catch (error) {
+                console.warn('[Resize] Encoding on the main thread:', error);
+            }
+        }
+
+        // Fallback: full-size frame encoded here (no capture date)
+        const canvas = document.createElement('canvas');
+        canvas.width = videoElement.videoWidth;
+        canvas.height = videoElement.videoHeight;
+        canvas.getContext('2d').drawImage(videoElement, 0, 0);
+
+        return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', profile.quality));
+    }
+};
+
+// Initialize when loaded
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', () => Resize.init());
+} else {
+    Resize.init();
+}
+
+// Export
+window.Resize = Resize;
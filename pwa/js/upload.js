@@ -4,6 +4,74 @@
  */
 
 const Upload = {
+    /**
+     * Initialize upload module
+     */
+    init() {
+        // Show how many photos are waiting, in every open tab
+        if ('BroadcastChannel' in window) {
+            const channel = new BroadcastChannel(Outbox.CHANNEL);
+            channel.addEventListener('message', (event) => {
+                this.showQueueDepth(event.data.depth, event.data.parked);
+            });
+        }
+        
+        window.addEventListener('online', () => this.flushOutbox());
+        
+        // Queued uploads use the login the page has now
+        Outbox.setAuth(Auth.getAuthHeader()).then(() => Outbox.status()).then(({ depth, parked }) => {
+            this.showQueueDepth(depth, parked);
+            
+            if (depth > parked && navigator.onLine) {
+                this.flushOutbox();
+            }
+        }).catch(error => {
+            console.warn('[Upload] Outbox unavailable:', error);
+        });
+    },
+    
+    /**
+     * Update the "waiting to upload" line under the Add Photo button
+     */
+    showQueueDepth(depth, parked = 0) {
+        const status = document.getElementById('outbox-status');
+        
+        if (!status) return;
+        
+        status.textContent = depth === 1
+            ? '1 photo waiting to upload'
+            : `${depth} photos waiting to upload`;
+        
+        if (parked) {
+            status.textContent += ' - sign in again to send them';
+        }
+        
+        status.style.display = depth ? 'block' : 'none';
+    },
+    
+    /**
+     * Send queued photos: through Background Sync where supported,
+     * otherwise straight from the page
+     */
+    async flushOutbox() {
+        if ('serviceWorker' in navigator && 'SyncManager' in window) {
+            try {
+                const registration = await navigator.serviceWorker.ready;
+                await registration.sync.register('upload-photos');
+                return;
+            } catch (error) {
+                console.warn('[Upload] Background sync unavailable:', error);
+            }
+        }
+        
+        const result = await Outbox.flush();
+        
+        if (result.uploaded) {
+            App.showToast(`${result.uploaded} queued photo(s) uploaded`);
+            Gallery.refreshGallery();
+        }
+    },
+    
     /**
      * Upload photo to WordPress
      */
@@ -18,15 +86,19 @@ const Upload = {
             progressFill.style.width = '0%';
             statusText.textContent = 'Preparing upload...';
             
+            // Shrink to the upload profile (photos picked from the phone
+            // arrive full size; camera captures already are)
+            blob = await Resize.prepare(blob);
+            
             // Create form data
             const formData = new FormData();
-            formData.append('photo', blob, 'photo_' + Date.now() + '.jpg');
+            formData.append('photo', blob, this.getFilename(blob));
             
             // Optional: Add caption
             // formData.append('caption', 'Photo from PWA');
             
             // Upload with progress tracking
-            await this.uploadWithProgress(formData, (progress) => {
+            const result = await this.uploadWithProgress(formData, (progress) => {
                 progressFill.style.width = progress + '%';
                 statusText.textContent = `Uploading... ${Math.round(progress)}%`;
             });
@@ -45,16 +117,70 @@ const Upload = {
                 Gallery.refreshGallery();
             }, 1500);
             
+            // The server may still be copying it to Drive
+            if (result && result.status === 'pending') {
+                this.waitForProcessing(result.media_id);
+            }
+            
         } catch (error) {
             console.error('[Upload] Error:', error);
             
             progressDiv.style.display = 'none';
+            
+            // No connection: keep the photo and send it later
+            if (!navigator.onLine || error.message === 'Network error during upload') {
+                try {
+                    await this.queueForSync(blob);
+                    App.showScreen('gallery');
+                    return;
+                } catch (queueError) {
+                    console.error('[Upload] Could not queue photo:', queueError);
+                }
+            }
+            
             App.showToast('Upload failed. Please try again.', 'error');
             
             // Stay on preview screen so user can retry
         }
     },
     
+    /**
+     * Poll a background upload until it's ready, then refresh the gallery
+     */
+    async waitForProcessing(mediaId, delay = 3000) {
+        for (let attempt = 0; attempt < 40; attempt++) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            
+            try {
+                const response = await fetch(`${App.API_BASE}/media/${mediaId}/status`, {
+                    headers: {
+                        ...Auth.getAuthHeader()
+                    }
+                });
+                
+                if (!response.ok) {
+                    continue;
+                }
+                
+                const status = await response.json();
+                
+                if (status.status === 'ready') {
+                    Gallery.refreshGallery();
+                    return;
+                }
+                
+                if (status.status === 'failed') {
+                    App.showToast('Photo could not be saved to Drive', 'error');
+                    return;
+                }
+            } catch (error) {
+                console.warn('[Upload] Status check failed:', error);
+            }
+            
+            delay = Math.min(delay * 1.5, 30000);
+        }
+    },
+    
     /**
      * Upload with progress tracking using XMLHttpRequest
      */
@@ -125,33 +251,54 @@ const Upload = {
         return await response.json();
     },
     
+    /**
+     * Name to upload a photo under: a picked file keeps its own, anything
+     * else gets an extension matching its type
+     */
+    getFilename(blob) {
+        if (blob.name) {
+            return blob.name;
+        }
+        
+        const extensions = { 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp' };
+        return 'photo_' + Date.now() + '.' + (extensions[blob.type] || 'jpg');
+    },
+    
     /**
      * Queue upload for background sync (when offline)
      */
     async queueForSync(blob) {
-        // This would use IndexedDB to store photos for upload when back online
-        // Requires background sync API support
+        const added = await Outbox.add(blob, {
+            url: App.API_BASE + '/upload',
+            filename: this.getFilename(blob)
+        });
         
+        if (!added) {
+            App.showToast('This photo is already waiting to upload', 'info');
+            return;
+        }
+        
+        // Sent by the service worker once the phone is back online (or by
+        // the 'online' listener in browsers without Background Sync)
         if ('serviceWorker' in navigator && 'SyncManager' in window) {
             try {
-                // Store in IndexedDB (implementation needed)
-                // await this.storeInIndexedDB(blob);
-                
-                // Register background sync
                 const registration = await navigator.serviceWorker.ready;
                 await registration.sync.register('upload-photos');
-                
-                App.showToast('Photo queued for upload when online', 'info');
-                
             } catch (error) {
-                console.error('[Upload] Background sync failed:', error);
-                throw error;
+                console.warn('[Upload] Background sync failed:', error);
             }
-        } else {
-            throw new Error('Background sync not supported');
         }
+        
+        App.showToast('Photo queued for upload when online', 'info');
     }
 };
 
+// Initialize when loaded
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', () => Upload.init());
+} else {
+    Upload.init();
+}
+
 // Export
 window.Upload = Upload;
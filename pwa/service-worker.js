@@ -3,11 +3,16 @@
  * Provides offline support and caching
  */
 
+// Offline upload queue, shared with the page
+importScripts('/js/outbox.js');
+
 const CACHE_NAME = 'family-gallery-v1';
 const API_CACHE = 'family-gallery-api-v1';
 const IMAGE_CACHE = 'family-gallery-images-v1';
 
-// Files to cache on install
+// Files to cache on install. The installer replaces this list with
+// { url, revision } entries generated from the deployed files, and
+// CACHE_NAME with a version derived from them.
 const STATIC_CACHE_URLS = [
     '/',
     '/index.html',
@@ -15,25 +20,102 @@ const STATIC_CACHE_URLS = [
     '/js/app.js',
     '/js/auth.js',
     '/js/camera.js',
+    '/js/resize.js',
+    '/js/resize-worker.js',
     '/js/gallery.js',
     '/js/upload.js',
+    '/js/outbox.js',
     '/offline.html'
 ];
 
+// Where each precache stores the revisions it was built from
+const PRECACHE_REVISIONS_URL = '/__precache-revisions';
+
+// Size limits for the runtime caches; the least recently used entries are
+// evicted past either limit. The installer replaces these with the values
+// from its configuration.
+const CACHE_BUDGETS = {
+    [API_CACHE]: { maxEntries: 200, maxBytes: 5242880 },
+    [IMAGE_CACHE]: { maxEntries: 2000, maxBytes: 104857600 }
+};
+
+// IndexedDB database that tracks the size and last use of cached entries
+const USAGE_DB_NAME = 'family-gallery-cache-usage';
+const USAGE_STORE = 'entries';
+
 // Install event - cache static assets
 self.addEventListener('install', (event) => {
     console.log('[ServiceWorker] Install');
     
     event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then((cache) => {
-                console.log('[ServiceWorker] Caching static assets');
-                return cache.addAll(STATIC_CACHE_URLS);
-            })
+        precacheStaticAssets()
             .then(() => self.skipWaiting())
     );
 });
 
+/**
+ * Fill CACHE_NAME with the precache list, reusing unchanged files
+ * from the previous version's cache instead of downloading them again
+ */
+async function precacheStaticAssets() {
+    const cache = await caches.open(CACHE_NAME);
+    const previous = await findPreviousPrecache();
+    const entries = STATIC_CACHE_URLS.map((entry) => {
+        return typeof entry === 'string' ? { url: entry, revision: null } : entry;
+    });
+    const revisions = {};
+    let reused = 0;
+    
+    console.log('[ServiceWorker] Caching static assets');
+    
+    await Promise.all(entries.map(async ({ url, revision }) => {
+        if (revision) {
+            revisions[url] = revision;
+        }
+        
+        if (revision && previous && previous.revisions[url] === revision) {
+            const cachedResponse = await previous.cache.match(url);
+            if (cachedResponse) {
+                reused++;
+                return cache.put(url, cachedResponse);
+            }
+        }
+        
+        const response = await fetch(url, { cache: 'reload' });
+        if (!response.ok) {
+            throw new Error(`Precache of ${url} failed with ${response.status}`);
+        }
+        return cache.put(url, response);
+    }));
+    
+    await cache.put(PRECACHE_REVISIONS_URL, new Response(JSON.stringify(revisions), {
+        headers: { 'Content-Type': 'application/json' }
+    }));
+    
+    console.log(`[ServiceWorker] Reused ${reused} of ${entries.length} cached files`);
+}
+
+/**
+ * Find the cache left by the previously installed version, if any
+ */
+async function findPreviousPrecache() {
+    const cacheNames = await caches.keys();
+    
+    for (const cacheName of cacheNames) {
+        if (cacheName === CACHE_NAME || cacheName === API_CACHE || cacheName === IMAGE_CACHE) {
+            continue;
+        }
+        
+        const cache = await caches.open(cacheName);
+        const stored = await cache.match(PRECACHE_REVISIONS_URL);
+        if (stored) {
+            return { cache, revisions: await stored.json() };
+        }
+    }
+    
+    return null;
+}
+
 // Activate event - clean up old caches
 self.addEventListener('activate', (event) => {
     console.log('[ServiceWorker] Activate');
@@ -59,28 +141,9 @@ self.addEventListener('fetch', (event) => {
     const { request } = event;
     const url = new URL(request.url);
 
-    // API requests - network first, then cache
+    // API requests - network first (revalidating the cached copy), then cache
     if (url.pathname.includes('/wp-json/family-gallery/')) {
-        event.respondWith(
-            fetch(request)
-                .then((response) => {
-                    // Clone the response
-                    const responseClone = response.clone();
-                    
-                    // Cache successful GET requests
-                    if (request.method === 'GET' && response.status === 200) {
-                        caches.open(API_CACHE).then((cache) => {
-                            cache.put(request, responseClone);
-                        });
-                    }
-                    
-                    return response;
-                })
-                .catch(() => {
-                    // Network failed, try cache
-                    return caches.match(request);
-                })
-        );
+        event.respondWith(fetchApiResponse(request));
         return;
     }
 
@@ -89,16 +152,14 @@ self.addEventListener('fetch', (event) => {
         event.respondWith(
             caches.match(request).then((cachedResponse) => {
                 if (cachedResponse) {
+                    touchCacheEntry(IMAGE_CACHE, request.url);
                     return cachedResponse;
                 }
                 
-                return fetch(request).then((response) => {
+                return fetchImage(request).then((response) => {
                     // Cache images for offline viewing
-                    if (response.status === 200) {
-                        const responseClone = response.clone();
-                        caches.open(IMAGE_CACHE).then((cache) => {
-                            cache.put(request, responseClone);
-                        });
+                    if (response.ok) {
+                        putInCache(IMAGE_CACHE, request.url, response.clone());
                     }
                     
                     return response;
@@ -140,6 +201,220 @@ self.addEventListener('fetch', (event) => {
     );
 });
 
+// Fetch an API response, sending the cached copy's ETag so an unchanged
+// response comes back as an empty 304 and the cached JSON is reused
+async function fetchApiResponse(request) {
+    const cache = await caches.open(API_CACHE);
+    const cached = request.method === 'GET' ? await cache.match(request) : undefined;
+    const etag = cached && cached.headers.get('ETag');
+    let networkRequest = request;
+    
+    if (etag) {
+        const headers = new Headers(request.headers);
+        headers.set('If-None-Match', etag);
+        networkRequest = new Request(request, { headers });
+    }
+    
+    try {
+        const response = await fetch(networkRequest);
+        
+        if (response.status === 304 && cached) {
+            touchCacheEntry(API_CACHE, request.url);
+            return cached;
+        }
+        
+        // Cache successful GET requests
+        if (request.method === 'GET' && response.status === 200) {
+            putInCache(API_CACHE, request, response.clone());
+        }
+        
+        return response;
+    } catch (error) {
+        // Network failed, try cache
+        return cached || caches.match(request);
+    }
+}
+
+// Open the cache usage database
+function openUsageDb() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(USAGE_DB_NAME, 1);
+        
+        open.onupgradeneeded = () => {
+            const store = open.result.createObjectStore(USAGE_STORE, { keyPath: ['cache', 'url'] });
+            store.createIndex('lastUsed', ['cache', 'lastUsed']);
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+// Run fn(store) in a usage database transaction, resolving with its result
+async function withUsageStore(mode, fn) {
+    const db = await openUsageDb();
+    
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(USAGE_STORE, mode);
+        let result;
+        
+        transaction.oncomplete = () => {
+            db.close();
+            resolve(result);
+        };
+        transaction.onerror = () => {
+            db.close();
+            reject(transaction.error);
+        };
+        
+        Promise.resolve(fn(transaction.objectStore(USAGE_STORE))).then((value) => {
+            result = value;
+        });
+    });
+}
+
+// Wrap an IDBRequest in a promise
+function idbResult(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+// Store a response in a runtime cache, record its size and enforce the budget.
+// Opaque responses are never stored: their size can't be measured, and
+// browsers charge each one several MB of storage quota.
+async function putInCache(cacheName, request, response) {
+    const url = typeof request === 'string' ? request : request.url;
+    
+    if (response.type === 'opaque') {
+        return;
+    }
+    
+    const size = (await response.clone().blob()).size;
+    const cache = await caches.open(cacheName);
+    await cache.put(request, response);
+    
+    try {
+        await withUsageStore('readwrite', (store) => {
+            store.put({ cache: cacheName, url, size, lastUsed: Date.now() });
+        });
+        await enforceCacheBudget(cacheName);
+    } catch (error) {
+        console.warn('[ServiceWorker] Cache usage tracking failed:', error);
+    }
+}
+
+// Mark a cached entry as just used
+function touchCacheEntry(cacheName, url) {
+    return withUsageStore('readwrite', async (store) => {
+        const entry = await idbResult(store.get([cacheName, url]));
+        
+        if (entry) {
+            entry.lastUsed = Date.now();
+            store.put(entry);
+        }
+    }).catch((error) => {
+        console.warn('[ServiceWorker] Cache usage tracking failed:', error);
+    });
+}
+
+// Evictions run one at a time so two puts can't both miss each other's entries
+let budgetQueue = Promise.resolve();
+
+// Evict least recently used entries until the cache is within its budget
+function enforceCacheBudget(cacheName) {
+    const budget = CACHE_BUDGETS[cacheName];
+    
+    if (!budget) {
+        return Promise.resolve();
+    }
+    
+    budgetQueue = budgetQueue.then(async () => {
+        const range = IDBKeyRange.bound([cacheName, 0], [cacheName, Infinity]);
+        const entries = await withUsageStore('readonly', (store) => {
+            return idbResult(store.index('lastUsed').getAll(range));
+        });
+        
+        let count = entries.length;
+        let bytes = entries.reduce((total, entry) => total + entry.size, 0);
+        const evicted = [];
+        
+        // Oldest first
+        for (const entry of entries) {
+            if (count <= budget.maxEntries && bytes <= budget.maxBytes) {
+                break;
+            }
+            
+            evicted.push(entry);
+            count--;
+            bytes -= entry.size;
+        }
+        
+        if (evicted.length === 0) {
+            return;
+        }
+        
+        const cache = await caches.open(cacheName);
+        await Promise.all(evicted.map((entry) => cache.delete(entry.url)));
+        await withUsageStore('readwrite', (store) => {
+            evicted.forEach((entry) => store.delete([entry.cache, entry.url]));
+        });
+        
+        console.log('[ServiceWorker] Evicted', evicted.length, 'entries from', cacheName);
+    }).catch((error) => {
+        console.warn('[ServiceWorker] Cache eviction failed:', error);
+    });
+    
+    return budgetQueue;
+}
+
+// Messages from the app
+self.addEventListener('message', (event) => {
+    if (event.data && event.data.type === 'prefetch-images') {
+        event.waitUntil(prefetchImages(event.data.urls || []));
+    }
+});
+
+// Fetch an image so that it can be cached: cross-origin images are
+// requested with CORS (an <img> would get an opaque response), falling back
+// to a plain request that still displays when the server doesn't allow it
+async function fetchImage(request) {
+    const url = new URL(typeof request === 'string' ? request : request.url, self.location.href);
+    
+    if (url.origin === self.location.origin) {
+        return fetch(request);
+    }
+    
+    try {
+        return await fetch(url.href, { mode: 'cors', credentials: 'omit' });
+    } catch (error) {
+        return fetch(request, { mode: 'no-cors' });
+    }
+}
+
+// Cache images the app expects to show next (e.g. the next gallery page),
+// by the same rule as images the page requests
+async function prefetchImages(urls) {
+    const cache = await caches.open(IMAGE_CACHE);
+    
+    for (const url of urls) {
+        if (await cache.match(url)) {
+            continue;
+        }
+        
+        try {
+            const response = await fetchImage(url);
+            
+            if (response.ok) {
+                await putInCache(IMAGE_CACHE, url, response);
+            }
+        } catch (error) {
+            // Prefetching is best effort
+            return;
+        }
+    }
+}
+
 // Background sync for uploads (when back online)
 self.addEventListener('sync', (event) => {
     if (event.tag === 'upload-photos') {
@@ -149,9 +424,16 @@ self.addEventListener('sync', (event) => {
 
 // Function to upload pending photos when back online
 async function uploadPendingPhotos() {
-    // Get pending uploads from IndexedDB
-    // This would be implemented based on your upload queue logic
     console.log('[ServiceWorker] Uploading pending photos...');
+    
+    const result = await Outbox.flush();
+    console.log('[ServiceWorker] Uploaded', result.uploaded, 'photos,', result.remaining, 'waiting');
+    
+    // Photos waiting for the user to sign in again don't need another sync
+    if (result.remaining > result.parked) {
+        // Rejecting makes the browser schedule another sync later
+        throw new Error(`${result.remaining} photos still waiting to upload`);
+    }
 }
 
 // Push notification support (for future use)
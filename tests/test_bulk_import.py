@@ -0,0 +1,137 @@
+"""
+Runs fmm-bulk-import.py against fmm-api-stub.py on a local port:
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import io
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import importlib.util
+import contextlib
+from pathlib import Path
+from urllib.request import urlopen
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_script(name, filename):
+    """Import one of the hyphenated command line scripts as a module"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+api_stub = load_script("fmm_api_stub", "fmm-api-stub.py")
+bulk_import = load_script("fmm_bulk_import", "fmm-bulk-import.py")
+
+
+class BulkImportTest(unittest.TestCase):
+
+    def start_stub(self, **options):
+        server = api_stub.make_server("127.0.0.1", 0, quiet=True, **options)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+        host, port = server.server_address[:2]
+        self.wp_url = f"http://{host}:{port}"
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fmm-import-test-"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.folder = self.tmp / "photos"
+        self.folder.mkdir()
+        self.journal = self.tmp / "journal.jsonl"
+
+    def add_photos(self, count, start=0):
+        for i in range(start, start + count):
+            (self.folder / f"photo_{i:03d}.jpg").write_bytes(b"\xff\xd8" + bytes(1024 * (i + 1)))
+
+    def stub_stats(self):
+        with urlopen(self.wp_url + "/stub/stats") as response:
+            return json.load(response)
+
+    def run_import(self, *extra):
+        """Run the importer; returns (exit code, JSON events by name)"""
+        argv = [
+            str(self.folder),
+            "--config", str(self.tmp / "no-config.json"),
+            "--wp-url", self.wp_url,
+            "--username", "test",
+            "--app-password", "test",
+            "--journal", str(self.journal),
+            "--json",
+            *extra,
+        ]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            code = bulk_import.main(argv)
+
+        events = {}
+        for line in output.getvalue().splitlines():
+            event = json.loads(line)
+            events[event.pop("event")] = event
+        return code, events
+
+    def test_rerun_skips_files_in_journal(self):
+        self.start_stub()
+        self.add_photos(4)
+
+        code, events = self.run_import()
+        self.assertEqual(code, 0)
+        self.assertEqual(events["summary"]["uploaded"], 4)
+
+        # A second run only sends what was added since
+        self.add_photos(2, start=4)
+        code, events = self.run_import()
+        self.assertEqual(code, 0)
+        self.assertEqual(events["plan"]["files"], 2)
+        self.assertEqual(events["plan"]["already_imported"], 4)
+        self.assertEqual(self.stub_stats()["uploads"], 6)
+
+        code, events = self.run_import()
+        self.assertEqual(code, 0)
+        self.assertEqual(events["plan"]["files"], 0)
+        self.assertEqual(self.stub_stats()["uploads"], 6)
+
+    def test_failed_uploads_are_retried(self):
+        self.start_stub(fail_every=3)
+        self.add_photos(6)
+
+        code, events = self.run_import("--connections", "2")
+        self.assertEqual(code, 0)
+        self.assertEqual(events["summary"]["uploaded"], 6)
+        self.assertEqual(events["summary"]["failed"], 0)
+
+        stats = self.stub_stats()
+        self.assertEqual(stats["uploads"], 6)
+        self.assertGreater(stats["requests"], stats["uploads"])
+
+    def test_connections_are_reused(self):
+        self.start_stub()
+        self.add_photos(12)
+
+        code, events = self.run_import("--connections", "2")
+        self.assertEqual(code, 0)
+
+        stats = self.stub_stats()
+        self.assertEqual(stats["uploads"], 12)
+        # Two upload connections plus this stats request
+        self.assertLessEqual(stats["connections"], 3)
+        self.assertLess(stats["connections"], stats["uploads"])
+
+
+if __name__ == "__main__":
+    unittest.main()